@@ -0,0 +1,335 @@
+"""
+Micro-benchmarks for the scanner's hot paths
+
+Every case runs on the same seeded synthetic MES/MNQ bars (see
+`benchmarks/synthetic.py`), so two runs with the same arguments do the same
+work and their timings can be compared directly. Results are written as JSON
+with the commit and environment they were measured on.
+
+Usage:
+    python -m benchmarks.run --bars 20000
+    python -m benchmarks.run --bars 20000 --compare benchmarks/results/<earlier>.json
+    python -m benchmarks.run --only detection_incremental zone_updates
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Tuple
+import numpy as np
+from loguru import logger
+
+from src.patterns import PatternManager
+from src.patterns.detectors import DetectionEngine
+from src.patterns.structure import StructureTracker, detect_structure
+from src.data_sources.aggregator import MultiTimeframeAggregator
+from src.data_sources.bar_store import BarBuffer
+from src.database import DatabaseManager
+from src.alerts import AlertGate, AlertCoalescer
+from .synthetic import generate_bars
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# A case is slower than its baseline when its median grows by more than this
+REGRESSION_THRESHOLD = 0.10
+
+PATTERN_CONFIG = {
+    "fvg": {"enabled": True, "min_gap_size": 0.25},
+    "ifvg": {"enabled": True, "min_gap_size": 0.25},
+    "volume_imbalance": {"enabled": True, "min_gap_size": 0.25},
+    "opening_gaps": {"enabled": True, "min_gap_size": 0.25},
+    "order_block": {"enabled": True, "min_size": 0.5},
+}
+
+PREFERENCES = {
+    "timezone": "America/New_York",
+    "minimum_priority": "medium",
+    "max_alerts_per_hour": 10,
+    "quiet_hours": ["23:00", "06:00"],
+}
+
+# name -> (seconds, operations) measured by one run of a case
+Timings = Dict[str, Tuple[float, int]]
+
+CASES: Dict[str, Callable[[Dict[str, Any]], Timings]] = {}
+
+def case(fn: Callable[[Dict[str, Any]], Timings]) -> Callable[[Dict[str, Any]], Timings]:
+    """Register a benchmark case"""
+    CASES[fn.__name__] = fn
+    return fn
+
+@case
+def detection_batch(ctx: Dict[str, Any]) -> Timings:
+    """One vectorized scan over the whole history"""
+    engine = DetectionEngine(PATTERN_CONFIG)
+    bars = ctx["bars"]["MES"]
+    started = time.perf_counter()
+    engine.run(bars)
+    return {"detection_batch": (time.perf_counter() - started, len(bars["timestamp"]))}
+
+@case
+def detection_incremental(ctx: Dict[str, Any]) -> Timings:
+    """Bar-by-bar detection and zone updates, the live per-bar path"""
+    manager = PatternManager(PATTERN_CONFIG)
+    bars = ctx["bars"]["MES"]
+    buffer = BarBuffer(ctx["buffer_size"])
+    columns = [bars[col].tolist() for col in ("timestamp", "open", "high", "low", "close", "volume")]
+    
+    async def loop():
+        detect = update = 0.0
+        for row in zip(*columns):
+            buffer.append(*row)
+            view = buffer.view()
+            started = time.perf_counter()
+            await manager.detect_patterns(view, "MES", "5m")
+            middle = time.perf_counter()
+            await manager.update_patterns("MES", view, "5m")
+            update += time.perf_counter() - middle
+            detect += middle - started
+        return detect, update
+        
+    detect, update = asyncio.run(loop())
+    n = len(columns[0])
+    return {"detection_incremental": (detect, n), "zone_updates": (update, n)}
+
+@case
+def market_structure(ctx: Dict[str, Any]) -> Timings:
+    """Swing / MSS / BOS tracking bar by bar, and the batch reference"""
+    bars = ctx["bars"]["MES"]
+    columns = [bars[col].tolist() for col in ("open", "high", "low", "close")]
+    tracker = StructureTracker(5, order_blocks=True, min_block_size=0.5)
+    started = time.perf_counter()
+    for index, (o, h, l, c) in enumerate(zip(*columns)):
+        tracker.update(index, o, h, l, c)
+    streamed = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    detect_structure(bars["open"], bars["high"], bars["low"], bars["close"], 5, True, 0.5)
+    batch = time.perf_counter() - started
+    n = len(columns[0])
+    return {"structure_incremental": (streamed, n), "structure_batch": (batch, n)}
+
+@case
+def aggregation(ctx: Dict[str, Any]) -> Timings:
+    """Rolling 5s bars up to 5m/15m/30m/1h"""
+    bars = generate_bars(ctx["bars_5s"], timeframe_s=5, seed=ctx["seed"], symbols=("MES",))["MES"]
+    rows = list(zip(*(bars[col].tolist() for col in ("timestamp", "open", "high", "low", "close", "volume"))))
+    aggregator = MultiTimeframeAggregator(["5m", "15m", "30m", "1h"], base_seconds=5)
+    started = time.perf_counter()
+    for row in rows:
+        aggregator.add(row)
+    return {"aggregation": (time.perf_counter() - started, len(rows))}
+
+@case
+def database(ctx: Dict[str, Any]) -> Timings:
+    """SQLite writes (write-behind and bulk) and filtered, paginated reads"""
+    patterns = ctx["patterns"]
+    
+    async def run(path: str) -> Timings:
+        db = DatabaseManager({"type": "sqlite", "path": path, "write_behind": {"enabled": True}})
+        await db.connect()
+        try:
+            started = time.perf_counter()
+            for pattern in patterns:
+                await db.save_pattern(pattern)
+            await db.flush()
+            saved = time.perf_counter() - started
+            
+            for pattern in patterns:
+                pattern["status"] = "respected"
+            started = time.perf_counter()
+            await db.bulk_save(patterns)
+            bulk = time.perf_counter() - started
+            
+            pages = 0
+            started = time.perf_counter()
+            for symbol in ("MES", "MNQ"):
+                cursor = None
+                while True:
+                    rows, cursor = await db.get_patterns_page(
+                        limit=100, after=cursor, symbol=symbol, timeframe="5m", status="respected"
+                    )
+                    pages += 1
+                    if cursor is None:
+                        break
+            paged = time.perf_counter() - started
+            
+            rows = 0
+            started = time.perf_counter()
+            async for _ in db.iter_patterns(chunk_size=500):
+                rows += 1
+            streamed = time.perf_counter() - started
+        finally:
+            await db.close()
+            
+        return {
+            "db_save_pattern": (saved, len(patterns)),
+            "db_bulk_save": (bulk, len(patterns)),
+            "db_get_patterns_page": (paged, pages),
+            "db_iter_patterns": (streamed, rows),
+        }
+        
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(run(str(Path(tmp) / "bench.db")))
+
+@case
+def alert_gating(ctx: Dict[str, Any]) -> Timings:
+    """Dedup/coalescing and the gate's calendar and rate-limit checks"""
+    alerts = ctx["alerts"]
+    coalescer = AlertCoalescer(window=5.0, dedup_window=900.0)
+    gate = AlertGate(PREFERENCES)
+    
+    started = time.perf_counter()
+    ready = []
+    for alert in alerts:
+        ready.extend(coalescer.add(alert))
+    ready.extend(coalescer.flush())
+    coalesced = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for alert in alerts:
+        if gate.check(alert) is None:
+            gate.take("discord", alert)
+    gated = time.perf_counter() - started
+    return {"alert_coalescing": (coalesced, len(alerts)), "alert_gating": (gated, len(alerts))}
+
+def build_context(bars: int, seed: int, buffer_size: int) -> Dict[str, Any]:
+    """Generate the inputs shared by all cases"""
+    series = generate_bars(bars, seed=seed)
+    
+    # Patterns and alerts come from a real scan so their mix matches live data
+    engine = DetectionEngine(PATTERN_CONFIG)
+    patterns = []
+    for symbol, data in series.items():
+        patterns.extend(engine.to_patterns(engine.run(data), data, symbol, "5m"))
+        
+    priorities = ("low", "medium", "high")
+    alerts = []
+    for i, pattern in enumerate(sorted(patterns, key=lambda p: p["created_at"])):
+        created = datetime.fromisoformat(pattern["created_at"].replace("Z", "+00:00")).timestamp()
+        alerts.append({
+            **{key: pattern[key] for key in ("pattern_id", "symbol", "timeframe", "pattern_type", "direction",
+                                             "mean_threshold", "upper_bound", "lower_bound")},
+            "alert_type": "pattern_formed",
+            "priority": priorities[i % 3],
+            "event_time": created,
+            "queued_at": created,
+            "bar_close": created + 300,
+            "delivered_to": [],
+        })
+        
+    return {
+        "bars": series,
+        "bars_5s": bars * 10,
+        "seed": seed,
+        "buffer_size": buffer_size,
+        "patterns": patterns,
+        "alerts": alerts,
+    }
+
+def run_cases(ctx: Dict[str, Any], names: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Run each case `repeat` times and summarize the time per operation"""
+    samples: Dict[str, List[float]] = {}
+    ops: Dict[str, int] = {}
+    for name in names:
+        for _ in range(repeat):
+            for metric, (seconds, count) in CASES[name](ctx).items():
+                samples.setdefault(metric, []).append(seconds / max(count, 1) * 1e6)
+                ops[metric] = count
+        logger.info(f"{name}: done")
+        
+    return {
+        metric: {
+            "unit": "us/op",
+            "median": round(statistics.median(values), 3),
+            "min": round(min(values), 3),
+            "ops": ops[metric],
+        }
+        for metric, values in samples.items()
+    }
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: Path) -> int:
+    """Print current vs. baseline medians; returns the number of regressions"""
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\nvs {baseline_path.name} ({baseline['meta']['commit']})")
+    print(f"{'case':<24}{'before':>12}{'after':>12}{'ratio':>8}")
+    
+    regressions = 0
+    for metric, result in results.items():
+        before = baseline["results"].get(metric)
+        if before is None:
+            print(f"{metric:<24}{'-':>12}{result['median']:>12.2f}{'new':>8}")
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + REGRESSION_THRESHOLD:
+            flag = "  SLOWER"
+            regressions += 1
+        print(f"{metric:<24}{before['median']:>12.2f}{result['median']:>12.2f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="ICT scanner micro-benchmarks")
+    parser.add_argument("--bars", type=int, default=20_000, help="5m bars per symbol")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (median is reported)")
+    parser.add_argument("--buffer-size", type=int, default=5000, help="Bar buffer capacity")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="Run only these cases")
+    parser.add_argument("--output", type=str, help="Result file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", type=str, help="Earlier result file to compare against")
+    args = parser.parse_args()
+    
+    # The code under test logs at DEBUG on hot paths
+    logger.remove()
+    logger.add(lambda message: print(message, end=""), level="INFO", format="{time:HH:mm:ss} {message}")
+    
+    ctx = build_context(args.bars, args.seed, args.buffer_size)
+    logger.info(f"{args.bars} bars per symbol, {len(ctx['patterns'])} patterns, seed {args.seed}")
+    results = run_cases(ctx, args.only or list(CASES), args.repeat)
+    
+    commit = _commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "bars": args.bars,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    
+    print(f"\n{'case':<24}{'median':>12}{'min':>12}{'ops':>10}  (us/op)")
+    for metric, result in results.items():
+        print(f"{metric:<24}{result['median']:>12.2f}{result['min']:>12.2f}{result['ops']:>10}")
+    print(f"\nSaved to {output}")
+    
+    if args.compare and compare(results, Path(args.compare)):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
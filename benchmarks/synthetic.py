@@ -0,0 +1,163 @@
+"""
+Seeded synthetic MES/MNQ bar generator
+
+Bars follow the CME Globex week (Sunday 18:00 to Friday 17:00 ET with the
+daily 17:00-18:00 maintenance break), prices move on the 0.25 tick, and the
+two index contracts share a common factor so they stay highly correlated.
+Volatility has an intraday shape (quiet overnight, busy at the NY open) and
+switches between calm, normal and stressed regimes; every session reopen gaps.
+Highs and lows come from a sub-bar path, so OHLC are always consistent.
+
+Usage:
+    python -m benchmarks.synthetic --out data/replay --bars 100000
+"""
+
+import argparse
+from pathlib import Path
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+NS_PER_SECOND = 1_000_000_000
+
+# symbol -> (start price, tick size, typical 5m move in points, base volume)
+INSTRUMENTS = {
+    "MES": (4800.0, 0.25, 2.5, 1500.0),
+    "MNQ": (16800.0, 0.25, 11.0, 2500.0),
+}
+
+# Correlation of MES and MNQ bar returns
+INDEX_CORRELATION = 0.9
+
+# Volatility multipliers by regime, and the chance per bar of switching
+REGIMES = np.array([0.6, 1.0, 2.2])
+REGIME_SWITCH_PROB = 1 / 1500
+
+# Volatility multiplier by ET hour (overnight quiet, London pickup, NY open spike)
+INTRADAY = np.array([
+    0.6, 0.6, 0.7, 0.9, 0.9, 0.9, 0.8, 0.8,    # 00-07
+    0.9, 1.6, 1.8, 1.3, 1.0, 0.9, 1.0, 1.3,    # 08-15
+    1.1, 0.0, 0.8, 0.7, 0.6, 0.6, 0.6, 0.6,    # 16-23 (17:00 closed)
+])
+
+def _session_timestamps(n: int, period_s: int, start: str) -> np.ndarray:
+    """Start times (UTC ns) of the first n bars that fall inside Globex hours"""
+    period_ns = period_s * NS_PER_SECOND
+    bars_per_week = int(5 * 23 * 3600 / period_s)
+    weeks = n // bars_per_week + 2
+    
+    begin = pd.Timestamp(start, tz="America/New_York").tz_convert("UTC").value
+    begin -= begin % period_ns
+    slots = begin + np.arange(weeks * 7 * 86400 // period_s, dtype=np.int64) * period_ns
+    
+    local = pd.DatetimeIndex(slots.view("datetime64[ns]"), tz="UTC").tz_convert("America/New_York")
+    weekday, minute = local.dayofweek.to_numpy(), (local.hour * 60 + local.minute).to_numpy()
+    bar_end = minute + period_s / 60
+    
+    # Mon-Thu: closed 17:00-18:00; Fri: closes 17:00; Sat: closed; Sun: opens 18:00
+    daily_break = (minute < 17 * 60) & (bar_end > 17 * 60) | (minute >= 17 * 60) & (minute < 18 * 60)
+    is_open = np.where(
+        weekday <= 3, ~daily_break,
+        np.where(weekday == 4, bar_end <= 17 * 60, (weekday == 6) & (minute >= 18 * 60))
+    )
+    ts = slots[is_open][:n]
+    if ts.size < n:
+        raise ValueError(f"Could only place {ts.size} of {n} bars")
+    return ts
+
+def generate_bars(
+    n: int,
+    timeframe_s: int = 300,
+    seed: int = 0,
+    start: str = "2024-01-07 18:00",
+    symbols: Tuple[str, ...] = ("MES", "MNQ"),
+    substeps: int = 5
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Generate aligned bar series for several index futures
+    
+    Args:
+        n: Bars per symbol
+        timeframe_s: Bar length in seconds
+        seed: RNG seed; the same arguments always give the same bars
+        start: First session open (ET)
+        symbols: Keys of INSTRUMENTS
+        substeps: Path points per bar used to form high and low
+        
+    Returns:
+        symbol -> dict of timestamp (int64 UTC ns) / open / high / low / close / volume
+    """
+    rng = np.random.default_rng(seed)
+    ts = _session_timestamps(n, timeframe_s, start)
+    
+    # Shared state: regime, intraday shape and session gaps
+    switches = np.cumsum(rng.random(n) < REGIME_SWITCH_PROB)
+    regime = rng.choice(len(REGIMES), size=switches[-1] + 1, p=[0.3, 0.5, 0.2])[switches]
+    hour = pd.DatetimeIndex(ts.view("datetime64[ns]"), tz="UTC").tz_convert("America/New_York").hour.to_numpy()
+    scale = REGIMES[regime] * INTRADAY[hour] * np.sqrt(timeframe_s / 300)
+    
+    gap = np.zeros(n)
+    delta = np.diff(ts, prepend=ts[0])
+    reopen = delta > timeframe_s * NS_PER_SECOND
+    gap[reopen] = np.where(delta[reopen] > 2 * 86400 * NS_PER_SECOND, 8.0, 3.0)
+    
+    common = rng.standard_normal((n, substeps))
+    common_gap = rng.standard_normal(n)
+    
+    series = {}
+    for symbol in symbols:
+        price, tick, move, base_volume = INSTRUMENTS[symbol]
+        own = rng.standard_normal((n, substeps))
+        shocks = INDEX_CORRELATION * common + np.sqrt(1 - INDEX_CORRELATION ** 2) * own
+        steps = shocks * (move * scale / np.sqrt(substeps))[:, None]
+        gaps = (INDEX_CORRELATION * common_gap + np.sqrt(1 - INDEX_CORRELATION ** 2)
+                * rng.standard_normal(n)) * gap * move
+                
+        # Open of each bar is the previous close plus any session gap
+        moves = steps.sum(axis=1)
+        close = price + np.cumsum(moves + gaps)
+        open_ = close - moves
+        path = open_[:, None] + np.cumsum(steps, axis=1)
+        
+        def to_tick(values):
+            return np.round(values / tick) * tick
+            
+        open_, close, path = to_tick(open_), to_tick(close), to_tick(path)
+        high = np.maximum(np.maximum(open_, close), path.max(axis=1))
+        low = np.minimum(np.minimum(open_, close), path.min(axis=1))
+        
+        volume = np.round(base_volume * scale * rng.lognormal(0.0, 0.4, n) * np.sqrt(timeframe_s / 300))
+        series[symbol] = {
+            "timestamp": ts.copy(),
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+        }
+    return series
+
+def write_replay_files(out: Path, series: Dict[str, Dict[str, np.ndarray]], timeframe: str) -> None:
+    """Write `{symbol}_{timeframe}.csv` files the replay data source can read"""
+    out.mkdir(parents=True, exist_ok=True)
+    for symbol, data in series.items():
+        frame = pd.DataFrame(data)
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="ns", utc=True)
+        frame.to_csv(out / f"{symbol}_{timeframe}.csv", index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic MES/MNQ bars")
+    parser.add_argument("--out", type=str, default="data/replay", help="Output directory")
+    parser.add_argument("--bars", type=int, default=100_000, help="Bars per symbol")
+    parser.add_argument("--timeframe", type=str, default="5m", help="Bar timeframe (e.g. 5s, 1m, 5m)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=str, default="2024-01-07 18:00", help="First session open (ET)")
+    args = parser.parse_args()
+    
+    from src.data_sources.aggregator import timeframe_to_seconds
+    series = generate_bars(args.bars, timeframe_to_seconds(args.timeframe), args.seed, args.start)
+    write_replay_files(Path(args.out), series, args.timeframe)
+    print(f"Wrote {args.bars} bars per symbol to {args.out}")
+
+if __name__ == "__main__":
+    main()
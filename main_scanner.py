@@ -6,22 +6,68 @@ Monitors MES and MNQ futures for ICT price delivery array patterns
 
 import asyncio
 import argparse
+import time
 import yaml
 from pathlib import Path
 from loguru import logger
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
 
 from src.config import load_config
 from src.data_sources import get_data_source
 from src.patterns import PatternManager
+from src.patterns.sharding import ShardPool
 from src.alerts import AlertManager
 from src.database import DatabaseManager
+from src.backtest import BacktestReport
+from src.data_sources.aggregator import timeframe_to_seconds
+from src.data_sources.bar_store import COLUMNS
+from src.patterns.smt import SmtDivergence
+from src.patterns.store import split_export
+from src.snapshot import write_snapshot, read_snapshot, bar_store_state, restore_bar_store
+from src import metrics
 from src.utils.logging import setup_logging
 
+# Alert priority per pattern event
+ALERT_PRIORITIES = {
+    "pattern_formed": "low",
+    "threshold_respected": "medium",
+    "threshold_breached": "medium",
+    "pattern_filled": "high",
+}
+
+BAR_PROCESSING_SECONDS = metrics.histogram(
+    "scanner_bar_processing_seconds", "Time to run detection, updates, persistence and alert queueing for a bar",
+    ["timeframe"]
+)
+
+BAR_QUEUE_SECONDS = metrics.histogram(
+    "scanner_bar_queue_seconds", "Time from the data source publishing a bar to its processing starting",
+    ["timeframe"]
+)
+
+SNAPSHOT_SECONDS = metrics.histogram(
+    "scanner_snapshot_seconds", "Time to capture and write a state snapshot"
+)
+
 class Scanner:
-    def __init__(self, config_path: str):
-        """Initialize the scanner with configuration"""
+    def __init__(self, config_path: str, data_source: Optional[Dict] = None,
+                 workers: Optional[int] = None):
+        """
+        Initialize the scanner with configuration
+        
+        Args:
+            config_path: Path to the configuration file
+            data_source: Optional replacement for the `data_source` config
+                section (used to run a replay instead of the live feed)
+            workers: Optional override of `performance.detection_workers`
+        """
         self.config = load_config(config_path)
+        if data_source is not None:
+            self.config["data_source"] = data_source
+        if workers is not None:
+            self.config.setdefault("performance", {})["detection_workers"] = workers
         self.setup_components()
         
     def setup_components(self):
@@ -37,10 +83,77 @@ class Scanner:
         self.data_source = get_data_source(self.config["data_source"])
         
         # Initialize pattern detection
-        self.pattern_manager = PatternManager(self.config["patterns"])
+        self.pattern_manager = PatternManager(self.config["patterns"], self.config.get("performance"))
+        
+        # Detection worker processes, started with the streams (0 = in-process)
+        self.workers = int(self.config.get("performance", {}).get("detection_workers", 0))
+        self.shards = None
+        
+        # Replays collect a backtest report
+        replay = self.config["data_source"].get("provider") == "replay"
+        self.report = BacktestReport() if replay else None
+        
+        # Initialize alerting system; replays run it without contacting any channel
+        self.alert_manager = AlertManager(
+            self.config["alerts"], self.config.get("preferences"), dry_run=replay
+        )
+        self.alert_manager.on_sent = self._record_alert
+        
+        # Local Prometheus endpoint (live runs only)
+        metrics_config = self.config.get("metrics") or {}
+        self.metrics_server = None
+        if metrics_config.get("enabled") and not replay:
+            self.metrics_server = metrics.MetricsServer(metrics_config)
+        self._register_gauges()
         
-        # Initialize alerting system
-        self.alert_manager = AlertManager(self.config["alerts"])
+        # Warm starts from periodic state snapshots (live runs only)
+        snapshot_config = self.config.get("snapshot") or {}
+        self.snapshot_path = None
+        if snapshot_config.get("enabled") and not replay:
+            self.snapshot_path = Path(snapshot_config.get("path", "data/snapshot.bin"))
+        self.snapshot_interval = float(snapshot_config.get("interval_seconds", 60))
+        self.snapshot_max_age = float(snapshot_config.get("max_age_hours", 24)) * 3600
+        self._snapshot_task = None
+        
+        # (symbol, timeframe) -> timestamp (ns) of the newest bar fully processed
+        self._processed: Dict[Tuple[str, str], int] = {}
+        
+        # Bars that waited longer than this between the data source and
+        # processing update state without alerting (None = always alert)
+        max_lag = self.config.get("performance", {}).get("max_alert_lag_seconds")
+        self.max_alert_lag = float(max_lag) if max_lag is not None else None
+        self.late_bars = 0
+        
+        # A snapshot holds new bars back and waits for the ones in flight
+        self._bars_in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._resume = asyncio.Event()
+        self._resume.set()
+        
+    def _register_gauges(self):
+        """Expose state sizes and queue depths, read on every scrape"""
+        metrics.gauge("scanner_active_patterns", "Active patterns tracked",
+                      lambda: self.pattern_manager.store.counts(), ["symbol", "timeframe"])
+        metrics.gauge("scanner_pattern_store_bytes", "Memory held by the active pattern tables",
+                      lambda: self.pattern_manager.store.nbytes)
+        metrics.gauge("scanner_alert_queue_depth", "Alerts waiting for dispatch",
+                      lambda: self.alert_manager.queue.qsize())
+        metrics.gauge("scanner_alert_channel_queue_depth", "Alerts waiting per delivery channel",
+                      lambda: {(name,): q.qsize() for name, q in self.alert_manager.channel_queues.items()},
+                      ["channel"])
+        metrics.gauge("scanner_db_pending_rows", "Rows waiting for the next database flush",
+                      lambda: self.db.pending)
+        metrics.gauge("scanner_bar_buffer_bytes", "Memory held by in-memory bar buffers",
+                      lambda: self.data_source.bar_store.nbytes)
+        metrics.gauge("scanner_bar_queue_depth", "Bar events waiting per series",
+                      lambda: {key: q.qsize() for key, q in self.data_source.data_queues.items()},
+                      ["symbol", "timeframe"])
+        metrics.gauge("scanner_bar_events_coalesced", "Bar events merged into later ones because a queue was full",
+                      lambda: {key: q.coalesced for key, q in self.data_source.data_queues.items()},
+                      ["symbol", "timeframe"])
+        metrics.gauge("scanner_late_bars", "Bars processed without alerts for exceeding max_alert_lag_seconds",
+                      lambda: self.late_bars)
         
     async def start(self, instruments: Optional[List[str]] = None, 
                    patterns: Optional[List[str]] = None,
@@ -56,9 +169,40 @@ class Scanner:
             else:
                 configured_instruments = self.config["instruments"]
                 
-            # Connect to data source
+            # Connect to storage and the data source
+            await self.db.connect()
             await self.data_source.connect()
+            await self.alert_manager.start()
+            if self.metrics_server is not None:
+                await self.metrics_server.start()
+                
+            streams = [
+                (instrument["symbol"], tf) for instrument in configured_instruments
+                for tf in timeframes or instrument["timeframes"]
+            ]
             
+            # Start pattern detection
+            await self.pattern_manager.start(
+                instruments=configured_instruments,
+                patterns=patterns
+            )
+            
+            if self.workers > 0:
+                self.shards = ShardPool(
+                    self.config["patterns"], self.workers, patterns,
+                    self.config["data_source"].get("bar_buffer_size", 5000),
+                    self.config["logging"].get("level", "INFO"),
+                    self.config.get("performance")
+                )
+                await self.shards.start(streams)
+                
+            # Resume from the last snapshot and process only the bars missed since,
+            # before live bars start arriving
+            if self.snapshot_path is not None:
+                if await self._restore_snapshot(streams):
+                    await self._catch_up(streams)
+                self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+                
             # Subscribe to market data
             for instrument in configured_instruments:
                 symbol = instrument["symbol"]
@@ -67,16 +211,11 @@ class Scanner:
                 logger.info(f"Subscribing to {symbol} on timeframes: {tfs}")
                 await self.data_source.subscribe(symbol, tfs)
                 
-            # Start pattern detection
-            await self.pattern_manager.start(
-                instruments=configured_instruments,
-                patterns=patterns
-            )
+            # Process bars as they close; live streams never end, replays do
+            await asyncio.gather(*[
+                self._consume(symbol, tf) for symbol, tf in streams
+            ])
             
-            # Keep the scanner running
-            while True:
-                await asyncio.sleep(1)
-                
         except KeyboardInterrupt:
             logger.info("Shutting down scanner...")
         except Exception as e:
@@ -85,11 +224,271 @@ class Scanner:
         finally:
             await self.cleanup()
             
+    async def _consume(self, symbol: str, timeframe: str):
+        """
+        Feed every closed bar of one series through the pipeline
+        
+        An event only wakes this consumer up: it processes every stored bar
+        newer than the last one processed, so the bars of coalesced events are
+        not skipped. Bars that waited longer than `max_alert_lag_seconds` are
+        processed without alerts.
+        """
+        key = (symbol, timeframe)
+        async for event, bars in self.data_source.stream_data(symbol, timeframe):
+            await self._resume.wait()
+            waited = max(0.0, (time.time_ns() - event.published) / 1e9)
+            BAR_QUEUE_SECONDS.observe(waited, timeframe)
+            notify = self.max_alert_lag is None or waited <= self.max_alert_lag
+            
+            self._bars_in_flight += 1
+            self._idle.clear()
+            try:
+                for view in self._unprocessed(key, bars):
+                    if not notify:
+                        self.late_bars += 1
+                    await self.process_bar(symbol, timeframe, view, notify)
+            finally:
+                self._bars_in_flight -= 1
+                if not self._bars_in_flight:
+                    self._idle.set()
+                    
+    def _unprocessed(self, key: Tuple[str, str], bars: Dict[str, np.ndarray]) -> List[Dict[str, np.ndarray]]:
+        """Views of `bars` ending at each bar not processed yet, oldest first (usually just `bars`)"""
+        last = self._processed.get(key)
+        ts = bars["timestamp"]
+        if last is None:
+            return [bars]
+        first = int(np.searchsorted(ts, last, side="right"))
+        return [
+            bars if end == len(ts) else {name: column[:end] for name, column in bars.items()}
+            for end in range(first + 1, len(ts) + 1)
+        ]
+        
+    async def process_bar(self, symbol: str, timeframe: str, bars: Dict, notify: bool = True):
+        """
+        Run detection, state updates, persistence and alerts for a closed bar
+        
+        Args:
+            symbol: Instrument symbol
+            timeframe: Timeframe of the bar
+            bars: Recent bars of the series, newest last
+            notify: Queue alerts (off for bars caught up after a restart)
+        """
+        started = time.perf_counter_ns()
+        
+        # Session levels live in this process, wherever detection runs
+        self.pattern_manager.update_sessions(bars, symbol, timeframe)
+        if self.shards is not None:
+            new_patterns, events, retired = await self.shards.process_bar(symbol, timeframe, bars)
+            # SMT zones are tracked here, not in the workers
+            if self.pattern_manager.smt:
+                events += await self.pattern_manager.update_patterns(symbol, bars, timeframe)
+        else:
+            # Test existing zones first so a new pattern is not checked against its own candle
+            events = await self.pattern_manager.update_patterns(symbol, bars, timeframe)
+            new_patterns = await self.pattern_manager.detect_patterns(bars, symbol, timeframe)
+            retired = []
+        new_patterns += await self.pattern_manager.detect_smt(bars, symbol, timeframe)
+        retired += self.pattern_manager.pop_retired()
+        
+        bar_close = None
+        if new_patterns or events:
+            bar_close = int(bars["timestamp"][-1]) / 1e9 + timeframe_to_seconds(timeframe)
+            
+        for pattern in new_patterns:
+            await self.db.save_pattern(pattern)
+            if notify:
+                await self._alert(pattern, "pattern_formed", bar_close)
+                
+        for event in events:
+            await self.db.save_pattern(event["pattern"])
+            if notify:
+                await self._alert(event["pattern"], event["alert_type"], bar_close)
+            
+        # Expired and evicted patterns are out of memory; storage keeps their final state
+        for pattern in retired:
+            await self.db.save_pattern(pattern)
+        self._processed[(symbol, timeframe)] = int(bars["timestamp"][-1])
+        
+        elapsed = time.perf_counter_ns() - started
+        BAR_PROCESSING_SECONDS.observe(elapsed / 1e9, timeframe)
+        if self.report is not None:
+            self.report.record_bar(symbol, timeframe, elapsed, new_patterns, events, retired)
+            
+    async def _restore_snapshot(self, streams: List[Tuple[str, str]]) -> bool:
+        """
+        Load the last snapshot into the bar store and the pattern state
+        
+        Returns:
+            True if a recent enough snapshot was restored
+        """
+        if not self.snapshot_path.exists():
+            return False
+        started = time.perf_counter()
+        try:
+            state, saved_at = read_snapshot(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring snapshot {self.snapshot_path}: {str(e)}")
+            return False
+            
+        age = time.time() - saved_at / 1e9
+        if age > self.snapshot_max_age:
+            logger.info(f"Snapshot is {age / 3600:.1f}h old, starting without it")
+            return False
+            
+        wanted = set(streams)
+        restore_bar_store(self.data_source.bar_store, [
+            entry for entry in state["bars"] if (entry["symbol"], entry["timeframe"]) in wanted
+        ])
+        for key in wanted:
+            buffer = self.data_source.bar_store.buffers.get(key)
+            if buffer is not None and len(buffer):
+                self._processed[key] = buffer.last_timestamp
+                
+        # Series entries come from this process and, if the snapshot was taken
+        # with detection workers, from each worker
+        patterns = state["patterns"]
+        series = [
+            entry for entry in patterns["series"] + state.get("shards", [])
+            if (entry["symbol"], entry["timeframe"]) in wanted
+        ]
+        if self.shards is None:
+            self.pattern_manager.set_state({"series": series, "smt": patterns["smt"]})
+        else:
+            # SMT zones and session levels are tracked in this process,
+            # everything else by the series' worker
+            local, remote = [], []
+            for entry in series:
+                smt, rest = split_export(entry.get("zones"), {SmtDivergence.pattern_type})
+                local.append({"symbol": entry["symbol"], "timeframe": entry["timeframe"], "zones": smt,
+                              "sessions": entry.get("sessions")})
+                remote.append({**entry, "zones": rest, "sessions": None})
+            self.pattern_manager.set_state({"series": local, "smt": patterns["smt"]})
+            await self.shards.set_state(remote)
+            
+        zones = sum(len(entry["zones"]["ids"]) for entry in series if entry.get("zones"))
+        logger.info(
+            f"Restored {zones} zones and {len(self._processed)} bar buffers from a {age:.0f}s old "
+            f"snapshot in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return True
+        
+    async def _catch_up(self, streams: List[Tuple[str, str]]):
+        """
+        Process the bars that closed while the scanner was down
+        
+        Missed bars of all series run in close-time order, shorter timeframes
+        first on ties, as they would have arrived live. Their patterns and
+        status changes are stored but not alerted, since they are stale by now.
+        """
+        now = time.time_ns()
+        missed = []
+        for symbol, timeframe in streams:
+            buffer = self.data_source.bar_store.buffers.get((symbol, timeframe))
+            if buffer is None or not len(buffer):
+                continue
+                
+            # Up to the bar that is still forming
+            period = timeframe_to_seconds(timeframe) * 1_000_000_000
+            start, end = buffer.last_timestamp + period, now - now % period
+            if start >= end:
+                continue
+            try:
+                # Raw prices, like the buffered bars and the restored zones
+                frame = await self.data_source.get_historical_data(
+                    symbol, timeframe, pd.Timestamp(start, tz="UTC"), pd.Timestamp(end, tz="UTC"),
+                    back_adjust=False
+                )
+            except Exception as e:
+                logger.warning(f"Could not fetch missed {symbol} {timeframe} bars: {str(e)}")
+                continue
+                
+            ts = pd.DatetimeIndex(frame["timestamp"]).as_unit("ns").asi8.tolist()
+            rows = zip(ts, *(frame[name].tolist() for name in COLUMNS[1:]))
+            missed.extend((bar[0] + period, period, symbol, timeframe, bar)
+                          for bar in rows if start <= bar[0] < end)
+            
+        missed.sort(key=lambda item: item[:2])
+        for _, _, symbol, timeframe, bar in missed:
+            buffer = self.data_source.bar_store.append(symbol, timeframe, *bar)
+            await self.process_bar(symbol, timeframe, buffer.view(), notify=False)
+        if missed:
+            logger.info(f"Caught up on {len(missed)} bars missed since the snapshot")
+            
+    async def _snapshot_loop(self):
+        """Write a snapshot every `snapshot.interval_seconds`"""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self._save_snapshot()
+            
+    async def _save_snapshot(self):
+        """Capture the state between bars, then write it out in a thread"""
+        started = time.perf_counter()
+        self._resume.clear()
+        try:
+            await self._idle.wait()
+            state = {
+                "bars": bar_store_state(self.data_source.bar_store, self._processed),
+                "patterns": self.pattern_manager.get_state(),
+            }
+            if self.shards is not None:
+                state["shards"] = await self.shards.get_state()
+        except Exception as e:
+            logger.error(f"Failed to capture snapshot: {str(e)}")
+            return
+        finally:
+            self._resume.set()
+            
+        try:
+            size = await asyncio.to_thread(write_snapshot, self.snapshot_path, state)
+        except OSError as e:
+            logger.error(f"Failed to write snapshot: {str(e)}")
+            return
+        SNAPSHOT_SECONDS.observe(time.perf_counter() - started)
+        logger.debug(f"Snapshot written: {size / 1024:.0f} KiB")
+        
+    async def _alert(self, pattern: Dict, alert_type: str, bar_close: Optional[float] = None):
+        """Queue an alert for a pattern event"""
+        priority = ALERT_PRIORITIES.get(alert_type, "medium")
+        await self.alert_manager.send_alert(pattern, alert_type, priority, bar_close)
+        
+    async def _record_alert(self, alert: Dict):
+        """Persist an alert once a channel has delivered it"""
+        # A coalesced message is recorded against every pattern it covers
+        for member in alert.get("members", [alert]):
+            await self.db.save_alert({
+                "pattern_id": member["pattern_id"],
+                "alert_type": member["alert_type"],
+                "priority": member["priority"],
+                "message": alert["message"],
+            })
+        if self.report is not None:
+            self.report.alerts_sent += 1
+            
     async def cleanup(self):
         """Cleanup resources"""
+        # Final snapshot while the workers still hold their pattern state
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+            await self._save_snapshot()
+            
+        # Drain queued alerts first so they are delivered, recorded and counted
+        await self.alert_manager.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        if self.report is not None:
+            self.report.alerts_suppressed.update(self.alert_manager.gate.suppressed)
+            self.report.alerts_suppressed.update(self.alert_manager.coalescer.stats)
+            self.report.write(self.config["data_source"].get("report", "reports/backtest.json"))
         await self.data_source.disconnect()
+        if self.shards is not None:
+            await self.shards.close()
         await self.db.close()
-        await self.alert_manager.close()
 
 def parse_args():
     """Parse command line arguments"""
@@ -102,6 +501,16 @@ def parse_args():
                        help="Specific patterns to detect (e.g. FVG OrderBlock)")
     parser.add_argument("--timeframes", type=str, nargs="+",
                        help="Specific timeframes to monitor (e.g. 5m 15m)")
+    parser.add_argument("--replay", type=str,
+                       help="Backtest: replay bars from this directory instead of the live feed")
+    parser.add_argument("--speed", type=float, default=0,
+                       help="Replay speed as a multiple of real time (0 = unthrottled)")
+    parser.add_argument("--start", type=str, help="Replay start time (e.g. 2024-01-01)")
+    parser.add_argument("--end", type=str, help="Replay end time")
+    parser.add_argument("--report", type=str, default="reports/backtest.json",
+                       help="Where to write the replay report")
+    parser.add_argument("--workers", type=int,
+                       help="Detection worker processes (0 = detect in the main process)")
     return parser.parse_args()
 
 async def main():
@@ -120,8 +529,20 @@ async def main():
             logger.error("Configuration file not found.")
         return 1
         
+    # Replace the live feed with a replay when backtesting
+    data_source = None
+    if args.replay:
+        data_source = {
+            "provider": "replay",
+            "path": args.replay,
+            "speed": args.speed,
+            "start": args.start,
+            "end": args.end,
+            "report": args.report,
+        }
+        
     # Start the scanner
-    scanner = Scanner(str(config_path))
+    scanner = Scanner(str(config_path), data_source=data_source, workers=args.workers)
     await scanner.start(
         instruments=args.instruments,
         patterns=args.patterns,
@@ -1,26 +1,289 @@
 """
 Alert system package
+
+`send_alert` only snapshots the alert and puts it on a bounded queue, so the
+detection path never waits on the network. A dispatcher task drops repeats,
+merges alerts for the same move across timeframes, runs the result through
+the gate (priority, quiet hours, sessions, rate limits) and fans it out to
+one queue per enabled channel, and each channel delivers from its own
+queue with its own timeout, retries and circuit breaker: a slow SMTP server or
+a rate-limited webhook only backs up that channel.
 """
 
-from typing import Dict, Any
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from zoneinfo import ZoneInfo
+import aiohttp
+from loguru import logger
+
+from .notifiers import Notifier, NOTIFIERS, PRIORITY_LEVELS
+from .gate import AlertGate
+from .coalescer import AlertCoalescer
+from ..patterns.store import parse_stamp
+from .. import metrics
+
+DELIVERY_SECONDS = metrics.histogram(
+    "scanner_alert_delivery_seconds", "Time from queueing an alert to a channel accepting it", ["channel"]
+)
+BAR_TO_ALERT_SECONDS = metrics.histogram(
+    "scanner_bar_to_alert_seconds", "Time from the close of the triggering bar to the first delivery"
+)
+
+# Alert type -> (title, status line) for the message body
+ALERT_TEXT = {
+    "pattern_formed": ("Formed", "🟢 Confirmed"),
+    "threshold_respected": ("Mean Threshold Respected", "🟢 Confirmed"),
+    "threshold_breached": ("Mean Threshold Breach", "🟡 Violated"),
+    "pattern_filled": ("Filled", "🔴 Invalidated"),
+}
 
 class AlertManager:
     """Manages alert generation and delivery"""
     
-    def __init__(self, config: Dict[str, Any]):
-        """Initialize alert manager with configuration"""
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        preferences: Optional[Dict[str, Any]] = None,
+        dry_run: bool = False
+    ):
+        """
+        Initialize alert manager with configuration
+        
+        Args:
+            config: `alerts` config section (one sub-section per channel,
+                plus optional `dispatch` queue settings)
+            preferences: `preferences` config section
+            dry_run: Run the pipeline but don't contact any channel (replays)
+        """
         self.config = config
-        self.notifiers = {}
+        self.preferences = preferences or {}
+        self.dry_run = dry_run
+        self.timezone = ZoneInfo(self.preferences.get("timezone", "America/New_York"))
+        self.gate = AlertGate(self.preferences)
         
-    async def close(self):
-        """Cleanup resources"""
-        pass
+        dispatch = config.get("dispatch") or {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=int(dispatch.get("queue_size", 1000)))
+        self.channel_queue_size = int(dispatch.get("channel_queue_size", 200))
+        self.close_timeout = float(dispatch.get("close_timeout_s", 10))
+        self.coalescer = AlertCoalescer(
+            float(dispatch.get("coalesce_window_s", 5)),
+            float(dispatch.get("dedup_window_s", 900)),
+        )
+        
+        # Called once per outgoing message, after the first channel delivered it
+        self.on_sent: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        
+        self.notifiers: Dict[str, Notifier] = {}
+        if not dry_run:
+            for name, notifier_class in NOTIFIERS.items():
+                channel = config.get(name) or {}
+                if not channel.get("enabled"):
+                    continue
+                try:
+                    self.notifiers[name] = notifier_class(channel)
+                except ValueError as e:
+                    logger.error(f"Alert channel {name} disabled: {e}")
+                    
+        self.channel_queues: Dict[str, asyncio.Queue] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._tasks: List[asyncio.Task] = []
+        self.dropped = 0
         
+    async def start(self) -> None:
+        """Open the shared HTTP session and start the dispatcher and channel workers"""
+        if self._tasks:
+            return
+            
+        if self.notifiers:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300)
+            )
+        for name, notifier in self.notifiers.items():
+            notifier.session = self.session
+            self.channel_queues[name] = asyncio.Queue(maxsize=self.channel_queue_size)
+            self._tasks.append(asyncio.create_task(self._channel_worker(name, notifier)))
+            
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        channels = list(self.notifiers) or (["dry run"] if self.dry_run else [])
+        logger.info(f"Alert manager started with channels: {channels}")
+        
+    async def close(self):
+        """Deliver what is queued (up to close_timeout_s), then stop and release the session"""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._drain(), self.close_timeout)
+            except asyncio.TimeoutError:
+                pending = self.queue.qsize() + sum(q.qsize() for q in self.channel_queues.values())
+                logger.warning(f"Alert manager closed with {pending} alerts undelivered")
+                
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+            
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            
+    async def _drain(self) -> None:
+        await self.queue.join()
+        for alert in self.coalescer.flush():
+            await self._route(alert)
+        for queue in self.channel_queues.values():
+            await queue.join()
+            
     async def send_alert(
         self,
         pattern,
         alert_type: str,
-        priority: str = "medium"
+        priority: str = "medium",
+        bar_close: Optional[float] = None
     ) -> bool:
-        """Send alert for pattern event"""
-        return True
+        """
+        Queue an alert for a pattern event
+        
+        Args:
+            bar_close: Close time (epoch seconds) of the bar that triggered the
+                event, for bar-to-alert latency
+                
+        Returns:
+            False if the alert was dropped because the queue is full
+        """
+        alert = self._build_alert(pattern, alert_type, priority, bar_close)
+        return self._offer(self.queue, alert)
+        
+    def _offer(self, queue: asyncio.Queue, alert: Dict[str, Any]) -> bool:
+        """put_nowait that drops the alert (and logs it) when the queue is full"""
+        try:
+            queue.put_nowait(alert)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Alert queue full, dropped {alert['alert_type']} for {alert['pattern_id']}")
+            return False
+            
+    def _build_alert(self, pattern: Dict[str, Any], alert_type: str, priority: str,
+                     bar_close: Optional[float] = None) -> Dict[str, Any]:
+        """Snapshot the pattern fields an alert needs (the pattern keeps changing)"""
+        timestamp = pattern.get("last_updated") or pattern.get("created_at")
+        alert = {
+            "pattern_id": pattern["pattern_id"],
+            "symbol": pattern["symbol"],
+            "timeframe": pattern["timeframe"],
+            "pattern_type": pattern["pattern_type"],
+            "direction": pattern["direction"],
+            "mean_threshold": pattern["mean_threshold"],
+            "upper_bound": pattern["upper_bound"],
+            "lower_bound": pattern["lower_bound"],
+            "alert_type": alert_type,
+            "priority": priority,
+            "timestamp": timestamp,
+            "event_time": parse_stamp(timestamp) / 1e9 if timestamp else time.time(),
+            "queued_at": time.monotonic(),
+            "bar_close": bar_close,
+            "delivered_to": [],
+        }
+        return alert
+        
+    def format_message(self, alert: Dict[str, Any]) -> str:
+        """Render the alert text sent to every channel"""
+        title, status = ALERT_TEXT.get(alert["alert_type"], (alert["alert_type"], "🟡"))
+        direction = alert["direction"].capitalize()
+        
+        if alert["alert_type"] == "pattern_formed":
+            action = f"New zone {alert['lower_bound']:,.2f} - {alert['upper_bound']:,.2f}"
+        elif alert["alert_type"] == "pattern_filled":
+            edge = "BELOW lower bound" if alert["direction"] == "bullish" else "ABOVE upper bound"
+            action = f"Candle closed {edge}"
+        else:
+            above = (alert["direction"] == "bullish") == (alert["alert_type"] == "threshold_respected")
+            action = f"Candle closed {'ABOVE' if above else 'BELOW'} mean threshold"
+            
+        members = alert.get("members")
+        if members:
+            level = " · ".join(f"{m['timeframe']} {m['mean_threshold']:,.2f}" for m in members)
+        else:
+            level = f"{alert['mean_threshold']:,.2f}"
+            
+        local = datetime.fromtimestamp(alert["event_time"], self.timezone)
+        when = local.strftime("%Y-%m-%d %H:%M:%S %Z")
+            
+        return "\n".join([
+            f"🎯 {alert['symbol']} {alert['timeframe']} {alert['pattern_type']} Alert",
+            f"📊 Pattern: {direction} {alert['pattern_type']} {title}",
+            f"💹 Action: {action}",
+            f"📈 Level: {level}",
+            f"⏰ Time: {when}",
+            f"🎨 Status: {status}",
+        ])
+        
+    async def _dispatch(self) -> None:
+        """Move alerts from the main queue through the coalescer to the channels"""
+        while True:
+            deadline = self.coalescer.next_deadline()
+            try:
+                if deadline is None:
+                    alert = await self.queue.get()
+                elif not self.queue.empty():
+                    alert = self.queue.get_nowait()
+                else:
+                    alert = await asyncio.wait_for(self.queue.get(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                alert = None
+                
+            try:
+                ready = self.coalescer.add(alert) if alert is not None else []
+                ready.extend(self.coalescer.expired())
+                for outgoing in ready:
+                    await self._route(outgoing)
+            except Exception as e:
+                logger.error(f"Alert dispatch failed: {str(e)}")
+            finally:
+                if alert is not None:
+                    self.queue.task_done()
+                    
+    async def _route(self, alert: Dict[str, Any]) -> None:
+        """Gate an outgoing alert and hand it to every channel that takes it"""
+        if self.gate.check(alert) is not None:
+            return
+            
+        alert["message"] = self.format_message(alert)
+        if self.dry_run:
+            if self.gate.take("dry_run", alert):
+                await self._delivered(alert, "dry_run")
+            return
+            
+        for name, notifier in self.notifiers.items():
+            if notifier.accepts(alert) and self.gate.take(name, alert):
+                self._offer(self.channel_queues[name], alert)
+                
+    async def _channel_worker(self, name: str, notifier: Notifier) -> None:
+        """Deliver one channel's alerts in order"""
+        queue = self.channel_queues[name]
+        while True:
+            alert = await queue.get()
+            try:
+                if await notifier.deliver(alert):
+                    DELIVERY_SECONDS.observe(time.monotonic() - alert["queued_at"], name)
+                    await self._delivered(alert, name)
+            except Exception as e:
+                logger.error(f"{name}: delivery error: {str(e)}")
+            finally:
+                queue.task_done()
+                
+    async def _delivered(self, alert: Dict[str, Any], channel: str) -> None:
+        """Record a delivery; the first one reports the alert as sent"""
+        alert["delivered_to"].append(channel)
+        if len(alert["delivered_to"]) == 1:
+            if alert.get("bar_close") and not self.dry_run:
+                BAR_TO_ALERT_SECONDS.observe(max(0.0, time.time() - alert["bar_close"]))
+            logger.debug(
+                f"Alert {alert['alert_type']} for {alert['pattern_id']} delivered via {channel} "
+                f"in {(time.monotonic() - alert['queued_at']) * 1000:.0f}ms"
+            )
+            if self.on_sent is not None:
+                await self.on_sent(alert)
+
+__all__ = ["AlertManager", "AlertGate", "AlertCoalescer", "Notifier", "NOTIFIERS", "PRIORITY_LEVELS"]
@@ -0,0 +1,145 @@
+"""
+Alert deduplication and cross-timeframe coalescing
+
+One move often trips the same zone on several timeframes within seconds, and
+a zone whose status flips back and forth re-raises the same alert. The
+coalescer drops an alert that repeats a (pattern_id, alert_type) inside the
+dedup window, and holds the rest briefly so alerts for the same symbol,
+direction and alert type with overlapping zones leave as one multi-timeframe
+message.
+
+A group closes `window` seconds after its first alert, measured on the wall
+clock for live feeds and on event time for replays, whichever comes first.
+"""
+
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional
+
+from ..data_sources.aggregator import timeframe_to_seconds
+from .notifiers import PRIORITY_LEVELS
+
+class AlertCoalescer:
+    """Groups alerts that describe the same move"""
+    
+    def __init__(self, window: float = 5.0, dedup_window: float = 900.0):
+        """
+        Args:
+            window: Seconds to hold an alert for others to join it (0 = off)
+            dedup_window: Seconds a (pattern_id, alert_type) is remembered (0 = off)
+        """
+        self.window = window
+        self.dedup_window = dedup_window
+        
+        self._groups: List[Dict[str, Any]] = []   # Open groups, oldest first
+        self._seen: OrderedDict = OrderedDict()    # (pattern_id, alert_type) -> event time
+        self.stats = Counter()
+        
+    def __len__(self) -> int:
+        return len(self._groups)
+        
+    def add(self, alert: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Take a new alert
+        
+        Returns:
+            Alerts ready to go out (groups this alert's event time has closed)
+        """
+        if self._is_duplicate(alert):
+            self.stats["duplicate"] += 1
+            return []
+            
+        if self.window <= 0:
+            return [alert]
+            
+        ready = self._close(lambda group: alert["event_time"] - group["event_time"] > self.window)
+        
+        for group in self._groups:
+            if self._joins(group, alert):
+                group["members"].append(alert)
+                group["lower"] = min(group["lower"], alert["lower_bound"])
+                group["upper"] = max(group["upper"], alert["upper_bound"])
+                self.stats["coalesced"] += 1
+                break
+        else:
+            self._groups.append({
+                "key": (alert["symbol"], alert["direction"], alert["alert_type"]),
+                "lower": alert["lower_bound"],
+                "upper": alert["upper_bound"],
+                "event_time": alert["event_time"],
+                "deadline": time.monotonic() + self.window,
+                "members": [alert],
+            })
+        return ready
+        
+    def expired(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Alerts whose group has been held for the full window"""
+        now = time.monotonic() if now is None else now
+        return self._close(lambda group: group["deadline"] <= now)
+        
+    def flush(self) -> List[Dict[str, Any]]:
+        """Close every open group"""
+        return self._close(lambda group: True)
+        
+    def next_deadline(self) -> Optional[float]:
+        """Monotonic time at which the oldest open group closes"""
+        return self._groups[0]["deadline"] if self._groups else None
+        
+    def _is_duplicate(self, alert: Dict[str, Any]) -> bool:
+        if self.dedup_window <= 0:
+            return False
+            
+        now = alert["event_time"]
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if now - seen_at <= self.dedup_window:
+                break
+            self._seen.popitem(last=False)
+            
+        # Event times are bar starts and a higher timeframe's trail a lower
+        # one's, so an expired entry can outlive the eviction behind a newer
+        # head: judge the key by its own time
+        key = (alert["pattern_id"], alert["alert_type"])
+        seen_at = self._seen.get(key)
+        if seen_at is not None and now - seen_at <= self.dedup_window:
+            return True
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        return False
+        
+    @staticmethod
+    def _joins(group: Dict[str, Any], alert: Dict[str, Any]) -> bool:
+        return (
+            group["key"] == (alert["symbol"], alert["direction"], alert["alert_type"])
+            and alert["lower_bound"] <= group["upper"]
+            and group["lower"] <= alert["upper_bound"]
+        )
+        
+    def _close(self, done) -> List[Dict[str, Any]]:
+        keep, ready = [], []
+        for group in self._groups:
+            (ready if done(group) else keep).append(group)
+        self._groups = keep
+        return [self._merge(group["members"]) for group in ready]
+        
+    @staticmethod
+    def _merge(members: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One alert standing for the whole group"""
+        if len(members) == 1:
+            return members[0]
+            
+        members = sorted(members, key=lambda a: timeframe_to_seconds(a["timeframe"]))
+        merged = dict(members[-1])
+        merged.update({
+            "timeframe": "/".join(dict.fromkeys(a["timeframe"] for a in members)),
+            "pattern_type": "/".join(dict.fromkeys(a["pattern_type"] for a in members)),
+            "priority": max((a["priority"] for a in members), key=lambda p: PRIORITY_LEVELS.get(p, 1)),
+            "lower_bound": min(a["lower_bound"] for a in members),
+            "upper_bound": max(a["upper_bound"] for a in members),
+            "event_time": max(a["event_time"] for a in members),
+            "queued_at": min(a["queued_at"] for a in members),
+            "bar_close": min((a["bar_close"] for a in members if a.get("bar_close")), default=None),
+            "delivered_to": [],
+            "members": members,
+        })
+        return merged
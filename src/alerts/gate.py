@@ -0,0 +1,121 @@
+"""
+Alert gating: minimum priority, quiet hours, sessions and rate limits
+
+All time-of-day rules are compiled once into a minute-of-week table in the
+configured timezone, so checking an alert is a table lookup (local time
+comes from the shared session calendar's DST table). Rate limits are
+token buckets per (channel, symbol) refilled at `max_alerts_per_hour`. Alerts
+are judged by their event time, which keeps replays gated the way live
+trading would have been.
+"""
+
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from .notifiers import PRIORITY_LEVELS
+from ..patterns.sessions import session_calendar, DEFAULT_TIMEZONE
+
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Calendar table values
+OPEN, QUIET, OUT_OF_SESSION = 0, 1, 2
+
+def _minutes(value: str) -> int:
+    """'HH:MM' -> minutes after midnight"""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _mark(table: bytearray, window: List[str], value: int) -> None:
+    """Set every minute of a daily window (which may wrap midnight) to `value`"""
+    start, end = _minutes(window[0]), _minutes(window[1])
+    for day in range(7):
+        base = day * MINUTES_PER_DAY
+        if start <= end:
+            spans = [(base + start, base + end)]
+        else:
+            spans = [(base + start, base + MINUTES_PER_DAY), (base, base + end)]
+        for lo, hi in spans:
+            table[lo:hi] = bytes([value]) * (hi - lo)
+
+class AlertGate:
+    """Decides whether an alert may go out, and on which channels"""
+    
+    def __init__(self, preferences: Dict[str, Any]):
+        """
+        Args:
+            preferences: `preferences` config section
+        """
+        self.sessions = session_calendar(preferences.get("timezone", DEFAULT_TIMEZONE))
+        self.min_priority = PRIORITY_LEVELS[preferences.get("minimum_priority", "low")]
+        
+        per_hour = preferences.get("max_alerts_per_hour")
+        self.capacity = float(per_hour) if per_hour else None
+        self.refill_per_s = self.capacity / 3600.0 if per_hour else 0.0
+        
+        self.calendar = self._compile(preferences)
+        
+        # (channel, symbol) -> [tokens, event time of last refill]
+        self._buckets: Dict[Tuple[str, str], List[float]] = {}
+        
+        self.suppressed = Counter()   # reason -> alerts held back
+        
+    @staticmethod
+    def _compile(preferences: Dict[str, Any]) -> bytearray:
+        """Build the minute-of-week table (Monday 00:00 local = index 0)"""
+        sessions = [
+            session["hours"] for session in (preferences.get("session_filters") or {}).values()
+            if session.get("enabled")
+        ]
+        # With sessions enabled only their hours are open
+        table = bytearray([OUT_OF_SESSION if sessions else OPEN]) * MINUTES_PER_WEEK
+        for hours in sessions:
+            _mark(table, hours, OPEN)
+            
+        quiet = preferences.get("quiet_hours")
+        if quiet:
+            _mark(table, quiet, QUIET)
+        return table
+        
+    def minute_of_week(self, event_time: float) -> int:
+        """Local minute of the week for a UTC epoch time in seconds"""
+        return self.sessions.minute_of_week(int(event_time * 1_000_000_000))
+        
+    def check(self, alert: Dict[str, Any]) -> Optional[str]:
+        """
+        Apply the priority and calendar rules
+        
+        Returns:
+            Reason the alert is held back, or None if it may go out
+        """
+        if PRIORITY_LEVELS.get(alert["priority"], 1) < self.min_priority:
+            reason = "below_minimum_priority"
+        else:
+            slot = self.calendar[self.minute_of_week(alert["event_time"])]
+            if slot == OPEN:
+                return None
+            reason = "quiet_hours" if slot == QUIET else "outside_sessions"
+            
+        self.suppressed[reason] += 1
+        return reason
+        
+    def take(self, channel: str, alert: Dict[str, Any]) -> bool:
+        """Spend one token of the channel's budget for the alert's symbol"""
+        if self.capacity is None:
+            return True
+            
+        now = alert["event_time"]
+        bucket = self._buckets.get((channel, alert["symbol"]))
+        if bucket is None:
+            bucket = self._buckets[(channel, alert["symbol"])] = [self.capacity, now]
+            
+        elapsed = now - bucket[1]
+        if elapsed > 0:
+            bucket[0] = min(self.capacity, bucket[0] + elapsed * self.refill_per_s)
+            bucket[1] = now
+            
+        if bucket[0] < 1.0:
+            self.suppressed["rate_limited"] += 1
+            return False
+        bucket[0] -= 1.0
+        return True
@@ -0,0 +1,322 @@
+"""
+Alert delivery channels
+
+Every notifier owns its delivery policy: a per-request timeout, retries with
+exponential backoff (or the server's Retry-After on 429) and a circuit breaker
+that stops calling a channel that keeps failing. HTTP channels share the
+AlertManager's aiohttp session, so webhook calls reuse keep-alive connections.
+"""
+
+import asyncio
+import json
+import random
+import smtplib
+import time
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from typing import Dict, Any, Optional, List, Set
+import aiohttp
+from loguru import logger
+
+PRIORITY_LEVELS = {"low": 0, "medium": 1, "high": 2}
+
+class DeliveryError(Exception):
+    """A channel refused or failed to take an alert"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None,
+                 permanent: bool = False):
+        """
+        Args:
+            message: What went wrong
+            retry_after: Seconds the server asked us to wait before retrying
+            permanent: Retrying the same request cannot succeed
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+class CircuitBreaker:
+    """Stops calling a channel after repeated failures, then probes it again"""
+    
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """
+        Args:
+            failure_threshold: Consecutive failed deliveries that open the breaker
+            reset_timeout: Seconds to wait before letting a trial delivery through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        
+    def allow(self) -> bool:
+        """Whether a delivery may be attempted now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        return True
+        
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class Notifier(ABC):
+    """Base class for a delivery channel"""
+    
+    name = "notifier"
+    
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: Channel section of the alerts config. Delivery policy keys:
+                timeout_s, max_retries, backoff_s, max_backoff_s,
+                breaker_threshold, breaker_reset_s, min_priority
+        """
+        self.config = config
+        self.timeout = float(config.get("timeout_s", 10))
+        # Bound on one send() call; None when the channel enforces it itself
+        self.attempt_timeout: Optional[float] = self.timeout
+        self.max_retries = int(config.get("max_retries", 3))
+        self.backoff = float(config.get("backoff_s", 1.0))
+        self.max_backoff = float(config.get("max_backoff_s", 30.0))
+        self.min_priority = PRIORITY_LEVELS[config.get("min_priority", "low")]
+        self.breaker = CircuitBreaker(
+            int(config.get("breaker_threshold", 5)),
+            float(config.get("breaker_reset_s", 60)),
+        )
+        self.session: Optional[aiohttp.ClientSession] = None
+        
+    def accepts(self, alert: Dict[str, Any]) -> bool:
+        """Whether this channel wants alerts of this priority"""
+        return PRIORITY_LEVELS.get(alert["priority"], 1) >= self.min_priority
+        
+    @abstractmethod
+    async def send(self, alert: Dict[str, Any]) -> None:
+        """Make one delivery attempt; raise DeliveryError on failure"""
+        pass
+        
+    async def deliver(self, alert: Dict[str, Any]) -> bool:
+        """
+        Deliver an alert, retrying with backoff
+        
+        Returns:
+            True if the channel took the alert
+        """
+        if not self.breaker.allow():
+            logger.debug(f"{self.name}: circuit open, skipping {alert['pattern_id']}")
+            return False
+            
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.wait_for(self.send(alert), self.attempt_timeout)
+                self.breaker.record_success()
+                return True
+            except DeliveryError as e:
+                error, retry_after, permanent = str(e), e.retry_after, e.permanent
+            except (asyncio.TimeoutError, aiohttp.ClientError, OSError) as e:
+                error, retry_after, permanent = f"{type(e).__name__}: {e}", None, False
+                
+            if permanent or attempt == self.max_retries:
+                break
+                
+            delay = retry_after
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.debug(f"{self.name}: attempt {attempt + 1} failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            
+        self.breaker.record_failure()
+        logger.warning(f"{self.name}: failed to deliver {alert['pattern_id']}: {error}")
+        return False
+        
+    async def _post(self, url: str, **kwargs) -> Dict[str, Any]:
+        """POST and map HTTP errors to DeliveryError"""
+        async with self.session.post(url, **kwargs) as response:
+            if response.status < 300:
+                if response.content_type == "application/json":
+                    return await response.json()
+                return {}
+                
+            body = await response.text()
+            retry_after = None
+            if response.status == 429:
+                retry_after = self._retry_after(response.headers.get("Retry-After"), body)
+            raise DeliveryError(
+                f"HTTP {response.status}: {body[:200]}",
+                retry_after=retry_after,
+                permanent=400 <= response.status < 500 and response.status not in (408, 429),
+            )
+            
+    def _retry_after(self, header: Optional[str], body: str) -> Optional[float]:
+        """Retry delay from a 429 response"""
+        try:
+            return min(self.max_backoff, float(header)) if header else None
+        except ValueError:
+            return None
+
+class DiscordNotifier(Notifier):
+    """Posts alerts to a Discord webhook"""
+    
+    name = "discord"
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.webhook_url = config.get("webhook_url", "")
+        if not self.webhook_url.startswith("http"):
+            raise ValueError("webhook_url is not set")
+            
+    async def send(self, alert: Dict[str, Any]) -> None:
+        await self._post(self.webhook_url, json={"content": alert["message"]})
+
+class TelegramNotifier(Notifier):
+    """Sends alerts through a Telegram bot"""
+    
+    name = "telegram"
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        token = config.get("bot_token", "")
+        self.chat_id = config.get("chat_id")
+        if not token or token.startswith("YOUR_") or not self.chat_id:
+            raise ValueError("bot_token or chat_id is not set")
+        api_url = config.get("api_url", "https://api.telegram.org")
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        
+    async def send(self, alert: Dict[str, Any]) -> None:
+        await self._post(self.url, json={"chat_id": self.chat_id, "text": alert["message"]})
+        
+    def _retry_after(self, header: Optional[str], body: str) -> Optional[float]:
+        # Telegram puts the delay in the JSON body: {"parameters": {"retry_after": N}}
+        try:
+            return min(self.max_backoff, float(json.loads(body)["parameters"]["retry_after"]))
+        except (ValueError, KeyError, TypeError):
+            return super()._retry_after(header, body)
+
+class SmsNotifier(Notifier):
+    """Sends alerts as SMS through the Twilio REST API"""
+    
+    name = "sms"
+    
+    def __init__(self, config: Dict[str, Any]):
+        config = {"min_priority": "high", **config}
+        super().__init__(config)
+        self.sid = config.get("twilio_sid", "")
+        self.auth = aiohttp.BasicAuth(self.sid, config.get("twilio_token", ""))
+        self.from_number = config.get("from_number")
+        self.to_numbers: List[str] = list(config.get("to_numbers", []))
+        if not self.sid or self.sid.startswith("YOUR_") or not self.to_numbers:
+            raise ValueError("twilio_sid or to_numbers is not set")
+        api_url = config.get("api_url", "https://api.twilio.com")
+        self.url = f"{api_url}/2010-04-01/Accounts/{self.sid}/Messages.json"
+        # id(alert) -> numbers that already got it, while the alert is being delivered
+        self._reached: Dict[int, Set[str]] = {}
+        
+    async def deliver(self, alert: Dict[str, Any]) -> bool:
+        self._reached[id(alert)] = set()
+        try:
+            return await super().deliver(alert)
+        finally:
+            del self._reached[id(alert)]
+            
+    async def send(self, alert: Dict[str, Any]) -> None:
+        # A retry only texts the numbers earlier attempts did not reach
+        reached = self._reached.setdefault(id(alert), set())
+        pending = [number for number in self.to_numbers if number not in reached]
+        results = await asyncio.gather(
+            *[self._send_to(number, alert, reached) for number in pending],
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            retryable = [e for e in errors if not (isinstance(e, DeliveryError) and e.permanent)]
+            raise (retryable or errors)[0]
+            
+    async def _send_to(self, number: str, alert: Dict[str, Any], reached: Set[str]) -> None:
+        await self._post(self.url, auth=self.auth, data={
+            "From": self.from_number, "To": number, "Body": alert["message"],
+        })
+        reached.add(number)
+
+class EmailNotifier(Notifier):
+    """Sends alerts by email over SMTP"""
+    
+    name = "email"
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.server = config.get("smtp_server", "")
+        self.port = int(config.get("smtp_port", 587))
+        self.use_tls = config.get("use_tls", True)
+        self.username = config.get("username")
+        self.password = config.get("password")
+        self.sender = config.get("from_address", self.username)
+        self.recipients: List[str] = list(config.get("recipients", []))
+        if not self.server or not self.recipients:
+            raise ValueError("smtp_server or recipients is not set")
+        # Cancelling the await would leave the smtplib thread running, and a
+        # retry could then send the email twice: _send_sync bounds itself
+        self.attempt_timeout = None
+            
+    async def send(self, alert: Dict[str, Any]) -> None:
+        msg = EmailMessage()
+        msg["Subject"] = alert["message"].splitlines()[0]
+        msg["From"] = self.sender or "ict-scanner"
+        msg["To"] = ", ".join(self.recipients)
+        msg.set_content(alert["message"])
+        
+        # smtplib blocks; run it off the event loop so other channels keep going
+        try:
+            await asyncio.to_thread(self._send_sync, msg)
+        except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused,
+                smtplib.SMTPSenderRefused) as e:
+            raise DeliveryError(f"{type(e).__name__}: {e}", permanent=True)
+        except smtplib.SMTPException as e:
+            raise DeliveryError(f"{type(e).__name__}: {e}")
+            
+    def _send_sync(self, msg: EmailMessage) -> None:
+        """
+        One SMTP session, bounded by `timeout` as a whole: socket timeouts are
+        per operation, so every step only gets the time left
+        """
+        deadline = time.monotonic() + self.timeout
+        
+        def remaining() -> float:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"SMTP session took longer than {self.timeout}s")
+            return left
+            
+        with smtplib.SMTP(self.server, self.port, timeout=remaining()) as smtp:
+            if self.use_tls:
+                smtp.sock.settimeout(remaining())
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.sock.settimeout(remaining())
+                smtp.login(self.username, self.password)
+            smtp.sock.settimeout(remaining())
+            try:
+                smtp.send_message(msg)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                raise
+            except OSError as e:
+                # The server may have taken the message: retrying could duplicate it
+                raise DeliveryError(f"outcome unknown, not retrying: {type(e).__name__}: {e}",
+                                    permanent=True)
+
+# Config section name -> notifier class
+NOTIFIERS = {
+    "discord": DiscordNotifier,
+    "telegram": TelegramNotifier,
+    "email": EmailNotifier,
+    "sms": SmsNotifier,
+}
@@ -0,0 +1,104 @@
+"""
+Backtest reporting for replay runs
+"""
+
+import json
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import numpy as np
+from loguru import logger
+
+class BacktestReport:
+    """Collects pattern, threshold and timing statistics during a replay"""
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self.bar_times_ns: List[int] = []
+        self.bars = Counter()                 # "MES 5m" -> bars processed
+        self.formed = Counter()               # (pattern_type, timeframe) -> count
+        self.events = defaultdict(Counter)    # pattern_type -> alert_type -> count
+        self.hit_patterns = defaultdict(set)  # (pattern_type, alert_type) -> pattern ids
+        self.retired = defaultdict(Counter)   # pattern_type -> expired / evicted -> count
+        self.alerts_sent = 0
+        self.alerts_suppressed = Counter()   # reason -> alerts not sent as a message of their own
+        
+    def record_bar(
+        self,
+        symbol: str,
+        timeframe: str,
+        elapsed_ns: int,
+        new_patterns: List[Dict[str, Any]],
+        events: List[Dict[str, Any]],
+        retired: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Record the outcome of processing one bar"""
+        self.bar_times_ns.append(elapsed_ns)
+        self.bars[f"{symbol} {timeframe}"] += 1
+        
+        for pattern in new_patterns:
+            self.formed[(pattern["pattern_type"], pattern["timeframe"])] += 1
+            
+        for event in events:
+            pattern = event["pattern"]
+            self.events[pattern["pattern_type"]][event["alert_type"]] += 1
+            self.hit_patterns[(pattern["pattern_type"], event["alert_type"])].add(pattern["pattern_id"])
+            
+        for pattern in retired or []:
+            self.retired[pattern["pattern_type"]][pattern["status"]] += 1
+            
+    def summary(self) -> Dict[str, Any]:
+        """Build the report as a JSON-serializable dict"""
+        times_us = np.asarray(self.bar_times_ns, dtype=np.float64) / 1000.0
+        timing = {}
+        if times_us.size:
+            p50, p90, p99 = np.percentile(times_us, [50, 90, 99])
+            timing = {
+                "mean_us": float(times_us.mean()),
+                "p50_us": float(p50),
+                "p90_us": float(p90),
+                "p99_us": float(p99),
+                "max_us": float(times_us.max()),
+            }
+            
+        formed_by_type = Counter()
+        patterns = defaultdict(dict)
+        for (pattern_type, timeframe), count in self.formed.items():
+            formed_by_type[pattern_type] += count
+            patterns[pattern_type][timeframe] = count
+            
+        # Share of formed patterns that saw each threshold event at least once
+        hit_rates = defaultdict(dict)
+        for (pattern_type, alert_type), ids in self.hit_patterns.items():
+            if formed_by_type[pattern_type]:
+                hit_rates[pattern_type][alert_type] = len(ids) / formed_by_type[pattern_type]
+                
+        return {
+            "wall_time_s": time.monotonic() - self.started,
+            "bars_processed": sum(self.bars.values()),
+            "bars_by_series": dict(self.bars),
+            "bar_processing": timing,
+            "patterns_formed": dict(patterns),
+            "threshold_events": {k: dict(v) for k, v in self.events.items()},
+            "threshold_hit_rates": dict(hit_rates),
+            "patterns_retired": {k: dict(v) for k, v in self.retired.items()},
+            "alerts_sent": self.alerts_sent,
+            "alerts_suppressed": dict(self.alerts_suppressed),
+        }
+        
+    def write(self, path: str) -> Dict[str, Any]:
+        """Write the report as JSON and log a short summary"""
+        report = self.summary()
+        out = Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+            
+        timing = report["bar_processing"]
+        logger.info(
+            f"Backtest: {report['bars_processed']} bars in {report['wall_time_s']:.1f}s, "
+            f"p50 {timing.get('p50_us', 0):.0f}us / p99 {timing.get('p99_us', 0):.0f}us per bar. "
+            f"Report written to {out}"
+        )
+        return report
@@ -4,7 +4,12 @@ Data source factory module
 
 from typing import Dict, Any
 from .base import DataSource
+from .bar_store import BarStore, BarBuffer
+from .queues import BarEvent, BarQueue
+from .pacing import RequestScheduler
+from .contracts import ContractRegistry, RollCalendar
 from .interactive_brokers import IBDataSource
+from .replay import ReplayDataSource
 
 def get_data_source(config: Dict[str, Any]) -> DataSource:
     """
@@ -23,7 +28,13 @@ def get_data_source(config: Dict[str, Any]) -> DataSource:
     
     if provider == "interactive_brokers":
         return IBDataSource(config)
+    elif provider == "replay":
+        return ReplayDataSource(config)
     else:
         raise ValueError(f"Unsupported data provider: {provider}")
         
-__all__ = ["get_data_source", "DataSource", "IBDataSource"] 
\ No newline at end of file
+__all__ = [
+    "get_data_source", "DataSource", "IBDataSource", "ReplayDataSource",
+    "BarStore", "BarBuffer", "BarEvent", "BarQueue",
+    "RequestScheduler", "ContractRegistry", "RollCalendar"
+] 
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Incremental multi-timeframe bar aggregation
+
+IB only streams 5-second real-time bars. Higher timeframes are rolled up
+locally: every timeframe is built from the next lower configured timeframe it
+divides evenly (5s -> 5m -> 15m -> 30m -> 1h), and buckets are aligned to UTC
+epoch multiples so bar closes line up across timeframes.
+"""
+
+from typing import List, Tuple, Optional, Iterable
+
+NS_PER_SECOND = 1_000_000_000
+
+# (timestamp_ns, open, high, low, close, volume)
+Bar = Tuple[int, float, float, float, float, float]
+
+def timeframe_to_seconds(timeframe: str) -> int:
+    """Convert a timeframe string ("5s", "5m", "1h") to seconds"""
+    unit = timeframe[-1]
+    value = int(timeframe[:-1])
+    
+    if unit == "s":
+        return value
+    elif unit == "m":
+        return value * 60
+    elif unit == "h":
+        return value * 3600
+    else:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+
+class TimeframeAggregator:
+    """Rolls bars of one period into bars of a longer period"""
+    
+    def __init__(self, timeframe: str, period_s: int, child_period_s: int):
+        """
+        Args:
+            timeframe: Timeframe string of the output bars
+            period_s: Output bar length in seconds
+            child_period_s: Input bar length in seconds, must divide period_s
+        """
+        if period_s % child_period_s:
+            raise ValueError(f"{timeframe} is not a multiple of {child_period_s}s")
+            
+        self.timeframe = timeframe
+        self.period = period_s * NS_PER_SECOND
+        self.child_period = child_period_s * NS_PER_SECOND
+        
+        # Partial bar being built
+        self._start: Optional[int] = None
+        self._open = self._high = self._low = self._close = self._volume = 0.0
+        
+    def add(self, bar: Bar) -> List[Bar]:
+        """
+        Fold one input bar into the current bucket
+        
+        Args:
+            bar: Input bar, timestamp is the bar start
+            
+        Returns:
+            Completed output bars (usually zero or one; a gap in the input can
+            flush the previous bucket before the new one completes)
+        """
+        ts, o, h, l, c, v = bar
+        start = ts - ts % self.period
+        completed = []
+        
+        if self._start is not None and start != self._start:
+            # Input skipped the end of the previous bucket, close it as is
+            if start > self._start:
+                completed.append(self._flush())
+            else:
+                # Late bar for an already closed bucket
+                return completed
+                
+        if self._start is None:
+            self._start = start
+            self._open, self._high, self._low, self._close, self._volume = o, h, l, c, v
+        else:
+            if h > self._high:
+                self._high = h
+            if l < self._low:
+                self._low = l
+            self._close = c
+            self._volume += v
+            
+        # The last child bar of the bucket closes it right away
+        if ts + self.child_period >= start + self.period:
+            completed.append(self._flush())
+        return completed
+        
+    def _flush(self) -> Bar:
+        """Emit the partial bar and reset"""
+        bar = (self._start, self._open, self._high, self._low, self._close, self._volume)
+        self._start = None
+        return bar
+        
+    @property
+    def partial(self) -> Optional[Bar]:
+        """The bar currently being built, if any"""
+        if self._start is None:
+            return None
+        return (self._start, self._open, self._high, self._low, self._close, self._volume)
+
+class MultiTimeframeAggregator:
+    """Cascade of aggregators fed by a single base bar stream"""
+    
+    def __init__(self, timeframes: Iterable[str], base_seconds: int = 5):
+        """
+        Args:
+            timeframes: Output timeframes, e.g. ["5m", "15m", "30m", "1h"]
+            base_seconds: Length of the incoming bars
+        """
+        self.base_seconds = base_seconds
+        ordered = sorted(set(timeframes), key=timeframe_to_seconds)
+        self.timeframes = ordered
+        
+        # Each level reads from the longest lower timeframe that divides it
+        self.levels: List[TimeframeAggregator] = []
+        self.sources: List[int] = []  # Index of the feeding level, -1 for base bars
+        for tf in ordered:
+            period = timeframe_to_seconds(tf)
+            source, child_period = -1, base_seconds
+            for i, lower in enumerate(self.levels):
+                lower_period = lower.period // NS_PER_SECOND
+                if lower_period < period and period % lower_period == 0:
+                    source, child_period = i, lower_period
+            self.levels.append(TimeframeAggregator(tf, period, child_period))
+            self.sources.append(source)
+            
+    def add(self, bar: Bar) -> List[Tuple[str, Bar]]:
+        """
+        Feed one base bar through the cascade
+        
+        Returns:
+            (timeframe, bar) for every bar completed by this input, lower
+            timeframes first
+        """
+        completed: List[List[Bar]] = []
+        results = []
+        for level, source in zip(self.levels, self.sources):
+            inputs = [bar] if source < 0 else completed[source]
+            out = []
+            for item in inputs:
+                out.extend(level.add(item))
+            completed.append(out)
+            for item in out:
+                results.append((level.timeframe, item))
+        return results
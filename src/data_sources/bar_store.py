@@ -0,0 +1,174 @@
+"""
+Fixed-capacity columnar bar storage
+
+Bars are kept in preallocated numpy arrays per (symbol, timeframe). Each buffer
+is a mirrored ring: every bar is written twice, `capacity` slots apart, so the
+most recent `capacity` bars are always one contiguous slice. Detectors get
+zero-copy views and steady-state appends allocate nothing.
+"""
+
+from typing import Dict, Tuple, Optional, Iterator
+import numpy as np
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+class BarBuffer:
+    """Mirrored ring buffer of OHLCV bars for one symbol and timeframe"""
+    
+    def __init__(self, capacity: int):
+        """
+        Preallocate storage
+        
+        Args:
+            capacity: Maximum number of bars kept; older bars are overwritten
+        """
+        if capacity < 1:
+            raise ValueError(f"Invalid bar buffer capacity: {capacity}")
+            
+        self.capacity = capacity
+        self.timestamp = np.zeros(2 * capacity, dtype=np.int64)
+        self.open = np.zeros(2 * capacity, dtype=np.float64)
+        self.high = np.zeros(2 * capacity, dtype=np.float64)
+        self.low = np.zeros(2 * capacity, dtype=np.float64)
+        self.close = np.zeros(2 * capacity, dtype=np.float64)
+        self.volume = np.zeros(2 * capacity, dtype=np.float64)
+        
+        self._pos = 0      # Next write slot in [0, capacity)
+        self._count = 0    # Number of valid bars, at most capacity
+        self.total = 0     # Bars appended since creation
+        
+    def __len__(self) -> int:
+        return self._count
+        
+    def append(self, timestamp: int, open_: float, high: float, low: float,
+               close: float, volume: float) -> None:
+        """
+        Append one bar
+        
+        Args:
+            timestamp: Bar start time as nanoseconds since the epoch (UTC)
+        """
+        pos, mirror = self._pos, self._pos + self.capacity
+        self.timestamp[pos] = self.timestamp[mirror] = timestamp
+        self.open[pos] = self.open[mirror] = open_
+        self.high[pos] = self.high[mirror] = high
+        self.low[pos] = self.low[mirror] = low
+        self.close[pos] = self.close[mirror] = close
+        self.volume[pos] = self.volume[mirror] = volume
+        
+        self._pos = pos + 1 if pos + 1 < self.capacity else 0
+        if self._count < self.capacity:
+            self._count += 1
+        self.total += 1
+        
+    def update_last(self, high: float, low: float, close: float, volume: float) -> None:
+        """Overwrite the OHLCV values of the most recent bar in place"""
+        if not self._count:
+            raise IndexError("Bar buffer is empty")
+            
+        last = self._pos - 1 if self._pos else self.capacity - 1
+        for col, value in ((self.high, high), (self.low, low),
+                           (self.close, close), (self.volume, volume)):
+            col[last] = col[last + self.capacity] = value
+            
+    def extend(self, data: Dict[str, np.ndarray]) -> None:
+        """
+        Append many bars at once (backfills)
+        
+        Args:
+            data: Mapping of column name -> array, timestamps in int64 nanoseconds
+        """
+        n = len(data["timestamp"])
+        if n == 0:
+            return
+            
+        # Only the newest `capacity` bars can survive
+        skip = max(0, n - self.capacity)
+        self.total += skip
+        self._pos = (self._pos + skip) % self.capacity
+        n -= skip
+        
+        first = min(n, self.capacity - self._pos)
+        for name in COLUMNS:
+            col = getattr(self, name)
+            values = np.asarray(data[name])[skip:]
+            for start, chunk in ((self._pos, values[:first]), (0, values[first:])):
+                col[start:start + len(chunk)] = chunk
+                col[start + self.capacity:start + self.capacity + len(chunk)] = chunk
+                
+        self._pos = (self._pos + n) % self.capacity
+        self._count = min(self.capacity, self._count + n)
+        self.total += n
+        
+    def view(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Zero-copy views of the most recent bars, oldest first
+        
+        Args:
+            n: Number of bars, defaults to all bars held
+            
+        Returns:
+            Dict of column name -> read-only array view
+        """
+        n = self._count if n is None else min(n, self._count)
+        end = self._pos + self.capacity
+        views = {}
+        for name in COLUMNS:
+            arr = getattr(self, name)[end - n:end]
+            arr.flags.writeable = False
+            views[name] = arr
+        return views
+        
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        """Timestamp of the most recent bar, or None if empty"""
+        if not self._count:
+            return None
+        return int(self.timestamp[self._pos + self.capacity - 1])
+        
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the buffer"""
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+class BarStore:
+    """Bar buffers keyed by (symbol, timeframe)"""
+    
+    def __init__(self, capacity: int = 5000):
+        """
+        Args:
+            capacity: Bars kept per (symbol, timeframe)
+        """
+        self.capacity = capacity
+        self.buffers: Dict[Tuple[str, str], BarBuffer] = {}
+        
+    def buffer(self, symbol: str, timeframe: str) -> BarBuffer:
+        """Get the buffer for a series, creating it on first use"""
+        key = (symbol, timeframe)
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = self.buffers[key] = BarBuffer(self.capacity)
+        return buf
+        
+    def append(self, symbol: str, timeframe: str, timestamp: int, open_: float,
+               high: float, low: float, close: float, volume: float) -> BarBuffer:
+        """Append one bar to a series and return its buffer"""
+        buf = self.buffer(symbol, timeframe)
+        buf.append(timestamp, open_, high, low, close, volume)
+        return buf
+        
+    def view(self, symbol: str, timeframe: str, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Zero-copy views of the most recent bars of a series"""
+        return self.buffer(symbol, timeframe).view(n)
+        
+    def drop(self, symbol: str, timeframe: str) -> None:
+        """Release the buffer for a series"""
+        self.buffers.pop((symbol, timeframe), None)
+        
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.buffers)
+        
+    @property
+    def nbytes(self) -> int:
+        """Memory held by all buffers"""
+        return sum(buf.nbytes for buf in self.buffers.values())
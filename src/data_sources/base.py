@@ -3,9 +3,13 @@ Base interface for market data sources
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, AsyncGenerator
+from typing import Dict, List, Any, AsyncGenerator, Optional, Tuple
+import numpy as np
 import pandas as pd
 
+from .bar_store import BarStore
+from .queues import BarEvent, BarQueue, COALESCE
+
 class DataSource(ABC):
     """Abstract base class for market data sources"""
     
@@ -19,6 +23,15 @@ class DataSource(ABC):
         self.config = config
         self.connected = False
         
+        # Live bars are appended here; detectors read zero-copy views
+        self.bar_store = BarStore(config.get("bar_buffer_size", 5000))
+        
+        # (symbol, timeframe) -> bounded queue of closed-bar events for the scanner
+        self.data_queues: Dict[Tuple[str, str], BarQueue] = {}
+        queue_config = config.get("queue") or {}
+        self.queue_size = int(queue_config.get("size", 64))
+        self.queue_overflow = queue_config.get("overflow", COALESCE)
+        
     @abstractmethod
     async def connect(self) -> None:
         """
@@ -66,7 +79,8 @@ class DataSource(ABC):
         symbol: str,
         timeframe: str,
         start_time: pd.Timestamp,
-        end_time: pd.Timestamp
+        end_time: pd.Timestamp,
+        back_adjust: Optional[bool] = None
     ) -> pd.DataFrame:
         """
         Get historical OHLCV data
@@ -76,6 +90,9 @@ class DataSource(ABC):
             timeframe: Timeframe string (e.g. "5m", "1h")
             start_time: Start time for historical data
             end_time: End time for historical data
+            back_adjust: Whether a range crossing futures rolls is shifted to
+                the newest contract's prices (None: the source's default).
+                Bars joining the live buffers must stay raw (False)
             
         Returns:
             DataFrame with columns: timestamp, open, high, low, close, volume
@@ -113,7 +130,7 @@ class DataSource(ABC):
         self,
         symbol: str,
         timeframe: str
-    ) -> AsyncGenerator[pd.DataFrame, None]:
+    ) -> AsyncGenerator[Tuple[BarEvent, Dict[str, np.ndarray]], None]:
         """
         Stream real-time OHLCV data
         
@@ -122,7 +139,10 @@ class DataSource(ABC):
             timeframe: Timeframe string
             
         Yields:
-            DataFrame with latest candle data
+            (event, bars) after each new candle: the BarEvent that announced
+            it and a zero-copy view of the bar store for the series
+            (timestamp/open/high/low/close/volume arrays, oldest first). The
+            view may already hold later candles whose events were coalesced
             
         Raises:
             ValueError: If parameters are invalid
@@ -0,0 +1,176 @@
+"""
+Persistent on-disk cache of historical bars
+
+Bars are stored as memory-mapped numpy arrays partitioned by
+symbol/timeframe/UTC day:
+
+    {root}/{symbol}/{timeframe}/{YYYYMMDD}.npy
+
+A coverage file per series records which time ranges have already been
+fetched, so a range with no bars (weekend, holiday) is not requested again.
+Range queries are answered locally and only the missing edges go to the
+provider.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+from loguru import logger
+
+from .bar_store import COLUMNS
+
+NS_PER_DAY = 86_400_000_000_000
+
+BAR_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+])
+
+Range = Tuple[int, int]  # [start_ns, end_ns)
+
+def _merge_ranges(ranges: List[Range]) -> List[Range]:
+    """Merge overlapping or touching ranges"""
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+class HistoricalBarCache:
+    """Day-partitioned columnar bar cache with coverage tracking"""
+    
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Cache directory, created on first write
+        """
+        self.root = Path(root)
+        self._coverage: Dict[Tuple[str, str], List[Range]] = {}
+        
+    def _series_dir(self, symbol: str, timeframe: str) -> Path:
+        return self.root / symbol / timeframe
+        
+    def _partition_path(self, symbol: str, timeframe: str, day: int) -> Path:
+        date = np.datetime64(day, "D").astype(str).replace("-", "")
+        return self._series_dir(symbol, timeframe) / f"{date}.npy"
+        
+    def coverage(self, symbol: str, timeframe: str) -> List[Range]:
+        """Time ranges already fetched for a series"""
+        key = (symbol, timeframe)
+        if key not in self._coverage:
+            path = self._series_dir(symbol, timeframe) / "coverage.json"
+            ranges = []
+            if path.exists():
+                with open(path, "r") as f:
+                    ranges = [tuple(r) for r in json.load(f)]
+            self._coverage[key] = ranges
+        return self._coverage[key]
+        
+    def missing(self, symbol: str, timeframe: str, start: int, end: int) -> List[Range]:
+        """
+        Sub-ranges of [start, end) that are not cached yet
+        
+        Args:
+            start, end: Nanoseconds since the epoch (UTC)
+            
+        Returns:
+            List of (start_ns, end_ns) gaps, in order
+        """
+        gaps = []
+        cursor = start
+        for cov_start, cov_end in self.coverage(symbol, timeframe):
+            if cov_end <= cursor:
+                continue
+            if cov_start >= end:
+                break
+            if cov_start > cursor:
+                gaps.append((cursor, cov_start))
+            cursor = max(cursor, cov_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+        
+    def store(self, symbol: str, timeframe: str, data: Dict[str, np.ndarray],
+              start: int, end: int) -> None:
+        """
+        Merge fetched bars into the day partitions and mark [start, end) covered
+        
+        Args:
+            data: Column arrays, timestamps as int64 nanoseconds (UTC)
+            start, end: Range the fetch is known to be complete for
+        """
+        series_dir = self._series_dir(symbol, timeframe)
+        series_dir.mkdir(parents=True, exist_ok=True)
+        
+        bars = np.empty(len(data["timestamp"]), dtype=BAR_DTYPE)
+        for name in COLUMNS:
+            bars[name] = data[name]
+        bars = bars[np.argsort(bars["timestamp"], kind="stable")]
+        
+        days = bars["timestamp"] // NS_PER_DAY
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for chunk in np.split(bars, bounds):
+            if not len(chunk):
+                continue
+            path = self._partition_path(symbol, timeframe, int(chunk["timestamp"][0] // NS_PER_DAY))
+            if path.exists():
+                # New rows win over cached rows with the same timestamp
+                existing = np.load(path)
+                chunk = np.concatenate([chunk, existing])
+                _, first = np.unique(chunk["timestamp"], return_index=True)
+                chunk = chunk[first]
+            tmp = path.with_suffix(".tmp.npy")
+            np.save(tmp, chunk)
+            os.replace(tmp, path)
+            
+        key = (symbol, timeframe)
+        self._coverage[key] = _merge_ranges(self.coverage(symbol, timeframe) + [(start, end)])
+        tmp = series_dir / "coverage.tmp.json"
+        with open(tmp, "w") as f:
+            json.dump(self._coverage[key], f)
+        os.replace(tmp, series_dir / "coverage.json")
+        
+    def load(self, symbol: str, timeframe: str, start: int, end: int) -> Dict[str, np.ndarray]:
+        """
+        Read cached bars with start <= timestamp < end
+        
+        Partitions are memory-mapped, so only the pages for the requested
+        rows are read from disk.
+        
+        Returns:
+            Dict of column name -> array
+        """
+        chunks = []
+        for day in range(start // NS_PER_DAY, (end - 1) // NS_PER_DAY + 1):
+            path = self._partition_path(symbol, timeframe, day)
+            if not path.exists():
+                continue
+            part = np.load(path, mmap_mode="r")
+            ts = part["timestamp"]
+            lo = np.searchsorted(ts, start, side="left")
+            hi = np.searchsorted(ts, end, side="left")
+            if hi > lo:
+                chunks.append(part[lo:hi])
+                
+        bars = np.concatenate(chunks) if chunks else np.empty(0, dtype=BAR_DTYPE)
+        return {name: np.ascontiguousarray(bars[name]) for name in COLUMNS}
+        
+    def clear(self, symbol: str, timeframe: str) -> None:
+        """Delete everything cached for a series"""
+        series_dir = self._series_dir(symbol, timeframe)
+        if series_dir.exists():
+            for path in series_dir.iterdir():
+                path.unlink()
+        self._coverage.pop((symbol, timeframe), None)
+        logger.info(f"Cleared bar cache for {symbol} {timeframe}")
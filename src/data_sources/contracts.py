@@ -0,0 +1,210 @@
+"""
+Futures contract resolution and roll calendar
+
+MES and MNQ are quarterly CME futures (March, June, September, December)
+that expire on the third Friday of the contract month. Volume moves to the
+next contract about a week earlier: the scanner rolls `roll_days_before_expiry`
+days before expiry (8, the CME roll date, by default), at the start of that
+day's Globex session (17:00 Chicago time the evening before).
+
+`RollCalendar` precomputes every roll instant for a range of years into one
+sorted array, so finding the front contract of any timestamp (or of a whole
+array of them) is a binary search. `ContractRegistry` qualifies each
+contract month against IB once and caches it, and `stitch` splices
+per-contract history into one back-adjusted continuous series.
+"""
+
+import asyncio
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from ib_insync import Contract
+from loguru import logger
+
+from .bar_store import COLUMNS
+
+CHICAGO = ZoneInfo("America/Chicago")
+
+# Futures the registry resolves: symbol -> (exchange, currency, contract months)
+FUTURES = {
+    "MES": ("CME", "USD", (3, 6, 9, 12)),
+    "MNQ": ("CME", "USD", (3, 6, 9, 12)),
+}
+
+def third_friday(year: int, month: int) -> date:
+    """Expiry date of a quarterly equity index future"""
+    first = date(year, month, 1)
+    return first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+class RollCalendar:
+    """Front contract of every timestamp, from precomputed roll instants"""
+    
+    def __init__(self, months=(3, 6, 9, 12), roll_days: int = 8,
+                 first_year: int = 2000, last_year: int = 2099):
+        """
+        Args:
+            months: Contract months of the cycle
+            roll_days: Days before expiry the front contract changes
+            first_year, last_year: Contract years to precompute
+        """
+        contracts, rolls = [], []
+        for year in range(first_year, last_year + 1):
+            for month in months:
+                roll_day = third_friday(year, month) - timedelta(days=roll_days)
+                session_open = datetime.combine(roll_day - timedelta(days=1), dt_time(17), CHICAGO)
+                contracts.append(f"{year}{month:02d}")
+                rolls.append(int(session_open.timestamp()) * 1_000_000_000)
+                
+        # contracts[i] is the front month from rolls[i - 1] until rolls[i]
+        self.contracts = np.array(contracts)
+        self.rolls = np.array(rolls, dtype=np.int64)
+        
+    def _index(self, ts_ns) -> np.ndarray:
+        index = np.searchsorted(self.rolls, ts_ns, side="right")
+        if np.any(index >= len(self.rolls)):
+            raise ValueError("Timestamp beyond the roll calendar")
+        return index
+        
+    def front(self, ts_ns: int) -> str:
+        """Front contract month ("YYYYMM") at a timestamp"""
+        return str(self.contracts[self._index(ts_ns)])
+        
+    def front_months(self, ts_ns: np.ndarray) -> np.ndarray:
+        """Front contract month of every timestamp (vectorized)"""
+        return self.contracts[self._index(ts_ns)]
+        
+    def next_roll(self, ts_ns: int) -> int:
+        """First roll instant after a timestamp (ns)"""
+        return int(self.rolls[self._index(ts_ns)])
+        
+    def segments(self, start_ns: int, end_ns: int) -> List[Tuple[str, int, int]]:
+        """
+        Split [start_ns, end_ns) by front contract
+        
+        Returns:
+            (contract month, segment start, segment end) triples, oldest first
+        """
+        if end_ns <= start_ns:
+            return []
+        first, last = self._index([start_ns, end_ns - 1])
+        return [
+            (str(self.contracts[i]),
+             start_ns if i == first else int(self.rolls[i - 1]),
+             end_ns if i == last else int(self.rolls[i]))
+            for i in range(first, last + 1)
+        ]
+
+def stitch(parts: List[Tuple[Dict[str, np.ndarray], Optional[Dict[str, np.ndarray]]]],
+           back_adjust: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Splice per-contract segments into one continuous series
+    
+    With back adjustment every older segment is shifted by the price gap
+    between consecutive contracts, so the series continues seamlessly into
+    the newest contract's prices. The gap is the difference between the two
+    contracts' closes at the last bar both traded before the roll.
+    
+    Args:
+        parts: (segment bars, bars of the segment's contract from just before
+            the segment starts, None for the oldest segment), oldest first
+        back_adjust: Apply the roll gaps to older segments
+    """
+    offsets = [0.0] * len(parts)
+    if back_adjust:
+        for i in range(len(parts) - 1, 0, -1):
+            current, previous = parts[i][1], parts[i - 1][0]
+            gap = 0.0
+            if current is not None:
+                common, new_at, old_at = np.intersect1d(
+                    current["timestamp"], previous["timestamp"], return_indices=True
+                )
+                if common.size:
+                    gap = float(current["close"][new_at[-1]] - previous["close"][old_at[-1]])
+                else:
+                    logger.warning("No bar common to both contracts at a roll, history left unadjusted there")
+            offsets[i - 1] = offsets[i] + gap
+            
+    stitched = {}
+    for name in COLUMNS:
+        columns = []
+        for (bars, _), offset in zip(parts, offsets):
+            column = bars[name]
+            if offset and name in ("open", "high", "low", "close"):
+                column = column + offset
+            columns.append(column)
+        if columns:
+            stitched[name] = np.concatenate(columns)
+        else:
+            stitched[name] = np.empty(0, dtype=np.int64 if name == "timestamp" else np.float64)
+    return stitched
+
+class ContractRegistry:
+    """Qualified IB contracts per symbol and contract month, resolved once"""
+    
+    def __init__(self, ib, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            ib: Connected IB client (anything with `qualifyContractsAsync`)
+            config: Optional `contracts` settings (roll_days_before_expiry,
+                back_adjust)
+        """
+        config = config or {}
+        self.ib = ib
+        self.back_adjust = bool(config.get("back_adjust", True))
+        
+        # One precomputed calendar per contract cycle
+        roll_days = int(config.get("roll_days_before_expiry", 8))
+        self.calendars = {
+            months: RollCalendar(months, roll_days) for months in {spec[2] for spec in FUTURES.values()}
+        }
+        self._contracts: Dict[Tuple[str, str], Contract] = {}
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+        
+    def spec(self, symbol: str) -> Tuple[str, str, Tuple[int, ...]]:
+        """(exchange, currency, contract months) of a supported symbol"""
+        if symbol not in FUTURES:
+            raise ValueError(f"Unsupported symbol: {symbol}")
+        return FUTURES[symbol]
+        
+    async def resolve(self, symbol: str, month: str) -> Contract:
+        """Qualified contract for a symbol and contract month ("YYYYMM")"""
+        key = (symbol, month)
+        contract = self._contracts.get(key)
+        if contract is not None:
+            return contract
+            
+        # Concurrent lookups of the same contract share one qualification
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._qualify(symbol, month))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._pending.pop(key, None)
+                
+    async def _qualify(self, symbol: str, month: str) -> Contract:
+        exchange, currency, _ = self.spec(symbol)
+        contract = Contract(
+            symbol=symbol,
+            secType="FUT",
+            exchange=exchange,
+            currency=currency,
+            lastTradeDateOrContractMonth=month,
+            includeExpired=True
+        )
+        qualified = await self.ib.qualifyContractsAsync(contract)
+        if not qualified:
+            raise ValueError(f"IB does not know {symbol} {month}")
+        self._contracts[(symbol, month)] = qualified[0]
+        logger.debug(f"Qualified {symbol} {month}: conId {qualified[0].conId}")
+        return qualified[0]
+        
+    def calendar(self, symbol: str) -> RollCalendar:
+        """Roll calendar of a symbol's contract cycle"""
+        return self.calendars[self.spec(symbol)[2]]
+        
+    async def front(self, symbol: str, ts_ns: int) -> Contract:
+        """Qualified front contract of a symbol at a timestamp"""
+        return await self.resolve(symbol, self.calendar(symbol).front(ts_ns))
@@ -3,13 +3,29 @@ Interactive Brokers data source implementation
 """
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, AsyncGenerator
+import time
+from functools import partial
+from typing import Dict, List, Any, AsyncGenerator, Optional, Tuple
+import numpy as np
 import pandas as pd
 from ib_insync import IB, Contract, BarData
 from loguru import logger
 
 from .base import DataSource
+from .aggregator import MultiTimeframeAggregator, timeframe_to_seconds
+from .cache import HistoricalBarCache
+from .queues import BarEvent, BarQueue
+from .pacing import RequestScheduler, plan_chunks
+from .contracts import ContractRegistry, stitch
+from .. import metrics
+
+# IB only supports 5-second real-time bars
+REALTIME_BAR_SECONDS = 5
+
+BAR_ARRIVAL_SECONDS = metrics.histogram(
+    "scanner_bar_arrival_seconds", "Delay from a bar's close to the scanner publishing it",
+    ["symbol", "timeframe"]
+)
 
 class IBDataSource(DataSource):
     """Interactive Brokers data source implementation"""
@@ -19,7 +35,20 @@ class IBDataSource(DataSource):
         super().__init__(config)
         self.ib = IB()
         self.subscriptions = {}  # symbol -> Contract mapping
-        self.data_queues = {}   # (symbol, timeframe) -> asyncio.Queue
+        self.bar_subscriptions = {}  # symbol -> RealTimeBarList (one 5s feed per contract)
+        self.aggregators = {}   # symbol -> MultiTimeframeAggregator
+        
+        # Qualified contracts and the roll calendar; subscriptions follow the front month
+        self.contracts = ContractRegistry(self.ib, config.get("contracts"))
+        self._roll_task: Optional[asyncio.Task] = None
+        
+        # Historical requests are chunked, deduplicated and paced to IB's limits
+        self.requests = RequestScheduler(config.get("pacing"))
+        
+        cache_config = config.get("cache") or {}
+        self.cache = None
+        if cache_config.get("enabled", False):
+            self.cache = HistoricalBarCache(cache_config.get("path", "data/bars"))
         
     async def connect(self) -> None:
         """Connect to IB TWS or Gateway"""
@@ -38,74 +67,108 @@ class IBDataSource(DataSource):
             
     async def disconnect(self) -> None:
         """Disconnect from IB"""
+        if self._roll_task is not None:
+            self._roll_task.cancel()
+            self._roll_task = None
+        self.requests.close()
         if self.connected:
             self.ib.disconnect()
             self.connected = False
             logger.info("Disconnected from IB")
             
-    def _create_contract(self, symbol: str) -> Contract:
-        """Create an IB contract for the symbol"""
-        # For futures, we need to determine the active contract month
-        if symbol in ["MES", "MNQ"]:
-            # Get next quarterly expiration
-            today = datetime.now()
-            month = (today.month - 1) // 3 * 3 + 3
-            year = today.year if month > today.month else today.year + 1
-            expiry = f"{year}{month:02d}"
-            
-            contract = Contract(
-                symbol=symbol,
-                secType="FUT",
-                exchange="CME",
-                currency="USD",
-                lastTradeDateOrContractMonth=expiry
-            )
-        else:
-            raise ValueError(f"Unsupported symbol: {symbol}")
-            
-        return contract
-        
     async def subscribe(self, symbol: str, timeframes: List[str]) -> None:
         """Subscribe to market data for the symbol"""
         if not self.connected:
             raise ConnectionError("Not connected to IB")
             
         try:
-            # Create contract if not already subscribed
+            # Front month contract, qualified once
             if symbol not in self.subscriptions:
-                contract = self._create_contract(symbol)
-                self.subscriptions[symbol] = contract
-            else:
-                contract = self.subscriptions[symbol]
+                self.subscriptions[symbol] = await self.contracts.front(symbol, time.time_ns())
                 
-            # Subscribe to each timeframe
             for tf in timeframes:
-                queue = asyncio.Queue()
-                self.data_queues[(symbol, tf)] = queue
+                if (symbol, tf) not in self.data_queues:
+                    self.data_queues[(symbol, tf)] = BarQueue(self.queue_size, self.queue_overflow)
+                    
+            # Higher timeframes are rolled up locally from the 5s feed
+            wanted = [k[1] for k in self.data_queues if k[0] == symbol]
+            aggregator = self.aggregators.get(symbol)
+            if aggregator is None or set(aggregator.timeframes) != set(wanted):
+                self.aggregators[symbol] = MultiTimeframeAggregator(wanted, REALTIME_BAR_SECONDS)
                 
-                # Start historical data stream
-                self.ib.reqRealTimeBars(
-                    contract,
-                    barSize=self._timeframe_to_seconds(tf),
-                    whatToShow="TRADES",
-                    useRTH=True
-                )
+            # One real-time subscription per contract
+            if symbol not in self.bar_subscriptions:
+                self._request_bars(symbol)
+            if self._roll_task is None:
+                self._roll_task = asyncio.create_task(self._roll_watch())
                 
             logger.info(f"Subscribed to {symbol} on timeframes: {timeframes}")
             
         except Exception as e:
             raise ConnectionError(f"Failed to subscribe to {symbol}: {str(e)}")
             
+    def _request_bars(self, symbol: str) -> None:
+        """Start the 5s real-time feed of the symbol's current contract"""
+        bars = self.ib.reqRealTimeBars(
+            self.subscriptions[symbol],
+            barSize=REALTIME_BAR_SECONDS,
+            whatToShow="TRADES",
+            useRTH=True
+        )
+        bars.updateEvent += partial(self._on_bar_update, symbol)
+        self.bar_subscriptions[symbol] = bars
+        
+    async def _roll_watch(self) -> None:
+        """Sleep until the next roll, then move the real-time feeds to the new front month"""
+        while self.subscriptions:
+            now = time.time_ns()
+            next_roll = min(self.contracts.calendar(symbol).next_roll(now) for symbol in self.subscriptions)
+            await asyncio.sleep((next_roll - now) / 1e9)
+            for symbol in list(self.subscriptions):
+                try:
+                    await self._roll(symbol)
+                except Exception as e:
+                    logger.error(f"Failed to roll {symbol}: {str(e)}")
+        self._roll_task = None
+        
+    async def _roll(self, symbol: str) -> None:
+        """Resubscribe a symbol to its front contract if that changed"""
+        contract = await self.contracts.front(symbol, time.time_ns())
+        current = self.subscriptions.get(symbol)
+        if current is None or contract.conId == current.conId:
+            return
+            
+        bars = self.bar_subscriptions.pop(symbol, None)
+        if bars is not None:
+            self.ib.cancelRealTimeBars(bars)
+        # Drop the partial bars of the old contract: finishing them with the new
+        # contract's prices would straddle the roll gap
+        aggregator = self.aggregators.get(symbol)
+        if aggregator is not None:
+            self.aggregators[symbol] = MultiTimeframeAggregator(aggregator.timeframes, REALTIME_BAR_SECONDS)
+        self.subscriptions[symbol] = contract
+        self._request_bars(symbol)
+        logger.info(
+            f"Rolled {symbol} from {current.lastTradeDateOrContractMonth} "
+            f"to {contract.lastTradeDateOrContractMonth}"
+        )
+        
     async def unsubscribe(self, symbol: str, timeframes: List[str]) -> None:
         """Unsubscribe from market data"""
         if symbol in self.subscriptions:
-            contract = self.subscriptions[symbol]
             for tf in timeframes:
-                self.ib.cancelRealTimeBars(contract)
+                self.bar_store.drop(symbol, tf)
                 if (symbol, tf) in self.data_queues:
                     del self.data_queues[(symbol, tf)]
                     
-            if not any(k[0] == symbol for k in self.data_queues):
+            remaining = [k[1] for k in self.data_queues if k[0] == symbol]
+            if remaining:
+                self.aggregators[symbol] = MultiTimeframeAggregator(remaining, REALTIME_BAR_SECONDS)
+            else:
+                bars = self.bar_subscriptions.pop(symbol, None)
+                if bars is not None:
+                    self.ib.cancelRealTimeBars(bars)
+                self.aggregators.pop(symbol, None)
                 del self.subscriptions[symbol]
                 
             logger.info(f"Unsubscribed from {symbol} on timeframes: {timeframes}")
@@ -115,49 +178,158 @@ class IBDataSource(DataSource):
         symbol: str,
         timeframe: str,
         start_time: pd.Timestamp,
-        end_time: pd.Timestamp
+        end_time: pd.Timestamp,
+        back_adjust: Optional[bool] = None
     ) -> pd.DataFrame:
-        """Get historical bar data from IB"""
+        """
+        Get historical bar data, from the local cache where possible
+        
+        The range is split at the contract rolls and each contract month's
+        bars come from its own contract (cached per contract, so expired
+        months are never fetched twice). The segments are stitched into one
+        continuous series, back-adjusted to the newest contract in the range
+        when `back_adjust` (default: `contracts.back_adjust`) is on. Live
+        buffer fills pass False: live bars and zones are in raw prices.
+        """
+        if back_adjust is None:
+            back_adjust = self.contracts.back_adjust
+        start_ns, end_ns = self._to_utc_ns(start_time), self._to_utc_ns(end_time)
+        segments = self.contracts.calendar(symbol).segments(start_ns, end_ns)
+        
+        # Each later contract is fetched from a little before its roll, to find the roll gap
+        period = self._timeframe_to_seconds(timeframe) * 1_000_000_000
+        overlap = max(3 * period, 86_400_000_000_000)
+        fetched = await asyncio.gather(*(
+            self._contract_history(symbol, month, timeframe, seg_start - (overlap if i else 0), seg_end)
+            for i, (month, seg_start, seg_end) in enumerate(segments)
+        ))
+        
+        parts = []
+        for i, ((_, seg_start, _), data) in enumerate(zip(segments, fetched)):
+            split = int(np.searchsorted(data["timestamp"], seg_start))
+            before = {name: values[:split] for name, values in data.items()} if i else None
+            parts.append(({name: values[split:] for name, values in data.items()}, before))
+        return self._arrays_to_dataframe(stitch(parts, back_adjust))
+        
+    async def _contract_history(
+        self,
+        symbol: str,
+        month: str,
+        timeframe: str,
+        start_ns: int,
+        end_ns: int
+    ) -> Dict[str, np.ndarray]:
+        """Bars of one contract month for [start_ns, end_ns), through the cache"""
+        contract = await self.contracts.resolve(symbol, month)
+        if self.cache is None:
+            return await self._fetch_historical(contract, timeframe, start_ns, end_ns)
+            
+        # Never mark the bar that is still forming as cached
+        series = f"{symbol}_{month}"
+        period = self._timeframe_to_seconds(timeframe) * 1_000_000_000
+        now_ns = pd.Timestamp.now(tz="UTC").value
+        complete_end = min(end_ns, now_ns - now_ns % period)
+        
+        gaps = self.cache.missing(series, timeframe, start_ns, end_ns)
+        fetched = await asyncio.gather(*(
+            self._fetch_historical(contract, timeframe, gap_start, gap_end) for gap_start, gap_end in gaps
+        ))
+        for (gap_start, gap_end), data in zip(gaps, fetched):
+            covered_end = min(gap_end, complete_end)
+            if covered_end > gap_start:
+                self.cache.store(series, timeframe, data, gap_start, covered_end)
+            logger.debug(
+                f"Fetched {len(data['timestamp'])} {series} {timeframe} bars "
+                f"for cache gap {pd.Timestamp(gap_start)} - {pd.Timestamp(gap_end)}"
+            )
+            
+        return self.cache.load(series, timeframe, start_ns, end_ns)
+        
+    async def _fetch_historical(
+        self,
+        contract: Contract,
+        timeframe: str,
+        start_ns: int,
+        end_ns: int
+    ) -> Dict[str, np.ndarray]:
+        """
+        Request bars covering [start_ns, end_ns) from IB
+        
+        The range is split into requests IB accepts for the bar size, which
+        run concurrently through the request scheduler and are merged.
+        """
         if not self.connected:
             raise ConnectionError("Not connected to IB")
             
-        contract = self._create_contract(symbol)
-        duration = self._calc_duration(start_time, end_time)
+        chunks = plan_chunks(start_ns, end_ns, self._timeframe_to_seconds(timeframe))
+        parts = await asyncio.gather(*(
+            self.requests.run(
+                (contract.conId, timeframe, chunk_start, chunk_end), contract.symbol,
+                partial(self._request_chunk, contract, timeframe, chunk_start, chunk_end)
+            )
+            for chunk_start, chunk_end in chunks
+        ))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return self._bars_to_arrays([])
+        # Chunks are disjoint and in time order
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        
+    async def _request_chunk(
+        self,
+        contract: Contract,
+        timeframe: str,
+        start_ns: int,
+        end_ns: int
+    ) -> Dict[str, np.ndarray]:
+        """One historical data request, clipped to [start_ns, end_ns)"""
+        end_time = pd.Timestamp(end_ns, tz="UTC")
+        duration = self._calc_duration(pd.Timestamp(start_ns, tz="UTC"), end_time)
         bar_size = self._timeframe_to_ib_size(timeframe)
         
         try:
             bars = await self.ib.reqHistoricalDataAsync(
                 contract,
-                endDateTime=end_time.strftime("%Y%m%d %H:%M:%S"),
+                endDateTime=end_time.strftime("%Y%m%d-%H:%M:%S"),
                 durationStr=duration,
                 barSizeSetting=bar_size,
                 whatToShow="TRADES",
                 useRTH=True,
-                formatDate=1
+                formatDate=2
             )
             
-            return self._bars_to_dataframe(bars)
-            
         except Exception as e:
             raise ConnectionError(f"Failed to get historical data: {str(e)}")
             
+        # Day-based durations can reach back further than asked
+        data = self._bars_to_arrays(bars)
+        ts = data["timestamp"]
+        lo, hi = np.searchsorted(ts, start_ns, side="left"), np.searchsorted(ts, end_ns, side="left")
+        return {name: values[lo:hi] for name, values in data.items()}
+            
     async def get_latest_data(
         self,
         symbol: str,
         timeframe: str
     ) -> pd.DataFrame:
         """Get latest bar data"""
+        # Streamed bars are already in memory, no need to ask IB
+        buffer = self.bar_store.buffers.get((symbol, timeframe))
+        if buffer is not None and len(buffer):
+            return self._arrays_to_dataframe(buffer.view(1))
+            
         # Get last 1 bar of historical data
-        end_time = pd.Timestamp.now()
+        end_time = pd.Timestamp.now(tz="UTC")
         start_time = end_time - pd.Timedelta(self._timeframe_to_seconds(timeframe), unit="s")
-        return await self.get_historical_data(symbol, timeframe, start_time, end_time)
+        return await self.get_historical_data(symbol, timeframe, start_time, end_time, back_adjust=False)
         
     async def stream_data(
         self,
         symbol: str,
         timeframe: str
-    ) -> AsyncGenerator[pd.DataFrame, None]:
-        """Stream real-time bar data"""
+    ) -> AsyncGenerator[Tuple[BarEvent, Dict[str, np.ndarray]], None]:
+        """Stream bar events with views of the bar store"""
         if not self.connected:
             raise ConnectionError("Not connected to IB")
             
@@ -165,23 +337,65 @@ class IBDataSource(DataSource):
             raise ValueError(f"Not subscribed to {symbol} {timeframe}")
             
         queue = self.data_queues[(symbol, timeframe)]
+        buffer = self.bar_store.buffer(symbol, timeframe)
         while True:
-            bar = await queue.get()
-            yield self._bars_to_dataframe([bar])
-            
-    def _bars_to_dataframe(self, bars: List[BarData]) -> pd.DataFrame:
-        """Convert IB bars to pandas DataFrame"""
-        data = []
-        for bar in bars:
-            data.append({
-                "timestamp": pd.Timestamp(bar.date),
-                "open": bar.open,
-                "high": bar.high,
-                "low": bar.low,
-                "close": bar.close,
-                "volume": bar.volume
-            })
-        return pd.DataFrame(data)
+            event = await queue.get()
+            if event is None:
+                return
+            yield event, buffer.view()
+            
+    def _on_bar_update(self, symbol: str, bars, has_new_bar: bool) -> None:
+        """Roll a new 5s bar into every timeframe and publish completed bars"""
+        if not has_new_bar:
+            return
+            
+        bar = bars[-1]
+        base_bar = (self._bar_timestamp(bar.time), bar.open_, bar.high,
+                    bar.low, bar.close, bar.volume)
+        now = time.time_ns()
+        for timeframe, completed in self.aggregators[symbol].add(base_bar):
+            self.bar_store.append(symbol, timeframe, *completed)
+            close = completed[0] + timeframe_to_seconds(timeframe) * 1_000_000_000
+            BAR_ARRIVAL_SECONDS.observe(max(0.0, (now - close) / 1e9), symbol, timeframe)
+            
+            # Never blocks: a full queue coalesces (the bar is in the store either way)
+            queue = self.data_queues.get((symbol, timeframe))
+            if queue is not None:
+                queue.put_nowait(BarEvent(symbol, timeframe, completed[0], now))
+            
+    @staticmethod
+    def _bar_timestamp(value) -> int:
+        """Convert an IB bar time to nanoseconds since the epoch (UTC)"""
+        return pd.Timestamp(value).as_unit("ns").value
+        
+    def _bars_to_arrays(self, bars: List[BarData]) -> Dict[str, np.ndarray]:
+        """Convert IB bars to column arrays with int64 UTC nanosecond timestamps"""
+        # Build each column directly instead of going through a list of dicts
+        n = len(bars)
+        timestamps = pd.to_datetime([bar.date for bar in bars], utc=True)
+        return {
+            "timestamp": np.asarray(timestamps.as_unit("ns").asi8, dtype=np.int64),
+            "open": np.fromiter((bar.open for bar in bars), dtype=np.float64, count=n),
+            "high": np.fromiter((bar.high for bar in bars), dtype=np.float64, count=n),
+            "low": np.fromiter((bar.low for bar in bars), dtype=np.float64, count=n),
+            "close": np.fromiter((bar.close for bar in bars), dtype=np.float64, count=n),
+            "volume": np.fromiter((bar.volume for bar in bars), dtype=np.float64, count=n),
+        }
+        
+    @staticmethod
+    def _arrays_to_dataframe(data: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Wrap column arrays in a DataFrame with a UTC timestamp column"""
+        frame = {name: np.array(values) for name, values in data.items()}
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="ns", utc=True)
+        return pd.DataFrame(frame)
+        
+    @staticmethod
+    def _to_utc_ns(value: pd.Timestamp) -> int:
+        """Convert a timestamp to UTC nanoseconds, treating naive values as UTC"""
+        value = pd.Timestamp(value)
+        if value.tz is None:
+            value = value.tz_localize("UTC")
+        return value.as_unit("ns").value
         
     @staticmethod
     def _timeframe_to_seconds(timeframe: str) -> int:
@@ -211,17 +425,14 @@ class IBDataSource(DataSource):
             
     @staticmethod
     def _calc_duration(start_time: pd.Timestamp, end_time: pd.Timestamp) -> str:
-        """Calculate IB duration string"""
-        delta = end_time - start_time
-        days = delta.days
-        
-        if days <= 1:
-            return "1 D"
-        elif days <= 7:
-            return "1 W"
-        elif days <= 31:
-            return "1 M"
-        elif days <= 365:
-            return "1 Y"
+        """Calculate the smallest IB duration string covering the range"""
+        seconds = max(int((end_time - start_time).total_seconds()), 60)
+        
+        if seconds <= 86400:
+            return f"{seconds} S"
+            
+        days = -(-seconds // 86400)
+        if days <= 365:
+            return f"{days} D"
         else:
-            return "5 Y" 
\ No newline at end of file
+            return f"{-(-days // 365)} Y" 
\ No newline at end of file
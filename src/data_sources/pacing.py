@@ -0,0 +1,239 @@
+"""
+Paced scheduling of IB historical data requests
+
+IB limits historical data requests: at most 60 in any 10 minutes, fewer than
+six for the same contract within 2 seconds, no identical request within 15
+seconds, and one request may not span more than a bar-size-dependent
+duration. `plan_chunks` splits a long range into legal requests, aligned to
+multiples of the chunk length so overlapping ranges share their interior
+chunks, and `RequestScheduler` runs them:
+
+- Identical requests share one call: a request already in flight is awaited
+  (single-flight) and one that finished within `identical_window_seconds` is
+  answered from its result.
+- Everything else waits in a FIFO per symbol, and free slots go round-robin
+  across symbols, so one instrument's multi-year backfill cannot starve the
+  others.
+- A slot is free when fewer than `max_concurrent` requests are running, the
+  pacing window has room and the symbol is under its per-contract burst
+  limit. When only pacing holds requests back, a timer wakes the scheduler
+  when the oldest request leaves the window; nothing polls.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Hashable
+
+NS_PER_SECOND = 1_000_000_000
+
+# (smallest bar size in seconds, longest duration in seconds IB serves for it)
+_MAX_DURATIONS = (
+    (1, 1800),
+    (5, 3600),
+    (10, 14400),
+    (30, 28800),
+    (60, 86400),          # 1 D
+    (120, 2 * 86400),     # 2 D
+    (180, 7 * 86400),     # 1 W
+    (1800, 30 * 86400),   # 1 M
+    (86400, 365 * 86400), # 1 Y
+)
+
+def max_chunk_seconds(bar_seconds: int) -> int:
+    """Longest duration one historical request may span for this bar size"""
+    longest = _MAX_DURATIONS[0][1]
+    for smallest_bar, duration in _MAX_DURATIONS:
+        if bar_seconds >= smallest_bar:
+            longest = duration
+    return longest
+
+def plan_chunks(start_ns: int, end_ns: int, bar_seconds: int) -> List[Tuple[int, int]]:
+    """
+    Split [start_ns, end_ns) into requests IB accepts
+    
+    Chunk boundaries fall on multiples of the chunk length, so two ranges
+    that overlap produce identical requests for the chunks they share.
+    
+    Returns:
+        (chunk_start_ns, chunk_end_ns) pairs, oldest first
+    """
+    if end_ns <= start_ns:
+        return []
+    step = max_chunk_seconds(bar_seconds) * NS_PER_SECOND
+    chunks = []
+    boundary = start_ns - start_ns % step
+    while boundary < end_ns:
+        chunks.append((max(boundary, start_ns), min(boundary + step, end_ns)))
+        boundary += step
+    return chunks
+
+class RequestScheduler:
+    """Runs IB requests within the pacing limits, deduplicated and fair across symbols"""
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config: Optional `pacing` settings: max_concurrent, max_requests
+                per window_seconds, max_per_contract per
+                contract_window_seconds and identical_window_seconds
+        """
+        config = config or {}
+        self.max_concurrent = int(config.get("max_concurrent", 10))
+        self.max_requests = int(config.get("max_requests", 60))
+        self.window = float(config.get("window_seconds", 600))
+        self.max_per_contract = int(config.get("max_per_contract", 5))
+        self.contract_window = float(config.get("contract_window_seconds", 2))
+        self.identical_window = float(config.get("identical_window_seconds", 15))
+        
+        self._running = 0
+        # Start time stamps ([monotonic seconds]) of recent requests, shared by
+        # both windows: set when a slot is granted, moved to when the call starts
+        self._started: deque = deque()                    # Within `window`
+        self._contract_started: Dict[str, deque] = {}     # symbol -> within contract_window
+        self._waiting: Dict[str, deque] = {}              # symbol -> grant futures, FIFO
+        self._turns: deque = deque()                      # Symbols with waiting requests, round-robin
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}   # key -> (finished at, result)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        
+        self.stats = {"requests": 0, "shared": 0, "reused": 0}
+        
+    @property
+    def waiting(self) -> int:
+        """Requests waiting for a slot"""
+        return sum(len(queue) for queue in self._waiting.values())
+        
+    async def run(self, key: Hashable, symbol: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `request()` once a slot is free, or share an identical request's result
+        
+        Args:
+            key: Identity of the request; equal keys share one IB call
+            symbol: Contract the request is for (fairness and burst limit)
+            request: Coroutine function making the IB call
+            
+        Returns:
+            The result of `request()`; callers sharing it must not modify it
+        """
+        now = time.monotonic()
+        self._forget(now)
+        recent = self._recent.get(key)
+        if recent is not None:
+            self.stats["reused"] += 1
+            return recent[1]
+            
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._execute(key, symbol, request))
+        else:
+            self.stats["shared"] += 1
+        # A caller giving up does not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+        
+    async def _execute(self, key: Hashable, symbol: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            stamp = await self._acquire(symbol)
+            try:
+                stamp[0] = time.monotonic()
+                result = await request()
+            finally:
+                self._running -= 1
+                self._pump()
+            self._recent[key] = (time.monotonic(), result)
+            return result
+        finally:
+            del self._inflight[key]
+            
+    async def _acquire(self, symbol: str) -> List[float]:
+        """Wait for this symbol's turn and a free slot; returns the slot's start stamp"""
+        grant = asyncio.get_running_loop().create_future()
+        queue = self._waiting.get(symbol)
+        if queue is None:
+            queue = self._waiting[symbol] = deque()
+            self._turns.append(symbol)
+        queue.append(grant)
+        self._pump()
+        try:
+            return await grant
+        except asyncio.CancelledError:
+            # Granted just before the cancellation: hand the slot on
+            if grant.done() and not grant.cancelled():
+                self._running -= 1
+                self._pump()
+            raise
+            
+    def _pump(self) -> None:
+        """Grant free slots to waiting requests, one symbol at a time"""
+        now = time.monotonic()
+        self._trim(now)
+        
+        deferred = []   # Symbols at their burst limit keep their place in line
+        while self._turns and self._running < self.max_concurrent and len(self._started) < self.max_requests:
+            symbol = self._turns.popleft()
+            queue = self._waiting[symbol]
+            while queue and queue[0].done():   # Cancelled while waiting
+                queue.popleft()
+            if not queue:
+                del self._waiting[symbol]
+                continue
+                
+            burst = self._contract_started.setdefault(symbol, deque())
+            if len(burst) >= self.max_per_contract:
+                deferred.append(symbol)
+                continue
+                
+            stamp = [now]
+            queue.popleft().set_result(stamp)
+            self._running += 1
+            self._started.append(stamp)
+            burst.append(stamp)
+            self.stats["requests"] += 1
+            
+            if queue:
+                self._turns.append(symbol)
+            else:
+                del self._waiting[symbol]
+        self._turns.extendleft(reversed(deferred))
+        self._arm_timer(now, deferred)
+        
+    def _trim(self, now: float) -> None:
+        """Drop start times that left the pacing windows"""
+        while self._started and self._started[0][0] <= now - self.window:
+            self._started.popleft()
+        for symbol in list(self._contract_started):
+            burst = self._contract_started[symbol]
+            while burst and burst[0][0] <= now - self.contract_window:
+                burst.popleft()
+            if not burst:
+                del self._contract_started[symbol]
+                
+    def _arm_timer(self, now: float, deferred: List[str]) -> None:
+        """Wake up when a pacing window frees a slot that a waiting request needs"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._turns or self._running >= self.max_concurrent:
+            return   # Nothing waits, or a finishing request pumps again
+            
+        if len(self._started) >= self.max_requests:
+            wake = self._started[0][0] + self.window
+        elif deferred:
+            wake = min(self._contract_started[symbol][0][0] for symbol in deferred) + self.contract_window
+        else:
+            return
+        self._timer = asyncio.get_running_loop().call_later(max(0.0, wake - now), self._pump)
+        
+    def _forget(self, now: float) -> None:
+        """Drop results older than identical_window_seconds"""
+        cutoff = now - self.identical_window
+        for key in [key for key, (finished, _) in self._recent.items() if finished <= cutoff]:
+            del self._recent[key]
+            
+    def close(self) -> None:
+        """Cancel the pacing timer and the calls in flight"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._inflight.values()):
+            task.cancel()
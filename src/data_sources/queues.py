@@ -0,0 +1,73 @@
+"""
+Bounded bar event queues between data sources and the scanner
+
+A data source appends every closed bar to its bar store and then puts a
+`BarEvent` on the series' queue; the scanner's consumer for that series wakes
+up and processes every stored bar it has not processed yet. An event is only
+a wake-up carrying timestamps for latency tracking, the bars themselves stay
+in the bar store. That makes the overflow policy for a full queue simple:
+
+- `block`: `put` waits for the consumer (backpressure). For producers that
+  can wait, like the replay clock.
+- `coalesce`: the oldest queued event is dropped to make room. Its bar is
+  still processed with the next event, so a burst costs wake-ups, not bars.
+  For producers that must not wait, like the IB callbacks.
+"""
+
+import asyncio
+from typing import NamedTuple, Optional
+
+BLOCK = "block"
+COALESCE = "coalesce"
+OVERFLOW_POLICIES = (BLOCK, COALESCE)
+
+class BarEvent(NamedTuple):
+    """A closed bar published by a data source"""
+    symbol: str
+    timeframe: str
+    timestamp: int   # Bar open, ns since epoch
+    published: int   # Wall clock (time.time_ns) when the source released the bar
+
+class BarQueue(asyncio.Queue):
+    """asyncio.Queue of BarEvents with a size bound and an overflow policy"""
+    
+    def __init__(self, maxsize: int = 64, overflow: str = COALESCE):
+        """
+        Args:
+            maxsize: Events held before the overflow policy applies (>= 1)
+            overflow: BLOCK or COALESCE
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown queue overflow policy: {overflow}")
+        if maxsize < 1:
+            raise ValueError(f"Invalid bar queue size: {maxsize}")
+        super().__init__(maxsize)
+        self.overflow = overflow
+        self.coalesced = 0   # Events dropped to make room
+        
+    async def put(self, event: Optional[BarEvent]) -> None:
+        """Queue an event, waiting for room under BLOCK"""
+        if self.overflow == BLOCK:
+            await super().put(event)
+        else:
+            self.put_nowait(event)
+            
+    def put_nowait(self, event: Optional[BarEvent]) -> None:
+        """
+        Queue an event without waiting
+        
+        Raises:
+            asyncio.QueueFull: If the queue is full under BLOCK
+        """
+        if self.overflow == COALESCE and self.full():
+            self.get_nowait()
+            self.task_done()
+            self.coalesced += 1
+        super().put_nowait(event)
+        
+    def close(self) -> None:
+        """Queue the end-of-stream marker (None), making room if needed"""
+        if self.full():
+            self.get_nowait()
+            self.task_done()
+        super().put_nowait(None)
@@ -0,0 +1,287 @@
+"""
+Historical replay data source
+
+Plays stored bars back through the same DataSource interface the live feed
+uses, so the scanner pipeline runs unchanged for backtests. Bars are read from
+CSV or Parquet files named `{symbol}_{timeframe}.csv|parquet` in the replay
+directory. A timeframe without its own file is rolled up from the shortest
+available timeframe for the symbol with the same aggregator used live.
+
+Bars from every subscribed series are emitted in global close-time order. With
+`speed: 0` the replay runs unthrottled, in lockstep with the consumers: the
+next bar is not released until every stream has finished with the previous
+one.
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, List, Any, AsyncGenerator, Optional, Tuple
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .base import DataSource
+from .bar_store import COLUMNS
+from .aggregator import MultiTimeframeAggregator, timeframe_to_seconds
+from .queues import BarEvent, BarQueue, BLOCK
+
+NS_PER_SECOND = 1_000_000_000
+
+def load_bar_file(path: Path) -> Dict[str, np.ndarray]:
+    """
+    Read a CSV or Parquet bar file into column arrays
+    
+    The timestamp column may hold strings, datetimes or epoch nanoseconds;
+    naive values are taken as UTC.
+    
+    Returns:
+        Dict of column name -> array, timestamps as int64 UTC nanoseconds, sorted
+    """
+    if path.suffix == ".parquet":
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+        
+    ts = frame["timestamp"]
+    if pd.api.types.is_integer_dtype(ts):
+        ts_ns = ts.to_numpy(dtype=np.int64)
+    else:
+        ts_ns = pd.DatetimeIndex(pd.to_datetime(ts, utc=True)).as_unit("ns").asi8
+        
+    order = np.argsort(ts_ns, kind="stable")
+    data = {"timestamp": np.ascontiguousarray(ts_ns[order])}
+    for name in COLUMNS[1:]:
+        values = frame[name].to_numpy(dtype=np.float64) if name in frame else np.zeros(len(frame))
+        data[name] = np.ascontiguousarray(values[order])
+    return data
+
+def _aggregate(data: Dict[str, np.ndarray], base_seconds: int,
+               timeframes: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Roll base bars up into the requested timeframes"""
+    aggregator = MultiTimeframeAggregator(timeframes, base_seconds)
+    rows: Dict[str, List[Tuple]] = {tf: [] for tf in timeframes}
+    columns = [data[name].tolist() for name in COLUMNS]
+    for bar in zip(*columns):
+        for tf, completed in aggregator.add(bar):
+            rows[tf].append(completed)
+            
+    result = {}
+    for tf, bars in rows.items():
+        cols = list(zip(*bars)) if bars else [()] * len(COLUMNS)
+        result[tf] = {
+            name: np.array(values, dtype=np.int64 if name == "timestamp" else np.float64)
+            for name, values in zip(COLUMNS, cols)
+        }
+    return result
+
+class ReplayDataSource(DataSource):
+    """Replays stored bars at an accelerated or unthrottled pace"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: Data source config with `path`, optional `speed`
+                (0 = unthrottled, N = N times real time), `start` and `end`
+        """
+        super().__init__(config)
+        self.path = Path(config.get("path", "data/replay"))
+        self.speed = float(config.get("speed", 0))
+        self.start = self._parse_bound(config.get("start"))
+        self.end = self._parse_bound(config.get("end"))
+        
+        self.series: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        self._streams_started = 0
+        self._clock_task: Optional[asyncio.Task] = None
+        self.finished = asyncio.Event()
+        
+    @staticmethod
+    def _parse_bound(value) -> Optional[int]:
+        if value is None:
+            return None
+        stamp = pd.Timestamp(value)
+        if stamp.tz is None:
+            stamp = stamp.tz_localize("UTC")
+        return stamp.as_unit("ns").value
+        
+    async def connect(self) -> None:
+        """Check that the replay directory exists"""
+        if not self.path.is_dir():
+            raise ConnectionError(f"Replay directory not found: {self.path}")
+        self.connected = True
+        logger.info(f"Replay source ready: {self.path} (speed={self.speed or 'unthrottled'})")
+        
+    async def disconnect(self) -> None:
+        """Stop the replay clock"""
+        if self._clock_task and not self._clock_task.done():
+            self._clock_task.cancel()
+        self.connected = False
+        
+    def _find_file(self, symbol: str, timeframe: str) -> Optional[Path]:
+        for suffix in (".parquet", ".csv"):
+            path = self.path / f"{symbol}_{timeframe}{suffix}"
+            if path.exists():
+                return path
+        return None
+        
+    def _load(self, symbol: str, timeframes: List[str]) -> None:
+        """Load (or derive) bars for every requested timeframe of a symbol"""
+        missing = []
+        for tf in timeframes:
+            path = self._find_file(symbol, tf)
+            if path is None:
+                missing.append(tf)
+                continue
+            self.series[(symbol, tf)] = self._clip(load_bar_file(path))
+            
+        if not missing:
+            return
+            
+        # Derive the rest from the shortest timeframe on disk
+        files = sorted(
+            (timeframe_to_seconds(p.stem.split("_", 1)[1]), p)
+            for p in self.path.glob(f"{symbol}_*")
+            if p.suffix in (".csv", ".parquet")
+        )
+        if not files:
+            raise ValueError(f"No replay data for {symbol}")
+            
+        base_seconds, base_path = files[0]
+        if any(timeframe_to_seconds(tf) % base_seconds for tf in missing):
+            raise ValueError(f"Cannot derive {missing} from {base_path.name}")
+            
+        base = self._clip(load_bar_file(base_path))
+        for tf, data in _aggregate(base, base_seconds, missing).items():
+            self.series[(symbol, tf)] = data
+        logger.info(f"Derived {symbol} {missing} from {base_path.name}")
+        
+    def _clip(self, data: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Restrict bars to the configured start/end"""
+        ts = data["timestamp"]
+        lo = 0 if self.start is None else np.searchsorted(ts, self.start, side="left")
+        hi = len(ts) if self.end is None else np.searchsorted(ts, self.end, side="left")
+        return {name: values[lo:hi] for name, values in data.items()}
+        
+    async def subscribe(self, symbol: str, timeframes: List[str]) -> None:
+        """Load bars for the symbol and set up one stream per timeframe"""
+        if not self.connected:
+            raise ConnectionError("Replay source not connected")
+            
+        self._load(symbol, [tf for tf in timeframes if (symbol, tf) not in self.series])
+        for tf in timeframes:
+            # One blocking slot per stream keeps the clock in lockstep with consumers
+            self.data_queues.setdefault((symbol, tf), BarQueue(1, BLOCK))
+        logger.info(f"Subscribed to {symbol} on timeframes: {timeframes}")
+        
+    async def unsubscribe(self, symbol: str, timeframes: List[str]) -> None:
+        """Stop replaying the given series"""
+        for tf in timeframes:
+            self.series.pop((symbol, tf), None)
+            self.data_queues.pop((symbol, tf), None)
+            self.bar_store.drop(symbol, tf)
+            
+    async def get_historical_data(
+        self,
+        symbol: str,
+        timeframe: str,
+        start_time: pd.Timestamp,
+        end_time: pd.Timestamp,
+        back_adjust: Optional[bool] = None
+    ) -> pd.DataFrame:
+        """Slice stored bars for the range (stored series are never adjusted)"""
+        if (symbol, timeframe) not in self.series:
+            self._load(symbol, [timeframe])
+        data = self.series[(symbol, timeframe)]
+        
+        start_ns, end_ns = self._parse_bound(start_time), self._parse_bound(end_time)
+        ts = data["timestamp"]
+        lo, hi = np.searchsorted(ts, start_ns, side="left"), np.searchsorted(ts, end_ns, side="left")
+        
+        frame = {name: values[lo:hi] for name, values in data.items()}
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="ns", utc=True)
+        return pd.DataFrame(frame)
+        
+    async def get_latest_data(
+        self,
+        symbol: str,
+        timeframe: str
+    ) -> pd.DataFrame:
+        """Most recent bar replayed so far"""
+        frame = dict(self.bar_store.view(symbol, timeframe, 1))
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="ns", utc=True)
+        return pd.DataFrame(frame)
+        
+    async def stream_data(
+        self,
+        symbol: str,
+        timeframe: str
+    ) -> AsyncGenerator[Tuple[BarEvent, Dict[str, np.ndarray]], None]:
+        """Yield bar events and bar store views as the replay clock releases bars"""
+        if (symbol, timeframe) not in self.data_queues:
+            raise ValueError(f"Not subscribed to {symbol} {timeframe}")
+            
+        queue = self.data_queues[(symbol, timeframe)]
+        buffer = self.bar_store.buffer(symbol, timeframe)
+        
+        # The clock starts once every subscribed series has a consumer
+        self._streams_started += 1
+        if self._streams_started == len(self.data_queues) and self._clock_task is None:
+            self._clock_task = asyncio.create_task(self._run_clock())
+            
+        while True:
+            event = await queue.get()
+            try:
+                if event is None:
+                    return
+                yield event, buffer.view()
+            finally:
+                queue.task_done()
+                
+    def _schedule(self) -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray]:
+        """Global emission order: by bar close, then shorter timeframe first"""
+        keys = list(self.series)
+        close_ts, periods, series_idx, rows = [], [], [], []
+        for i, (symbol, tf) in enumerate(keys):
+            ts = self.series[(symbol, tf)]["timestamp"]
+            period = timeframe_to_seconds(tf) * NS_PER_SECOND
+            close_ts.append(ts + period)
+            periods.append(np.full(len(ts), period, dtype=np.int64))
+            series_idx.append(np.full(len(ts), i, dtype=np.int64))
+            rows.append(np.arange(len(ts), dtype=np.int64))
+            
+        if not keys:
+            empty = np.empty(0, dtype=np.int64)
+            return keys, empty, empty
+            
+        close_ts, periods = np.concatenate(close_ts), np.concatenate(periods)
+        series_idx, rows = np.concatenate(series_idx), np.concatenate(rows)
+        order = np.lexsort((series_idx, periods, close_ts))
+        return keys, series_idx[order], rows[order]
+        
+    async def _run_clock(self) -> None:
+        """Release bars in order, pacing them when a speed is configured"""
+        keys, series_idx, rows = self._schedule()
+        columns = [[self.series[key][name] for name in COLUMNS] for key in keys]
+        buffers = [self.bar_store.buffer(*key) for key in keys]
+        queues = [self.data_queues[key] for key in keys]
+        logger.info(f"Replaying {len(rows)} bars across {len(keys)} series")
+        
+        wall_start = time.monotonic()
+        first_ts = None
+        try:
+            for i, row in zip(series_idx.tolist(), rows.tolist()):
+                ts, o, h, l, c, v = (col[row] for col in columns[i])
+                if self.speed > 0:
+                    first_ts = ts if first_ts is None else first_ts
+                    delay = wall_start + (ts - first_ts) / NS_PER_SECOND / self.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                        
+                buffers[i].append(ts, o, h, l, c, v)
+                await queues[i].put(BarEvent(*keys[i], int(ts), time.time_ns()))
+                await queues[i].join()
+        finally:
+            for queue in queues:
+                queue.close()
+            self.finished.set()
+            logger.info(f"Replay finished in {time.monotonic() - wall_start:.1f}s")
@@ -3,9 +3,76 @@ Database management for the ICT PD Array Scanner
 """
 
 import asyncio
-from typing import Dict, Any, Optional
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Union
 from loguru import logger
 
+from . import metrics
+
+PATTERN_COLUMNS = (
+    "pattern_id", "symbol", "timeframe", "pattern_type", "direction",
+    "mean_threshold", "upper_bound", "lower_bound", "status", "confidence",
+    "metadata", "created_at", "last_updated"
+)
+
+ALERT_COLUMNS = ("pattern_id", "alert_type", "priority", "message", "sent_at")
+
+# Columns overwritten when a pattern row is saved again
+PATTERN_UPDATE_COLUMNS = tuple(c for c in PATTERN_COLUMNS if c not in ("pattern_id", "created_at"))
+
+PG_UPSERT_PATTERN = f"""
+    INSERT INTO patterns ({", ".join(PATTERN_COLUMNS)})
+    VALUES ({", ".join(f"${i}" for i in range(1, len(PATTERN_COLUMNS) + 1))})
+    ON CONFLICT (pattern_id) DO UPDATE SET
+    {", ".join(f"{c} = EXCLUDED.{c}" for c in PATTERN_UPDATE_COLUMNS)}
+"""
+
+# Same upsert on SQLite (3.24+). INSERT OR REPLACE would delete and re-insert
+# the row under a new id, moving it in the (created_at, id) keyset order.
+SQLITE_UPSERT_PATTERN = f"""
+    INSERT INTO patterns ({", ".join(PATTERN_COLUMNS)})
+    VALUES ({", ".join("?" * len(PATTERN_COLUMNS))})
+    ON CONFLICT (pattern_id) DO UPDATE SET
+    {", ".join(f"{c} = excluded.{c}" for c in PATTERN_UPDATE_COLUMNS)}
+"""
+
+PG_INSERT_ALERT = f"""
+    INSERT INTO alerts ({", ".join(ALERT_COLUMNS)})
+    VALUES ({", ".join(f"${i}" for i in range(1, len(ALERT_COLUMNS) + 1))})
+"""
+
+# COPY lands in a per-session staging table, then one upsert moves the rows
+PG_CREATE_STAGING = f"""
+    CREATE TEMP TABLE IF NOT EXISTS patterns_staging ON COMMIT DELETE ROWS AS
+    SELECT {", ".join(PATTERN_COLUMNS)} FROM patterns WITH NO DATA
+"""
+
+PG_MERGE_STAGING = f"""
+    INSERT INTO patterns ({", ".join(PATTERN_COLUMNS)})
+    SELECT DISTINCT ON (pattern_id) {", ".join(PATTERN_COLUMNS)}
+    FROM patterns_staging
+    ORDER BY pattern_id, last_updated DESC
+    ON CONFLICT (pattern_id) DO UPDATE SET
+    {", ".join(f"{c} = EXCLUDED.{c}" for c in PATTERN_UPDATE_COLUMNS)}
+"""
+
+# Same DDL on both backends. The series index serves "active MES 15m patterns,
+# newest first" straight from the index; id is the keyset tie-breaker.
+PATTERN_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_patterns_series "
+    "ON patterns (symbol, timeframe, status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_patterns_created ON patterns (created_at, id)",
+)
+
+# (created_at, id) of the last row of a page
+Cursor = Tuple[Any, int]
+
+WRITE_SECONDS = metrics.histogram(
+    "scanner_db_write_seconds", "Time to write one batch of rows", ["backend"]
+)
+
 class DatabaseManager:
     """Manages database connections and operations"""
     
@@ -13,7 +80,26 @@ class DatabaseManager:
         """Initialize database manager with configuration"""
         self.config = config
         self.db_type = config.get("type", "sqlite")
-        self.connection = None
+        self.connection = None  # aiosqlite connection
+        self.pool = None        # asyncpg pool
+        
+        # Batches at least this large go through COPY on PostgreSQL
+        self.copy_threshold = int(config.get("copy_threshold", 1000))
+        
+        # Write-behind: callers enqueue rows, a background task writes them in batches
+        write_behind = config.get("write_behind") or {}
+        self.write_behind = write_behind.get("enabled", True)
+        self.batch_size = int(write_behind.get("batch_size", 500))
+        self.flush_interval = float(write_behind.get("flush_interval_ms", 250)) / 1000.0
+        # Backpressure: past this many queued rows a save waits for a flush
+        self.max_pending = int(write_behind.get("max_pending", 10 * self.batch_size))
+        
+        self._pending_patterns: Dict[str, Tuple] = {}  # pattern_id -> latest row
+        self._pending_alerts: List[Tuple] = []
+        self._flush_needed = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closing = False
         
     async def connect(self) -> None:
         """Connect to the database"""
@@ -25,6 +111,10 @@ class DatabaseManager:
             else:
                 raise ValueError(f"Unsupported database type: {self.db_type}")
                 
+            if self.write_behind:
+                self._closing = False
+                self._flush_task = asyncio.create_task(self._flush_loop())
+                
             logger.info(f"Connected to {self.db_type} database")
             
         except Exception as e:
@@ -36,17 +126,88 @@ class DatabaseManager:
         import aiosqlite
         
         db_path = self.config.get("path", "data/scanner.db")
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self.connection = await aiosqlite.connect(db_path)
         
+        # WAL lets readers run alongside the batch writer; NORMAL skips the
+        # fsync per commit that FULL would do (WAL stays consistent on crash)
+        journal_mode = self.config.get("journal_mode", "WAL")
+        synchronous = self.config.get("synchronous", "NORMAL")
+        await self.connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        await self.connection.execute(f"PRAGMA synchronous={synchronous}")
+        
         # Create tables if they don't exist
         await self._create_tables()
         
     async def _connect_postgresql(self) -> None:
-        """Connect to PostgreSQL database"""
-        # Implementation for PostgreSQL connection
-        # This would use asyncpg or similar
-        pass
+        """
+        Create an asyncpg connection pool
         
+        Every pooled connection caches its prepared statements, so the
+        upsert and query statements are parsed and planned once per
+        connection. Several scanner processes can share the database, each
+        with its own pool.
+        """
+        import asyncpg
+        
+        self.pool = await asyncpg.create_pool(
+            host=self.config.get("host", "localhost"),
+            port=self.config.get("port", 5432),
+            database=self.config.get("database", "ict_scanner"),
+            user=self.config.get("username"),
+            password=self.config.get("password"),
+            min_size=int(self.config.get("pool_min_size", 2)),
+            max_size=int(self.config.get("pool_max_size", 10)),
+            command_timeout=self.config.get("command_timeout", 30),
+            statement_cache_size=int(self.config.get("statement_cache_size", 100)),
+        )
+        await self._create_tables_postgresql()
+        
+    def _is_connected(self) -> bool:
+        return self.connection is not None or self.pool is not None
+        
+    async def _create_tables_postgresql(self) -> None:
+        """Create PostgreSQL tables if they don't exist"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Serialize schema setup between scanner processes starting together
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('ict_scanner_schema'))")
+                
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS patterns (
+                        id BIGSERIAL PRIMARY KEY,
+                        pattern_id TEXT UNIQUE NOT NULL,
+                        symbol TEXT NOT NULL,
+                        timeframe TEXT NOT NULL,
+                        pattern_type TEXT NOT NULL,
+                        direction TEXT NOT NULL,
+                        mean_threshold DOUBLE PRECISION NOT NULL,
+                        upper_bound DOUBLE PRECISION NOT NULL,
+                        lower_bound DOUBLE PRECISION NOT NULL,
+                        status TEXT NOT NULL,
+                        confidence DOUBLE PRECISION NOT NULL,
+                        metadata TEXT,
+                        created_at TIMESTAMPTZ DEFAULT now(),
+                        last_updated TIMESTAMPTZ DEFAULT now()
+                    )
+                """)
+                
+                # No foreign key: alerts may be bulk-loaded ahead of their patterns
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS alerts (
+                        id BIGSERIAL PRIMARY KEY,
+                        pattern_id TEXT NOT NULL,
+                        alert_type TEXT NOT NULL,
+                        priority TEXT NOT NULL,
+                        message TEXT NOT NULL,
+                        sent_at TIMESTAMPTZ DEFAULT now()
+                    )
+                """)
+                
+                for statement in PATTERN_INDEXES:
+                    await conn.execute(statement)
+                
+                
     async def _create_tables(self) -> None:
         """Create database tables if they don't exist"""
         if not self.connection:
@@ -85,73 +246,388 @@ class DatabaseManager:
             )
         """)
         
+        for statement in PATTERN_INDEXES:
+            await self.connection.execute(statement)
+            
         await self.connection.commit()
         
     async def save_pattern(self, pattern_data: Dict[str, Any]) -> bool:
-        """Save pattern to database"""
+        """
+        Save pattern to database
+        
+        With write-behind enabled this only queues the row and returns; repeated
+        saves of the same pattern before the next flush collapse into one write.
+        """
         try:
-            if not self.connection:
+            if not self._is_connected():
                 return False
                 
-            await self.connection.execute("""
-                INSERT OR REPLACE INTO patterns 
-                (pattern_id, symbol, timeframe, pattern_type, direction, 
-                 mean_threshold, upper_bound, lower_bound, status, confidence, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                pattern_data["pattern_id"],
-                pattern_data["symbol"],
-                pattern_data["timeframe"],
-                pattern_data["pattern_type"],
-                pattern_data["direction"],
-                pattern_data["mean_threshold"],
-                pattern_data["upper_bound"],
-                pattern_data["lower_bound"],
-                pattern_data["status"],
-                pattern_data["confidence"],
-                str(pattern_data.get("metadata", ""))
-            ))
-            
-            await self.connection.commit()
+            row = self._pattern_row(pattern_data)
+            if self.write_behind:
+                self._pending_patterns[row[0]] = row
+                await self._queued()
+                return True
+                
+            await self._write_batch([row], [])
             return True
             
         except Exception as e:
             logger.error(f"Failed to save pattern: {str(e)}")
             return False
             
-    async def get_patterns(self, symbol: Optional[str] = None, 
-                          pattern_type: Optional[str] = None) -> list:
-        """Get patterns from database"""
+    async def save_alert(self, alert_data: Dict[str, Any]) -> bool:
+        """Save a sent alert to the alerts table"""
         try:
-            if not self.connection:
-                return []
+            if not self._is_connected():
+                return False
+                
+            row = self._alert_row(alert_data)
+            if self.write_behind:
+                self._pending_alerts.append(row)
+                await self._queued()
+                return True
+                
+            await self._write_batch([], [row])
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to save alert: {str(e)}")
+            return False
+            
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        
+    def _pattern_row(self, pattern_data: Dict[str, Any]) -> Tuple:
+        """Snapshot a pattern dict as a row (the dict keeps changing after this)"""
+        now = self._now()
+        return (
+            pattern_data["pattern_id"],
+            pattern_data["symbol"],
+            pattern_data["timeframe"],
+            pattern_data["pattern_type"],
+            pattern_data["direction"],
+            pattern_data["mean_threshold"],
+            pattern_data["upper_bound"],
+            pattern_data["lower_bound"],
+            pattern_data["status"],
+            pattern_data["confidence"],
+            str(pattern_data.get("metadata", "")),
+            pattern_data.get("created_at") or now,
+            pattern_data.get("last_updated") or now,
+        )
+        
+    def _alert_row(self, alert_data: Dict[str, Any]) -> Tuple:
+        return (
+            alert_data["pattern_id"],
+            alert_data["alert_type"],
+            alert_data["priority"],
+            alert_data.get("message", ""),
+            alert_data.get("sent_at") or self._now(),
+        )
+        
+    @property
+    def pending(self) -> int:
+        """Rows queued by the write-behind buffer and not yet written"""
+        return len(self._pending_patterns) + len(self._pending_alerts)
+        
+    async def _queued(self) -> None:
+        """
+        Wake the flush task early once a full batch is waiting, and flush in
+        the caller when the writes fall `max_pending` rows behind, so a burst
+        slows the producer down instead of growing the queue
+        """
+        pending = self.pending
+        if pending >= self.max_pending:
+            await self.flush()
+        elif pending >= self.batch_size:
+            self._flush_needed.set()
+            
+    async def _flush_loop(self) -> None:
+        """Flush pending rows on a size-or-time trigger until close()"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            await self.flush()
+            
+    async def flush(self) -> None:
+        """Write all pending rows in one transaction"""
+        async with self._flush_lock:
+            if not self._pending_patterns and not self._pending_alerts:
+                return
+            if not self._is_connected():
+                return
                 
-            query = "SELECT * FROM patterns WHERE 1=1"
-            params = []
+            patterns, self._pending_patterns = self._pending_patterns, {}
+            alerts, self._pending_alerts = self._pending_alerts, []
+            try:
+                await self._write_batch(list(patterns.values()), alerts)
+            except BaseException as e:
+                # Keep the rows for the next attempt, also when cancelled
+                # mid-write; newer saves take precedence
+                for pattern_id, row in patterns.items():
+                    self._pending_patterns.setdefault(pattern_id, row)
+                self._pending_alerts[:0] = alerts
+                if not isinstance(e, Exception):
+                    raise
+                logger.error(f"Failed to flush {len(patterns)} patterns / {len(alerts)} alerts: {str(e)}")
+                
+    async def bulk_save(
+        self,
+        patterns: List[Dict[str, Any]],
+        alerts: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Write many patterns and alerts at once (backfills, replays)
+        
+        Bypasses the write-behind queue. On PostgreSQL large batches are
+        loaded with COPY.
+        """
+        await self._write_batch(
+            [self._pattern_row(p) for p in patterns],
+            [self._alert_row(a) for a in alerts or []]
+        )
+        
+    async def _write_batch(self, patterns: List[Tuple], alerts: List[Tuple]) -> None:
+        """Write rows with executemany inside a single transaction"""
+        started = time.perf_counter()
+        if self.pool is not None:
+            await self._write_batch_postgresql(patterns, alerts)
+            WRITE_SECONDS.observe(time.perf_counter() - started, "postgresql")
+            return
             
-            if symbol:
-                query += " AND symbol = ?"
-                params.append(symbol)
+        try:
+            if patterns:
+                await self.connection.executemany(SQLITE_UPSERT_PATTERN, patterns)
                 
-            if pattern_type:
-                query += " AND pattern_type = ?"
-                params.append(pattern_type)
+            if alerts:
+                await self.connection.executemany(f"""
+                    INSERT INTO alerts ({", ".join(ALERT_COLUMNS)})
+                    VALUES ({", ".join("?" * len(ALERT_COLUMNS))})
+                """, alerts)
+                
+            await self.connection.commit()
+        except BaseException:
+            # A half-written batch must not ride along with the next commit
+            await self.connection.rollback()
+            raise
+        WRITE_SECONDS.observe(time.perf_counter() - started, "sqlite")
+        
+    @staticmethod
+    def _parse_time(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        
+    async def _write_batch_postgresql(self, patterns: List[Tuple], alerts: List[Tuple]) -> None:
+        """Write rows on one pooled connection in a single transaction"""
+        # asyncpg wants datetime objects for TIMESTAMPTZ columns
+        pattern_records = [
+            row[:-2] + (self._parse_time(row[-2]), self._parse_time(row[-1])) for row in patterns
+        ]
+        alert_records = [row[:-1] + (self._parse_time(row[-1]),) for row in alerts]
+        
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if len(pattern_records) + len(alert_records) >= self.copy_threshold:
+                    if pattern_records:
+                        await conn.execute(PG_CREATE_STAGING)
+                        await conn.copy_records_to_table(
+                            "patterns_staging", records=pattern_records, columns=PATTERN_COLUMNS
+                        )
+                        await conn.execute(PG_MERGE_STAGING)
+                    if alert_records:
+                        await conn.copy_records_to_table(
+                            "alerts", records=alert_records, columns=ALERT_COLUMNS
+                        )
+                else:
+                    if pattern_records:
+                        await conn.executemany(PG_UPSERT_PATTERN, pattern_records)
+                    if alert_records:
+                        await conn.executemany(PG_INSERT_ALERT, alert_records)
+                        
+    def _placeholder(self, index: int) -> str:
+        """Query parameter marker for the backend (1-based index)"""
+        return f"${index}" if self.pool is not None else "?"
+        
+    def _time_param(self, value: Union[str, datetime]) -> Any:
+        """Time bound in the form the created_at column is compared with"""
+        if isinstance(value, str):
+            value = self._parse_time(value)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        if self.pool is not None:
+            return value
+        # SQLite stores ISO strings, which compare in time order
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        
+    def _pattern_query(
+        self,
+        symbol: Optional[str] = None,
+        pattern_type: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        status: Optional[Union[str, List[str]]] = None,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        after: Optional[Cursor] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[str, List]:
+        """Build a filtered patterns query, newest first"""
+        query = "SELECT * FROM patterns WHERE 1=1"
+        params = []
+        
+        def bind(value) -> str:
+            params.append(value)
+            return self._placeholder(len(params))
+            
+        if symbol:
+            query += f" AND symbol = {bind(symbol)}"
+        if timeframe:
+            query += f" AND timeframe = {bind(timeframe)}"
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            query += f" AND status IN ({', '.join(bind(s) for s in statuses)})"
+        if pattern_type:
+            query += f" AND pattern_type = {bind(pattern_type)}"
+        if start is not None:
+            query += f" AND created_at >= {bind(self._time_param(start))}"
+        if end is not None:
+            query += f" AND created_at < {bind(self._time_param(end))}"
+            
+        # Keyset pagination: continue strictly below the previous page's last row
+        if after is not None:
+            created_at, row_id = after
+            query += f" AND (created_at, id) < ({bind(created_at)}, {bind(row_id)})"
+            
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            query += f" LIMIT {bind(int(limit))}"
+        return query, params
+        
+    async def _fetch(self, query: str, params: List) -> List[Dict[str, Any]]:
+        if self.pool is not None:
+            async with self.pool.acquire() as conn:
+                return [dict(record) for record in await conn.fetch(query, *params)]
                 
-            query += " ORDER BY created_at DESC"
+        cursor = await self.connection.execute(query, params)
+        rows = await cursor.fetchall()
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+        
+    async def get_patterns(
+        self,
+        symbol: Optional[str] = None,
+        pattern_type: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        status: Optional[Union[str, List[str]]] = None,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        limit: Optional[int] = None,
+        after: Optional[Cursor] = None
+    ) -> list:
+        """
+        Get patterns from database, newest first
+        
+        Args:
+            symbol, pattern_type, timeframe: Exact-match filters
+            status: A status or list of statuses
+            start, end: created_at range, start inclusive, end exclusive
+            limit: Maximum number of rows
+            after: Cursor returned by get_patterns_page; only older rows are returned
             
-            cursor = await self.connection.execute(query, params)
-            rows = await cursor.fetchall()
+        Returns:
+            List of pattern rows as dicts
+        """
+        try:
+            if not self._is_connected():
+                return []
+                
+            query, params = self._pattern_query(
+                symbol, pattern_type, timeframe, status, start, end, after, limit
+            )
+            return await self._fetch(query, params)
             
-            return [dict(zip([col[0] for col in cursor.description], row)) 
-                   for row in rows]
-                   
         except Exception as e:
             logger.error(f"Failed to get patterns: {str(e)}")
             return []
             
+    async def get_patterns_page(
+        self,
+        limit: int = 100,
+        after: Optional[Cursor] = None,
+        **filters
+    ) -> Tuple[list, Optional[Cursor]]:
+        """
+        Get one page of patterns with keyset pagination
+        
+        Each page seeks past the previous one through the index, so deep
+        pages cost the same as the first.
+        
+        Args:
+            limit: Page size
+            after: Cursor from the previous page, None for the first page
+            **filters: Same filters as get_patterns
+            
+        Returns:
+            (rows, cursor for the next page or None when this was the last page)
+        """
+        rows = await self.get_patterns(limit=limit, after=after, **filters)
+        if len(rows) < limit:
+            return rows, None
+        return rows, (rows[-1]["created_at"], rows[-1]["id"])
+        
+    async def iter_patterns(
+        self,
+        chunk_size: int = 500,
+        **filters
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream matching patterns, newest first, fetching chunk_size rows at a time
+        
+        Only one chunk is held in memory, and no connection or transaction is
+        held open between chunks, so the flush task keeps writing meanwhile.
+        
+        Args:
+            chunk_size: Rows fetched per query
+            **filters: Same filters as get_patterns
+        """
+        if not self._is_connected():
+            return
+            
+        after = None
+        while True:
+            try:
+                query, params = self._pattern_query(after=after, limit=chunk_size, **filters)
+                rows = await self._fetch(query, params)
+            except Exception as e:
+                logger.error(f"Failed to stream patterns: {str(e)}")
+                return
+                
+            for row in rows:
+                yield row
+                
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+            
     async def close(self) -> None:
-        """Close database connection"""
+        """Flush pending writes and close database connection"""
+        if self._flush_task is not None:
+            # Let the loop finish the write it may be in rather than cancel it
+            self._closing = True
+            self._flush_needed.set()
+            await self._flush_task
+            self._flush_task = None
+            
+        await self.flush()
+        
         if self.connection:
             await self.connection.close()
             self.connection = None
-            logger.info("Database connection closed") 
\ No newline at end of file
+            logger.info("Database connection closed")
+            
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Database pool closed") 
\ No newline at end of file
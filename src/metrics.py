@@ -0,0 +1,160 @@
+"""
+Latency and state-size metrics in Prometheus text format
+
+Components record into module-level histograms (`histogram(...)` returns the
+same object for the same name, so modules can declare theirs at import time).
+Gauges are callbacks evaluated on scrape, so state sizes cost nothing between
+scrapes. `MetricsServer` serves everything at /metrics.
+"""
+
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Callable, Union
+from aiohttp import web
+from loguru import logger
+
+# Seconds; spans sub-millisecond detection up to slow alert deliveries
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation"""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+        
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Gauge:
+    """Gauge whose value is read from a callback on every scrape"""
+    
+    def __init__(self, name: str, help_text: str,
+                 fn: Callable[[], Union[float, Dict[Tuple[str, ...], float]]],
+                 labels: Sequence[str] = ()):
+        """
+        Args:
+            fn: Returns the value, or a dict of label values -> value when
+                the gauge has labels
+        """
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labels = tuple(labels)
+        
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.debug(f"Gauge {self.name} failed: {str(e)}")
+            return lines
+            
+        if self.labels:
+            for label_values, v in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+class Registry:
+    """Named metrics rendered together"""
+    
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = Histogram(name, help_text, labels, buckets)
+        return metric
+        
+    def gauge(self, name: str, help_text: str, fn: Callable, labels: Sequence[str] = ()) -> Gauge:
+        """Register (or replace) a callback gauge"""
+        metric = self.metrics[name] = Gauge(name, help_text, fn, labels)
+        return metric
+        
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def histogram(name: str, help_text: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram in the default registry"""
+    return REGISTRY.histogram(name, help_text, labels, buckets)
+
+def gauge(name: str, help_text: str, fn: Callable, labels: Sequence[str] = ()) -> Gauge:
+    """Register a callback gauge in the default registry"""
+    return REGISTRY.gauge(name, help_text, fn, labels)
+
+class MetricsServer:
+    """Serves a registry at /metrics"""
+    
+    def __init__(self, config: Dict[str, Any], registry: Registry = REGISTRY):
+        """
+        Args:
+            config: `metrics` config section with `host` and `port`
+        """
+        self.host = config.get("host", "127.0.0.1")
+        self.port = int(config.get("port", 9108))
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+        
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+        
+    async def start(self) -> None:
+        """Start listening"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics served at http://{self.host}:{self.port}/metrics")
+        
+    async def stop(self) -> None:
+        """Stop listening"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
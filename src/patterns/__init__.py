@@ -4,16 +4,71 @@ Pattern detection and management module
 
 from typing import Dict, Any, List, Optional
 import asyncio
+import time
+import numpy as np
+import pandas as pd
 from loguru import logger
 
+from .detectors import DetectionEngine, to_arrays
+from .thresholds import classify_zones, ALERT_TYPES, STATUS_CODES, FILLED, EXPIRED, EVICTED
+from .store import PatternStore, parse_stamp, format_stamp
+from .smt import SmtScanner
+from .structure import StructureTracker
+from .lifecycle import PatternLifecycle, OLDEST
+from .features import FeatureStore
+from .sessions import SessionCalendar, SessionTracker, session_calendar, DEFAULT_TIMEZONE
+from .. import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    "scanner_pattern_stage_seconds", "Time spent per bar in pattern detection and zone updates", ["stage"]
+)
+
 class PatternManager:
     """Manages pattern detectors and their results"""
     
-    def __init__(self, config: Dict[str, Any]):
-        """Initialize pattern manager with configuration"""
+    def __init__(self, config: Dict[str, Any], performance: Optional[Dict[str, Any]] = None):
+        """
+        Initialize pattern manager with configuration
+        
+        Args:
+            config: `patterns` config section
+            performance: `performance` config section (active set caps)
+        """
         self.config = config
-        self.detectors = {}
-        self.active_patterns = {}
+        self.engine = DetectionEngine(config)
+        self.detectors = {rule.pattern_type: rule for rule, _ in self.engine.rules}
+        
+        # Active patterns, one columnar zone table per (symbol, timeframe)
+        self.store = PatternStore()
+        
+        # Cross-instrument detection, set up for the monitored pairs in start()
+        self.smt = SmtScanner(config.get("smt_divergence") or {})
+        
+        # (symbol, timeframe) -> timestamp (ns) of the last candle already scanned
+        self._last_scanned = {}
+        
+        # (symbol, timeframe) -> swing / market structure state
+        self.structure: Dict[tuple, StructureTracker] = {}
+        
+        # (symbol, timeframe) -> running session, day and week levels
+        sessions = config.get("sessions") or {}
+        timezone = sessions.get("timezone", DEFAULT_TIMEZONE)
+        hours = sessions.get("hours")
+        self.calendar = SessionCalendar(timezone, hours) if hours else session_calendar(timezone)
+        self.sessions: Dict[tuple, SessionTracker] = {}
+        
+        # (symbol, timeframe) -> derived series the detection rules registered
+        self.features: Dict[tuple, FeatureStore] = {}
+        
+        # Expiry and per-instrument caps; retired patterns wait in `retired`
+        # until the caller stores them (see pop_retired)
+        performance = performance or {}
+        cap = performance.get("max_patterns_per_instrument")
+        self.lifecycle = PatternLifecycle(
+            int(cap) if cap else None, performance.get("eviction_policy", OLDEST)
+        )
+        self.retired: List[Dict[str, Any]] = []
+        self._max_age_ns = self._max_ages()
         
     async def start(
         self,
@@ -21,7 +76,19 @@ class PatternManager:
         patterns: Optional[List[str]] = None
     ):
         """Start pattern detection for specified instruments"""
-        logger.info("Pattern manager started")
+        if patterns:
+            self.engine.restrict(patterns)
+            self.detectors = {rule.pattern_type: rule for rule, _ in self.engine.rules}
+        self.detectors.update(dict.fromkeys(self.engine.structure_types, StructureTracker))
+        self._max_age_ns = self._max_ages()
+        
+        smt_wanted = not patterns or {"smt", "smt_divergence"} & {p.lower() for p in patterns}
+        if self.smt.config.get("enabled", True) and smt_wanted:
+            self.smt.configure(instruments)
+            if self.smt:
+                self.detectors["SMT"] = self.smt
+                
+        logger.info(f"Pattern manager started with detectors: {list(self.detectors)}")
         
     async def detect_patterns(
         self,
@@ -29,21 +96,326 @@ class PatternManager:
         symbol: str,
         timeframe: str
     ) -> List:
-        """Run all enabled detectors on new data"""
-        return []
+        """
+        Run all enabled detectors on new data
+        
+        `data` holds timestamp/open/high/low/close arrays (or a DataFrame) for the
+        series. Only candles newer than the last call for the same symbol and
+        timeframe are checked: a backfill is scanned in one vectorized batch,
+        while a single new bar only costs a look at the tail window.
+        
+        Args:
+            data: OHLCV columns, oldest first
+            symbol: Instrument symbol
+            timeframe: Timeframe string
+            
+        Returns:
+            List of newly formed pattern dicts
+        """
+        started = time.perf_counter()
+        arrays = to_arrays(data)
+        ts = arrays["timestamp"]
+        if ts.size == 0:
+            return []
+            
+        key = (symbol, timeframe)
+        start = 0
+        if key in self._last_scanned:
+            start = int(np.searchsorted(ts, self._last_scanned[key], side="right"))
+        self._last_scanned[key] = int(ts[-1])
+        
+        if start >= ts.size:
+            return []
+            
+        features = self._feature_store(key).update(arrays, start)
+        results = self.engine.run(arrays, start, features)
+        if self.engine.structure_types:
+            results.update(self._scan_structure(key, arrays, start))
+        new_patterns = self.engine.to_patterns(results, arrays, symbol, timeframe)
+        for pattern in new_patterns:
+            self._track(pattern)
+        if self.lifecycle.max_per_instrument is not None:
+            # A pattern that lost out to the cap on arrival is not announced
+            new_patterns = [p for p in new_patterns if p["pattern_id"] in self.store]
+            
+        if new_patterns:
+            logger.debug(f"{symbol} {timeframe}: {len(new_patterns)} new patterns")
+        STAGE_SECONDS.observe(time.perf_counter() - started, "detect")
+        return new_patterns
+        
+    def _structure_tracker(self, key: tuple) -> StructureTracker:
+        """The series' structure tracker, created on first use"""
+        tracker = self.structure.get(key)
+        if tracker is None:
+            tracker = self.structure[key] = StructureTracker(
+                self.engine.swing_lookback,
+                order_blocks="OrderBlock" in self.engine.structure_types,
+                min_block_size=self.engine.order_block_min_size,
+            )
+        return tracker
+        
+    def _feature_store(self, key: tuple) -> FeatureStore:
+        """The series' feature store, created on first use"""
+        store = self.features.get(key)
+        if store is None:
+            store = self.features[key] = self.engine.feature_store(self.calendar)
+        return store
+        
+    def update_sessions(self, data: Dict[str, Any], symbol: str, timeframe: str) -> None:
+        """
+        Fold the series' new bars into its session levels
+        
+        Called by the scanner for every bar in this process, also when
+        detection runs in shard workers, so `session_levels` is always
+        current. Bars already folded in are skipped.
+        """
+        arrays = to_arrays(data)
+        ts = arrays["timestamp"]
+        tracker = self._session_tracker((symbol, timeframe))
+        start = 0
+        if tracker.last is not None:
+            start = int(np.searchsorted(ts, tracker.last, side="right"))
+        tracker.update(arrays, start)
+        
+    def _session_tracker(self, key: tuple) -> SessionTracker:
+        """The series' session levels, created on first use"""
+        tracker = self.sessions.get(key)
+        if tracker is None:
+            tracker = self.sessions[key] = SessionTracker(self.calendar)
+        return tracker
+        
+    def session_levels(self, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        """
+        Current session/day/week levels and the prior day's and week's
+        
+        Returns:
+            SessionTracker.levels() of the series, or None before its first bar
+        """
+        tracker = self.sessions.get((symbol, timeframe))
+        return tracker.levels() if tracker is not None else None
+        
+    def _scan_structure(self, key: tuple, arrays: Dict[str, np.ndarray], start: int) -> Dict:
+        """Feed new candles to the series' structure tracker"""
+        tracker = self._structure_tracker(key)
+        return {
+            pattern_type: hits for pattern_type, hits in tracker.scan(arrays, start).items()
+            if pattern_type in self.engine.structure_types
+        }
+        
+    async def detect_smt(
+        self,
+        data: Dict[str, Any],
+        symbol: str,
+        timeframe: str
+    ) -> List:
+        """
+        Feed the newest candle of a series to the SMT pair detectors
+        
+        SMT needs both legs of a pair, so unlike `detect_patterns` it always
+        runs in the main process. A pattern may belong to the other symbol of
+        the pair when this candle completes the joined bar.
+        
+        Returns:
+            List of newly formed SMT pattern dicts
+        """
+        if not self.smt:
+            return []
+            
+        new_patterns = self.smt.add(symbol, timeframe, self._last_bar(data))
+        for pattern in new_patterns:
+            self._track(pattern)
+        return [p for p in new_patterns if p["pattern_id"] in self.store]
         
     async def update_patterns(
         self,
         symbol: str,
-        latest_data: Dict[str, Any]
+        latest_data: Dict[str, Any],
+        timeframe: Optional[str] = None
     ) -> List:
-        """Update status of active patterns"""
-        return []
+        """
+        Update status of active patterns
+        
+        Tests the most recent candle in `latest_data` against the active zones
+        of the symbol (optionally only zones formed on `timeframe`). Each
+        series' price index picks the zones the candle reached, which are
+        classified in one vectorized pass, and pattern dicts are only built
+        for zones whose status changed. Filled zones are dropped
+        from the active set.
+        
+        Args:
+            symbol: Instrument symbol
+            latest_data: OHLCV columns or a single bar's values
+            timeframe: Only check zones from this timeframe
+            
+        Returns:
+            List of event dicts for patterns whose status changed
+        """
+        started = time.perf_counter()
+        ts, high, low, close = self._last_bar(latest_data)
+        stamp = format_stamp(ts)
+        
+        # Zones past their max age retire before this candle can touch them
+        for pattern_id in self.lifecycle.due(ts):
+            self._retire(pattern_id, EXPIRED, ts)
+            
+        if timeframe is not None:
+            tables = [self.store.tables.get((symbol, timeframe))]
+        else:
+            tables = [table for key, table in self.store.tables.items() if key[0] == symbol]
+            
+        events = []
+        for table in tables:
+            if not table:
+                continue
+            # Only the zones the candle reached can change (see store.EdgeIndex)
+            rows = table.touched(high, low)
+            if not rows.size:
+                continue
+            zones = table.rows
+            codes = classify_zones(zones["direction"][rows], zones["near"][rows], zones["mean"][rows],
+                                   zones["far"][rows], high, low, close)
+            mask = (codes >= 0) & (codes != zones["status"][rows])
+            changed = rows[mask]
+            
+            # Ids first: untracking a filled zone moves rows around
+            changed_ids = [table.ids[row] for row in changed.tolist()]
+            for pattern_id, code in zip(changed_ids, codes[mask].tolist()):
+                pattern = self.store.set_status(pattern_id, code, ts)
+                if pattern["status"] == FILLED:
+                    self._untrack(pattern_id)
+                    
+                events.append({
+                    "pattern": pattern,
+                    "alert_type": ALERT_TYPES[pattern["status"]],
+                    "price": close,
+                    "timestamp": stamp,
+                })
+                
+        STAGE_SECONDS.observe(time.perf_counter() - started, "update")
+        return events
+        
+    def _max_ages(self) -> Dict[str, int]:
+        """Pattern type -> max age in ns, from each type's `max_age_hours`"""
+        keys = {rule.pattern_type: rule.config_key for rule, _ in self.engine.rules}
+        keys.update(self.engine.structure_types)
+        keys["SMT"] = "smt_divergence"
+        
+        ages = {}
+        for pattern_type, key in keys.items():
+            hours = (self.config.get(key) or {}).get("max_age_hours")
+            if hours:
+                ages[pattern_type] = int(float(hours) * 3600 * 1_000_000_000)
+        return ages
+        
+    def _track(self, pattern: Dict[str, Any]) -> None:
+        """Add a pattern to the active set"""
+        self._untrack(pattern["pattern_id"])
+        self.store.add(pattern)
+        self._schedule(pattern["pattern_id"], pattern["symbol"], pattern["pattern_type"],
+                       parse_stamp(pattern["created_at"]), pattern["confidence"])
+        
+    def _schedule(self, pattern_id: str, symbol: str, pattern_type: str,
+                  created_ns: int, confidence: float) -> None:
+        """Register a stored pattern for expiry and the instrument cap"""
+        max_age = self._max_age_ns.get(pattern_type)
+        evicted = self.lifecycle.add(
+            pattern_id, symbol, created_ns, confidence,
+            created_ns + max_age if max_age else None
+        )
+        for victim in evicted:
+            self._retire(victim, EVICTED, created_ns)
+            
+    def _untrack(self, pattern_id: str) -> None:
+        """Remove a pattern from the active set"""
+        self.store.remove(pattern_id)
+        self.lifecycle.remove(pattern_id)
+        
+    def _retire(self, pattern_id: str, status: str, ns: int) -> None:
+        """Take a pattern out of the active set and queue it for storage"""
+        self.retired.append(self.store.set_status(pattern_id, STATUS_CODES[status], ns))
+        self._untrack(pattern_id)
+        
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Everything needed to resume detection after a restart
+        
+        Returns:
+            {"series": [...], "smt": [...]}: one series entry per (symbol,
+            timeframe) with the last candle scanned, the structure tracker
+            state, the session level state and the zones (see
+            PatternStore.export_table); then the SMT pair detectors' state
+        """
+        keys = set(self.store.tables) | set(self._last_scanned) | set(self.structure) | set(self.sessions)
+        series = []
+        for key in sorted(keys):
+            tracker = self.structure.get(key)
+            sessions = self.sessions.get(key)
+            series.append({
+                "symbol": key[0],
+                "timeframe": key[1],
+                "last_scanned": self._last_scanned.get(key),
+                "structure": tracker.get_state() if tracker is not None else None,
+                "sessions": sessions.get_state() if sessions is not None else None,
+                "zones": self.store.export_table(*key),
+            })
+        return {"series": series, "smt": self.smt.get_state()}
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """
+        Resume from a `get_state` result
+        
+        Series entries may be partial (e.g. zones only). Restored zones go
+        through the expiry schedule and instrument caps again, so a lowered
+        cap evicts on restore (see pop_retired). Call after start().
+        """
+        for entry in state.get("series", ()):
+            key = (entry["symbol"], entry["timeframe"])
+            if entry.get("last_scanned") is not None:
+                self._last_scanned[key] = int(entry["last_scanned"])
+            if entry.get("structure") is not None and self.engine.structure_types:
+                self._structure_tracker(key).set_state(entry["structure"])
+            if entry.get("sessions") is not None:
+                self._session_tracker(key).set_state(entry["sessions"])
+                
+            zones = entry.get("zones")
+            if not zones:
+                continue
+            self.store.import_table(*key, zones)
+            rows, types = zones["zones"], zones["types"]
+            for pattern_id, code, created, confidence in zip(
+                zones["ids"], rows["type"].tolist(), rows["created"].tolist(), rows["confidence"].tolist()
+            ):
+                self._schedule(pattern_id, key[0], types[code], created, confidence)
+                
+        if state.get("smt"):
+            self.smt.set_state(state["smt"])
+            
+    def pop_retired(self) -> List[Dict[str, Any]]:
+        """Patterns that expired or were evicted since the last call"""
+        retired, self.retired = self.retired, []
+        return retired
+        
+    @staticmethod
+    def _last_bar(data: Dict[str, Any]):
+        """(timestamp_ns, high, low, close) of the newest candle in `data`"""
+        values = []
+        for col in ("high", "low", "close"):
+            value = np.asarray(data[col])
+            values.append(float(value[-1] if value.ndim else value))
+            
+        ts = np.asarray(data["timestamp"])
+        ts = ts[-1] if ts.ndim else ts[()]
+        if not isinstance(ts, (int, np.integer)):
+            ts = pd.Timestamp(ts).as_unit("ns").value
+        return (int(ts), *values)
         
     def get_active_patterns(
         self,
         symbol: Optional[str] = None,
         pattern_type: Optional[str] = None
     ) -> List:
-        """Get active patterns with optional filtering"""
-        return []
+        """Get active patterns with optional filtering (built from the store on each call)"""
+        return [
+            pattern for pattern in self.store.patterns(symbol)
+            if pattern_type is None or pattern["pattern_type"] == pattern_type
+        ]
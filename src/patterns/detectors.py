@@ -0,0 +1,374 @@
+"""
+Vectorized PD array detection rules
+
+Every rule works on whole OHLCV arrays at once and reports the index of the
+candle that completes the pattern. The same rules serve both the batch path
+(backfilling history) and the incremental path (checking only the tail window
+after a new bar closes).
+"""
+
+from typing import Dict, Any, List, Optional, Callable, NamedTuple
+import numpy as np
+import pandas as pd
+
+from .features import FeatureStore
+from .sessions import SessionCalendar
+
+BULLISH = 1
+BEARISH = -1
+
+# Smallest positive gap, so a zero-width "gap" is never reported
+_MIN_GAP = np.finfo(np.float64).tiny
+
+class Detections(NamedTuple):
+    """Hits from a single rule, aligned by position"""
+    index: np.ndarray      # Index of the candle that completes the pattern
+    direction: np.ndarray  # BULLISH / BEARISH
+    lower: np.ndarray
+    upper: np.ndarray
+    mean: np.ndarray
+    confidence: np.ndarray
+
+_EMPTY_F = np.empty(0, dtype=np.float64)
+_EMPTY = Detections(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8),
+                    _EMPTY_F, _EMPTY_F, _EMPTY_F, _EMPTY_F)
+
+def _empty() -> Detections:
+    """Detections with no hits (shared, never mutate)"""
+    return _EMPTY
+
+def _collect(offset: int, bull: np.ndarray, bear: np.ndarray,
+             bull_lower: np.ndarray, bull_upper: np.ndarray,
+             bear_lower: np.ndarray, bear_upper: np.ndarray,
+             strength: np.ndarray) -> Detections:
+    """
+    Merge bullish and bearish masks into a single Detections result
+    
+    Args:
+        offset: Index of the completing candle for mask position 0
+        bull, bear: Boolean masks of equal length
+        bull_lower, bull_upper, bear_lower, bear_upper: Zone bounds per position
+        strength: Raw confidence score per position, clipped to [0, 1]
+    """
+    hits = bull | bear
+    if not hits.any():
+        return _empty()
+    pos = np.flatnonzero(hits)
+        
+    is_bull = bull[pos]
+    lower = np.where(is_bull, bull_lower[pos], bear_lower[pos])
+    upper = np.where(is_bull, bull_upper[pos], bear_upper[pos])
+    confidence = np.clip(np.nan_to_num(strength[pos], nan=1.0, posinf=1.0), 0.0, 1.0)
+    
+    direction = np.where(is_bull, BULLISH, BEARISH).astype(np.int8)
+    return Detections(pos + offset, direction, lower, upper, (lower + upper) / 2.0, confidence)
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise ratio that yields inf where the denominator is zero"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator
+
+def _at_completion(size, offset: int, floor: float = 0.0):
+    """
+    Minimum size for each completing candle
+    
+    `size` is a number or, with a volatility-relative minimum, one value per
+    candle; the completing candles are those from `offset` on.
+    """
+    if np.ndim(size):
+        return np.maximum(size[offset:], floor)
+    return max(size, floor)
+
+def detect_fvg(o, h, l, c, ts, f, min_gap_size=0.0) -> Detections:
+    """
+    Fair Value Gap: 3-candle pattern where the wicks of candles 1 and 3 do not overlap
+    
+    Bullish when the low of candle 3 is above the high of candle 1, bearish when
+    the high of candle 3 is below the low of candle 1.
+    """
+    if len(h) < 3:
+        return _empty()
+        
+    h1, l1 = h[:-2], l[:-2]
+    h3, l3 = h[2:], l[2:]
+    threshold = _at_completion(min_gap_size, 2, _MIN_GAP)
+    bull = (l3 - h1) >= threshold
+    bear = (l1 - h3) >= threshold
+    
+    # Confidence: gap size relative to the displacement candle's range
+    strength = _ratio(np.maximum(l3 - h1, l1 - h3), f["range"][1:-1])
+    return _collect(2, bull, bear, h1, l3, h3, l1, strength)
+
+def detect_ifvg(o, h, l, c, ts, f, min_gap_size=0.0) -> Detections:
+    """
+    Inverse Fair Value Gap: an FVG that the very next candle closes through
+    
+    A bullish FVG closed below its lower bound becomes a bearish iFVG over the
+    same zone, and vice versa. Uses a 4-candle window.
+    """
+    if len(h) < 4:
+        return _empty()
+        
+    h1, l1 = h[:-3], l[:-3]
+    h3, l3 = h[2:-1], l[2:-1]
+    close = c[3:]
+    threshold = _at_completion(min_gap_size, 3, _MIN_GAP)
+    
+    # Closing through a bullish gap flips it bearish and the other way round
+    bear = ((l3 - h1) >= threshold) & (close < h1)
+    bull = ((l1 - h3) >= threshold) & (close > l1)
+    
+    strength = _ratio(np.maximum(l3 - h1, l1 - h3), f["range"][3:])
+    return _collect(3, bull, bear, h3, l1, h1, l3, strength)
+
+def detect_order_block(o, h, l, c, ts, f, min_size=0.0) -> Detections:
+    """
+    Order Block: last opposing candle before a displacement candle closes beyond it
+    
+    The mean threshold is the 50% level of the order block candle.
+    """
+    if len(h) < 2:
+        return _empty()
+        
+    o1, h1, l1, c1 = o[:-1], h[:-1], l[:-1], c[:-1]
+    o2, c2 = o[1:], c[1:]
+    size_ok = f["range"][:-1] >= _at_completion(min_size, 1)
+    
+    bull = size_ok & (c1 < o1) & (c2 > o2) & (c2 > h1)
+    bear = size_ok & (c1 > o1) & (c2 < o2) & (c2 < l1)
+    
+    # Confidence: how much of the displacement candle's range is body
+    strength = _ratio(f["body"][1:], f["range"][1:])
+    return _collect(1, bull, bear, l1, h1, l1, h1, strength)
+
+def detect_volume_imbalance(o, h, l, c, ts, f, min_gap_size=0.0) -> Detections:
+    """
+    Volume Imbalance: two same-direction candles whose bodies do not overlap
+    
+    The wicks still overlap (otherwise it would be a gap). The zone spans the
+    space between the two bodies.
+    """
+    if len(h) < 2:
+        return _empty()
+        
+    o1, h1, l1, c1 = o[:-1], h[:-1], l[:-1], c[:-1]
+    o2, h2, l2, c2 = o[1:], h[1:], l[1:], c[1:]
+    threshold = _at_completion(min_gap_size, 1, _MIN_GAP)
+    
+    bull = (c1 > o1) & (c2 > o2) & ((o2 - c1) >= threshold) & (l2 <= h1)
+    bear = (c1 < o1) & (c2 < o2) & ((c1 - o2) >= threshold) & (h2 >= l1)
+    
+    strength = _ratio(np.abs(o2 - c1), f["range"][1:])
+    return _collect(1, bull, bear, c1, o2, o2, c1, strength)
+
+def _opening_gap(o, h, l, c, day_ids, min_gap_size) -> Detections:
+    """Gap between the previous close and the first open of a new period"""
+    if len(o) < 2:
+        return _empty()
+        
+    prev_close, open_ = c[:-1], o[1:]
+    new_period = day_ids[1:] != day_ids[:-1]
+    gap = open_ - prev_close
+    threshold = _at_completion(min_gap_size, 1, _MIN_GAP)
+    
+    bull = new_period & (gap >= threshold)
+    bear = new_period & (-gap >= threshold)
+    
+    return _collect(1, bull, bear, prev_close, open_, open_, prev_close, np.ones(len(gap)))
+
+def detect_ndog(o, h, l, c, ts, f, min_gap_size=0.0) -> Detections:
+    """New Day Opening Gap between the prior trading day's close and the new open"""
+    return _opening_gap(o, h, l, c, f["day"], min_gap_size)
+
+def detect_nwog(o, h, l, c, ts, f, min_gap_size=0.0) -> Detections:
+    """New Week Opening Gap between Friday's close and Sunday evening's open"""
+    return _opening_gap(o, h, l, c, f["week"], min_gap_size)
+
+class Rule(NamedTuple):
+    """A detection rule and how it is configured"""
+    pattern_type: str
+    config_key: str
+    func: Callable[..., Detections]
+    window: int            # Number of candles the rule looks at
+    size_param: str        # Config key for the minimum size
+    default_enabled: bool
+    features: tuple        # Shared features the rule reads (see features.py)
+
+RULES: List[Rule] = [
+    Rule("FVG", "fvg", detect_fvg, 3, "min_gap_size", True, ("range",)),
+    Rule("iFVG", "ifvg", detect_ifvg, 4, "min_gap_size", True, ("range",)),
+    Rule("OrderBlock", "order_block", detect_order_block, 2, "min_size", True, ("range", "body")),
+    Rule("VolumeImbalance", "volume_imbalance", detect_volume_imbalance, 2, "min_gap_size", True, ("range",)),
+    Rule("NDOG", "opening_gaps", detect_ndog, 2, "min_gap_size", True, ("day",)),
+    Rule("NWOG", "opening_gaps", detect_nwog, 2, "min_gap_size", True, ("week",)),
+]
+
+def to_arrays(data: Any) -> Dict[str, np.ndarray]:
+    """
+    Normalize OHLCV input to contiguous numpy arrays
+    
+    Accepts a DataFrame or any mapping with timestamp/open/high/low/close
+    (and optionally volume) columns.
+    Timestamps come back as int64 nanoseconds since the epoch (UTC); naive
+    timestamps are assumed to already be UTC.
+    
+    Args:
+        data: OHLCV columns
+        
+    Returns:
+        Dict of numpy arrays keyed by column name
+    """
+    ts = data["timestamp"]
+    if isinstance(ts, np.ndarray) and ts.dtype == np.int64:
+        ts_ns = ts
+    else:
+        index = pd.DatetimeIndex(ts)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        ts_ns = index.as_unit("ns").asi8
+        
+    arrays = {"timestamp": np.ascontiguousarray(ts_ns, dtype=np.int64)}
+    for col in ("open", "high", "low", "close"):
+        arrays[col] = np.ascontiguousarray(data[col], dtype=np.float64)
+    if "volume" in data:
+        arrays["volume"] = np.ascontiguousarray(data["volume"], dtype=np.float64)
+    return arrays
+
+class DetectionEngine:
+    """Runs the enabled detection rules over OHLCV arrays"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the engine from the `patterns` config section"""
+        self.config = config
+        self.rules = []
+        # Pattern type -> minimum size in ATRs (`<size_param>_atr`), where set
+        self.atr_multiples: Dict[str, float] = {}
+        for rule in RULES:
+            rule_config = config.get(rule.config_key) or {}
+            if rule_config.get("enabled", rule.default_enabled):
+                self.rules.append((rule, float(rule_config.get(rule.size_param, 0.0))))
+                multiple = float(rule_config.get(f"{rule.size_param}_atr", 0.0))
+                if multiple > 0:
+                    self.atr_multiples[rule.pattern_type] = multiple
+        self.feature_config = config.get("features") or {}
+                
+        # Stateful rules run by a per-series StructureTracker (see structure.py).
+        # With `order_block.source: structure` order blocks come from there too.
+        structure = config.get("market_structure") or {}
+        order_block = config.get("order_block") or {}
+        self.swing_lookback = int(structure.get("swing_lookback", 5))
+        self.order_block_min_size = float(order_block.get("min_size", 0.0))
+        self.structure_types = {}   # pattern type -> config key
+        if structure.get("enabled", True):
+            self.structure_types.update({"MSS": "market_structure", "BOS": "market_structure"})
+        if order_block.get("enabled", True) and order_block.get("source", "candle") == "structure":
+            self.structure_types["OrderBlock"] = "order_block"
+            self.rules = [(rule, size) for rule, size in self.rules if rule.pattern_type != "OrderBlock"]
+        self._update_needs()
+        
+    def _update_needs(self) -> None:
+        """Lookback and registered features of the enabled rules"""
+        # Bars a rule needs before the first candle it can report
+        self.lookback = max((rule.window for rule, _ in self.rules), default=1) - 1
+        
+        features = [name for rule, _ in self.rules for name in rule.features]
+        if any(rule.pattern_type in self.atr_multiples for rule, _ in self.rules):
+            features.append("atr")
+        self.features = list(dict.fromkeys(features))
+        
+    def feature_store(self, calendar: Optional[SessionCalendar] = None) -> FeatureStore:
+        """A store for one series' features, as the enabled rules need them"""
+        return FeatureStore(self.features, self.lookback, self.feature_config, calendar)
+        
+    def restrict(self, pattern_types: List[str]) -> None:
+        """Keep only the rules for the given pattern types (case-insensitive)"""
+        wanted = {p.lower() for p in pattern_types}
+        self.rules = [(rule, size) for rule, size in self.rules
+                      if rule.pattern_type.lower() in wanted or rule.config_key in wanted]
+        self.structure_types = {
+            pattern_type: key for pattern_type, key in self.structure_types.items()
+            if pattern_type.lower() in wanted or key in wanted
+        }
+        self._update_needs()
+        
+    def run(
+        self,
+        arrays: Dict[str, np.ndarray],
+        start: int = 0,
+        features: Optional[Dict[str, np.ndarray]] = None
+    ) -> Dict[str, Detections]:
+        """
+        Run all rules and return hits completed at or after `start`
+        
+        Only the slice beginning `lookback` bars before `start` is examined, so
+        passing `start=len(bars) - 1` checks just the tail window of a new bar.
+        
+        Args:
+            arrays: Output of `to_arrays`
+            start: First candle index that may complete a pattern
+            features: The series' `FeatureStore.update(arrays, start)` result;
+                computed here without one (batch use)
+            
+        Returns:
+            Dict of pattern type -> Detections with absolute candle indices
+        """
+        begin = max(0, start - self.lookback)
+        o = arrays["open"][begin:]
+        h = arrays["high"][begin:]
+        l = arrays["low"][begin:]
+        c = arrays["close"][begin:]
+        ts = arrays["timestamp"][begin:]
+        if features is None:
+            features = self.feature_store().update(arrays, start)
+            
+        results = {}
+        for rule, min_size in self.rules:
+            multiple = self.atr_multiples.get(rule.pattern_type)
+            if multiple:
+                # ATR is NaN until its window fills; fmax then keeps the fixed minimum
+                min_size = np.fmax(min_size, multiple * features["atr"])
+            hits = rule.func(o, h, l, c, ts, features, min_size)
+            if hits.index.size:
+                keep = hits.index + begin >= start
+                results[rule.pattern_type] = Detections(
+                    hits.index[keep] + begin, *(field[keep] for field in hits[1:])
+                )
+        return results
+        
+    def to_patterns(
+        self,
+        results: Dict[str, Detections],
+        arrays: Dict[str, np.ndarray],
+        symbol: str,
+        timeframe: str
+    ) -> List[Dict[str, Any]]:
+        """Convert rule hits to pattern state dicts"""
+        patterns = []
+        ts = arrays["timestamp"]
+        for pattern_type, hits in results.items():
+            # An outside bar can break structure both ways: one event per direction
+            directional = pattern_type in self.structure_types
+            # Format all timestamps in one call instead of one Timestamp per hit
+            stamps = np.datetime_as_string(ts[hits.index].view("datetime64[ns]").astype("datetime64[s]")).tolist()
+            rows = zip(stamps, hits.direction.tolist(), hits.lower.tolist(),
+                       hits.upper.tolist(), hits.mean.tolist(), hits.confidence.tolist())
+            for stamp, direction, lower, upper, mean, confidence in rows:
+                suffix = stamp.replace("-", "").replace(":", "").replace("T", "_")
+                direction = "bullish" if direction == BULLISH else "bearish"
+                name = f"{pattern_type}_{direction}" if directional else pattern_type
+                patterns.append({
+                    "pattern_id": f"{symbol}_{timeframe}_{name}_{suffix}",
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "pattern_type": pattern_type,
+                    "direction": direction,
+                    "mean_threshold": mean,
+                    "upper_bound": upper,
+                    "lower_bound": lower,
+                    "status": "active",
+                    "confidence": confidence,
+                    "metadata": {},
+                    "created_at": f"{stamp}Z",
+                    "last_updated": f"{stamp}Z",
+                })
+        return patterns
@@ -0,0 +1,166 @@
+"""
+Shared per-bar features of a series
+
+Detectors keep needing the same derived series: candle ranges and bodies for
+size filters and confidence scores, ATR-style volatility for relative
+thresholds, rolling volume statistics, trading day and week numbers for the
+opening gaps. Each detection rule declares the features it reads
+(`Rule.features`); the engine asks a `FeatureStore` for the union, so a
+feature is computed once per bar however many rules use it, and every rule
+sees the same definition.
+
+Every feature of a bar depends only on that bar and a fixed window of bars
+before it (`warmup`), so the store computes just the bars that are new since
+its last call (plus that window as context, taken from the bar arrays) and
+reuses the values it already has for the lookback bars. Results are the same
+whether a series is scanned in one batch or bar by bar, and a store needs no
+state of its own in snapshots: a fresh one rebuilds from the bar buffer.
+"""
+
+from typing import Dict, Any, List, Iterable, Optional, Callable, NamedTuple
+import numpy as np
+
+from .sessions import SessionCalendar, session_calendar
+
+class Feature(NamedTuple):
+    """How a feature is computed"""
+    requires: tuple           # Features it is computed from
+    compute: Callable         # (bars, features, store) -> values for every bar
+    window: Callable          # store -> bars of history a value depends on
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum of each value and the `window - 1` before it (NaN until the window is full)
+    
+    Added up shift by shift, so every sum is formed in the same order however
+    long the array is: incremental and batch results match exactly.
+    """
+    n = len(values)
+    sums = np.full(n, np.nan)
+    if n >= window:
+        total = values[:n - window + 1].copy()
+        for shift in range(1, window):
+            total += values[shift:n - window + 1 + shift]
+        sums[window - 1:] = total
+    return sums
+
+def _true_range(bars, features, store) -> np.ndarray:
+    high, low, close = bars["high"], bars["low"], bars["close"]
+    previous = np.r_[np.nan, close[:-1]]
+    # The first bar has no previous close: its range
+    return np.fmax(high, previous) - np.fmin(low, previous)
+
+def _volume_std(bars, features, store) -> np.ndarray:
+    volume, mean = bars["volume"], features["volume_mean"]
+    window = store.volume_window
+    squares = np.full(len(volume), np.nan)
+    if len(volume) >= window:
+        deviations = np.zeros(len(volume) - window + 1)
+        for shift in range(window):
+            deviation = volume[shift:len(volume) - window + 1 + shift] - mean[window - 1:]
+            deviations += deviation * deviation
+        squares[window - 1:] = deviations / window
+    return np.sqrt(squares)
+
+FEATURES: Dict[str, Feature] = {
+    "range": Feature((), lambda bars, f, s: bars["high"] - bars["low"], lambda s: 0),
+    "body": Feature((), lambda bars, f, s: np.abs(bars["close"] - bars["open"]), lambda s: 0),
+    "true_range": Feature((), _true_range, lambda s: 1),
+    # Mean true range over `atr_period` bars
+    "atr": Feature(("true_range",), lambda bars, f, s: _rolling_sum(f["true_range"], s.atr_period) / s.atr_period,
+                   lambda s: s.atr_period),
+    "volume_mean": Feature((), lambda bars, f, s: _rolling_sum(bars["volume"], s.volume_window) / s.volume_window,
+                           lambda s: s.volume_window - 1),
+    "volume_std": Feature(("volume_mean",), _volume_std, lambda s: s.volume_window - 1),
+    # Trading day and week numbers (see sessions.SessionCalendar)
+    "day": Feature((), lambda bars, f, s: s.calendar.day_ids(bars["timestamp"]), lambda s: 0),
+    "week": Feature(("day",), lambda bars, f, s: (f["day"] + 3) // 7, lambda s: 0),
+}
+
+def resolve(names: Iterable[str]) -> List[str]:
+    """Features in computation order, dependencies first"""
+    ordered: List[str] = []
+    
+    def visit(name: str) -> None:
+        if name not in FEATURES:
+            raise ValueError(f"Unknown feature: {name}")
+        if name in ordered:
+            return
+        for dependency in FEATURES[name].requires:
+            visit(dependency)
+        ordered.append(name)
+        
+    for name in names:
+        visit(name)
+    return ordered
+
+class FeatureStore:
+    """Registered features of one (symbol, timeframe), computed once per new bar"""
+    
+    def __init__(self, names: Iterable[str], keep: int = 0, config: Optional[Dict[str, Any]] = None,
+                 calendar: Optional[SessionCalendar] = None):
+        """
+        Args:
+            names: Features the detectors registered (dependencies are added)
+            keep: Bars before the first new bar every update returns (the
+                detectors' lookback)
+            config: Optional `features` settings: atr_period, volume_window
+            calendar: Session calendar for the day and week numbers
+        """
+        config = config or {}
+        self.atr_period = int(config.get("atr_period", 14))
+        self.volume_window = int(config.get("volume_window", 20))
+        self.calendar = calendar or session_calendar()
+        self.names = resolve(names)
+        self.keep = keep
+        
+        # History a value of the newest bar depends on, through its dependencies
+        depth: Dict[str, int] = {}
+        for name in self.names:
+            feature = FEATURES[name]
+            depth[name] = feature.window(self) + max((depth[dep] for dep in feature.requires), default=0)
+        self.warmup = max(depth.values(), default=0)
+        
+        self._last: Optional[int] = None           # Timestamp of the newest bar computed
+        self._tail: Dict[str, np.ndarray] = {}     # Values of the last `keep` bars up to it
+        
+    def update(self, arrays: Dict[str, np.ndarray], start: int = 0) -> Dict[str, np.ndarray]:
+        """
+        Compute the features of bars[start:]
+        
+        Args:
+            arrays: Bar columns of the series, oldest first
+            start: First bar not seen by earlier calls (0 for a batch)
+            
+        Returns:
+            Feature name -> values of bars[max(0, start - keep):]
+        """
+        if not self.names:
+            return {}
+        ts = arrays["timestamp"]
+        begin = max(0, start - self.keep)
+        
+        # New bars are computed; lookback values come from the previous call
+        # when it ended right before them
+        lookback = start - begin
+        if start > 0 and self._last == int(ts[start - 1]) and lookback <= len(self._tail[self.names[0]]):
+            fresh = self._compute(arrays, start)
+            values = {
+                name: np.concatenate((self._tail[name][len(self._tail[name]) - lookback:], fresh[name]))
+                for name in self.names
+            }
+        else:
+            values = self._compute(arrays, begin)
+            
+        self._last = int(ts[-1])
+        self._tail = {name: column[max(0, len(column) - self.keep):] for name, column in values.items()}
+        return values
+        
+    def _compute(self, arrays: Dict[str, np.ndarray], first: int) -> Dict[str, np.ndarray]:
+        """Values of bars[first:], computed with `warmup` bars of context before them"""
+        context = max(0, first - self.warmup)
+        bars = {name: column[context:] for name, column in arrays.items()}
+        features: Dict[str, np.ndarray] = {}
+        for name in self.names:
+            features[name] = FEATURES[name].compute(bars, features, self)
+        return {name: column[first - context:] for name, column in features.items()}
@@ -0,0 +1,121 @@
+"""
+Bounded lifetime of active patterns
+
+Patterns leave the active set when they fill, when they reach their
+pattern type's `max_age_hours`, or when their instrument holds more than
+`max_patterns_per_instrument` and the eviction policy picks them. Expiry is a
+min-heap keyed on expiry time and each instrument has a heap ordered by the
+eviction policy, so retiring a pattern costs O(log n) when it happens and
+nothing is swept periodically. Removals are lazy: a heap entry is skipped
+when it no longer matches the live entry of its pattern, and a heap is
+rebuilt once most of it is stale, so memory follows the active set.
+"""
+
+import heapq
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+# Eviction policies: which pattern of a full instrument goes first
+OLDEST = "oldest"
+LOWEST_CONFIDENCE = "lowest_confidence"
+EVICTION_POLICIES = (OLDEST, LOWEST_CONFIDENCE)
+
+class _LazyHeap:
+    """Min-heap of (key, token, pattern_id) whose entries may go stale"""
+    
+    def __init__(self):
+        self.entries: List[Tuple] = []
+        
+    def push(self, key, token: int, pattern_id: str) -> None:
+        heapq.heappush(self.entries, (key, token, pattern_id))
+        
+    def compact(self, live: Dict[str, int], size: int) -> None:
+        """Drop stale entries once they outnumber the live ones"""
+        if len(self.entries) > 2 * size + 64:
+            self.entries = [entry for entry in self.entries if live.get(entry[2]) == entry[1]]
+            heapq.heapify(self.entries)
+
+class PatternLifecycle:
+    """Expiry schedule and per-instrument caps for the active pattern set"""
+    
+    def __init__(self, max_per_instrument: Optional[int] = None, policy: str = OLDEST):
+        """
+        Args:
+            max_per_instrument: Active patterns kept per symbol (None = unbounded)
+            policy: OLDEST or LOWEST_CONFIDENCE
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_per_instrument = max_per_instrument
+        self.policy = policy
+        
+        self._tokens = count()
+        self._live: Dict[str, int] = {}          # pattern_id -> token of its current entries
+        self._symbols: Dict[str, str] = {}       # pattern_id -> symbol
+        self._counts: Dict[str, int] = {}        # symbol -> live patterns
+        self._expiry = _LazyHeap()               # (expires_at_ns, token, pattern_id)
+        self._ranking: Dict[str, _LazyHeap] = {} # symbol -> eviction order
+        
+    def __len__(self) -> int:
+        return len(self._live)
+        
+    def add(self, pattern_id: str, symbol: str, created_ns: int, confidence: float,
+            expires_ns: Optional[int] = None) -> List[str]:
+        """
+        Start tracking a pattern
+        
+        Returns:
+            Patterns of the same symbol to evict to stay within the cap
+            (they are already forgotten here)
+        """
+        self.remove(pattern_id)
+        token = next(self._tokens)
+        self._live[pattern_id] = token
+        self._symbols[pattern_id] = symbol
+        self._counts[symbol] = self._counts.get(symbol, 0) + 1
+        
+        if expires_ns is not None:
+            self._expiry.push(expires_ns, token, pattern_id)
+            
+        ranking = self._ranking.get(symbol)
+        if ranking is None:
+            ranking = self._ranking[symbol] = _LazyHeap()
+        key = created_ns if self.policy == OLDEST else (confidence, created_ns)
+        ranking.push(key, token, pattern_id)
+        
+        evicted = []
+        if self.max_per_instrument is not None:
+            while self._counts[symbol] > self.max_per_instrument:
+                victim = self._pop_valid(ranking)
+                if victim is None:
+                    break
+                self.remove(victim)
+                evicted.append(victim)
+        ranking.compact(self._live, self._counts[symbol])
+        return evicted
+        
+    def remove(self, pattern_id: str) -> None:
+        """Forget a pattern (its heap entries go stale)"""
+        if self._live.pop(pattern_id, None) is None:
+            return
+        symbol = self._symbols.pop(pattern_id)
+        self._counts[symbol] -= 1
+        
+    def due(self, now_ns: int) -> List[str]:
+        """Pop the patterns whose expiry time is at or before `now_ns`"""
+        heap = self._expiry.entries
+        expired = []
+        while heap and heap[0][0] <= now_ns:
+            _, token, pattern_id = heapq.heappop(heap)
+            if self._live.get(pattern_id) == token:
+                self.remove(pattern_id)
+                expired.append(pattern_id)
+        self._expiry.compact(self._live, len(self._live))
+        return expired
+        
+    def _pop_valid(self, ranking: _LazyHeap) -> Optional[str]:
+        while ranking.entries:
+            _, token, pattern_id = heapq.heappop(ranking.entries)
+            if self._live.get(pattern_id) == token:
+                return pattern_id
+        return None
@@ -0,0 +1,147 @@
+"""
+Constant-time rolling window statistics
+
+Streaming detectors update these once per bar instead of recomputing over
+the window, so their per-bar cost does not grow with the window length.
+"""
+
+from collections import deque
+from typing import Dict, Any, Optional
+import math
+
+class RollingExtreme:
+    """Rolling maximum (or minimum) over the last `window` values"""
+    
+    def __init__(self, window: int, maximum: bool = True):
+        """
+        Args:
+            window: Number of most recent values covered
+            maximum: Track the maximum if True, else the minimum
+        """
+        if window < 1:
+            raise ValueError(f"Invalid window: {window}")
+        self.window = window
+        self.maximum = maximum
+        
+        # Monotonic deque of (sequence number, value): values strictly
+        # decreasing for a maximum, so the front is always the extreme
+        self._items: deque = deque()
+        self._seq = 0
+        
+    def __len__(self) -> int:
+        return min(self._seq, self.window)
+        
+    @property
+    def full(self) -> bool:
+        return self._seq >= self.window
+        
+    def push(self, value: float) -> None:
+        """Add the newest value (amortized O(1))"""
+        items = self._items
+        if self.maximum:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((self._seq, value))
+        self._seq += 1
+        
+        if items[0][0] <= self._seq - 1 - self.window:
+            items.popleft()
+            
+    @property
+    def value(self) -> Optional[float]:
+        """Current extreme, or None before the first value"""
+        return self._items[0][1] if self._items else None
+        
+    @property
+    def age(self) -> Optional[int]:
+        """How many values ago the extreme was pushed (0 = the newest)"""
+        return self._seq - 1 - self._items[0][0] if self._items else None
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain-value state for snapshots"""
+        return {"seq": self._seq, "items": [list(item) for item in self._items]}
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a `get_state` result"""
+        self._seq = state["seq"]
+        self._items = deque((seq, value) for seq, value in state["items"])
+
+class RollingCorrelation:
+    """Pearson correlation of two series over the last `window` pairs"""
+    
+    # Running sums drift in floating point; rebuild them from the window this often
+    RESYNC_EVERY = 4096
+    
+    def __init__(self, window: int):
+        if window < 2:
+            raise ValueError(f"Invalid correlation window: {window}")
+        self.window = window
+        self._pairs: deque = deque(maxlen=window)
+        self._sx = self._sy = self._sxx = self._syy = self._sxy = 0.0
+        self._updates = 0
+        
+    def __len__(self) -> int:
+        return len(self._pairs)
+        
+    @property
+    def full(self) -> bool:
+        return len(self._pairs) == self.window
+        
+    def push(self, x: float, y: float) -> None:
+        """Add the newest pair, dropping the oldest once the window is full"""
+        if len(self._pairs) == self.window:
+            ox, oy = self._pairs[0]
+            self._sx -= ox
+            self._sy -= oy
+            self._sxx -= ox * ox
+            self._syy -= oy * oy
+            self._sxy -= ox * oy
+            
+        self._pairs.append((x, y))
+        self._sx += x
+        self._sy += y
+        self._sxx += x * x
+        self._syy += y * y
+        self._sxy += x * y
+        
+        self._updates += 1
+        if self._updates % max(self.RESYNC_EVERY, self.window) == 0:
+            self._resync()
+            
+    def _resync(self) -> None:
+        xs, ys = zip(*self._pairs)
+        self._sx, self._sy = math.fsum(xs), math.fsum(ys)
+        self._sxx = math.fsum(x * x for x in xs)
+        self._syy = math.fsum(y * y for y in ys)
+        self._sxy = math.fsum(x * y for x, y in self._pairs)
+        
+    @property
+    def value(self) -> Optional[float]:
+        """Correlation over the window, or None if undefined (too few pairs, flat series)"""
+        n = len(self._pairs)
+        if n < 2:
+            return None
+        cov = n * self._sxy - self._sx * self._sy
+        var_x = n * self._sxx - self._sx * self._sx
+        var_y = n * self._syy - self._sy * self._sy
+        # Relative cutoff: cancellation leaves tiny positive variances for flat series
+        if var_x <= 1e-12 * n * self._sxx or var_y <= 1e-12 * n * self._syy:
+            return None
+        return max(-1.0, min(1.0, cov / math.sqrt(var_x * var_y)))
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain-value state for snapshots (running sums included, so values match exactly)"""
+        return {
+            "pairs": [list(pair) for pair in self._pairs],
+            "sums": [self._sx, self._sy, self._sxx, self._syy, self._sxy],
+            "updates": self._updates,
+        }
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a `get_state` result"""
+        self._pairs = deque((tuple(pair) for pair in state["pairs"]), maxlen=self.window)
+        self._sx, self._sy, self._sxx, self._syy, self._sxy = state["sums"]
+        self._updates = state["updates"]
@@ -0,0 +1,354 @@
+"""
+Vectorized trading session calendar
+
+CME Globex trading days run from 18:00 to 17:00 New York time, so Sunday
+evening belongs to Monday. `SessionCalendar` labels whole timestamp arrays
+with trading day, week and session numbers in one pass: the timezone's UTC
+offset comes from a table of DST transitions (one binary search per
+timestamp, no datetime objects), and the session of a bar is a lookup in a
+minute-of-day table compiled once from the session hours.
+
+`SessionTracker` keeps the running open/high/low/close of the current
+session, day and week of one series, updated incrementally from new bars,
+and the completed ones before them, so prior day, prior week and last
+session levels are attribute lookups.
+"""
+
+import bisect
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+from zoneinfo import ZoneInfo
+import numpy as np
+
+NS_PER_MINUTE = 60_000_000_000
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
+MINUTES_PER_DAY = 1440
+
+DEFAULT_TIMEZONE = "America/New_York"
+
+# Trading days roll over at 18:00 local time
+SESSION_ROLL_NS = 6 * NS_PER_HOUR
+
+# Session hours in local time, in trading day order; a minute belongs to the
+# first session covering it and minutes outside every session to none
+DEFAULT_SESSIONS = {
+    "asia": ("18:00", "02:00"),
+    "london": ("02:00", "07:00"),
+    "ny_am": ("07:00", "12:00"),
+    "ny_lunch": ("12:00", "13:30"),
+    "ny_pm": ("13:30", "17:00"),
+}
+
+NO_SESSION = -1
+
+def _minutes(value: str) -> int:
+    """'HH:MM' -> minutes after midnight"""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def _utc_offset(zone: ZoneInfo, minute: int) -> int:
+    """UTC offset in minutes at a UTC minute number"""
+    moment = datetime.fromtimestamp(minute * 60, tz=dt_timezone.utc).astimezone(zone)
+    return int(moment.utcoffset().total_seconds()) // 60
+
+def _transitions(zone: ZoneInfo, first_year: int, last_year: int) -> Tuple[List[int], List[int]]:
+    """
+    UTC offset changes of a timezone over whole years
+    
+    Returns:
+        (instants, offsets): offsets[i] applies from instants[i] (ns) on
+    """
+    start = int(datetime(first_year, 1, 1, tzinfo=dt_timezone.utc).timestamp()) // 60
+    end = int(datetime(last_year + 1, 1, 1, tzinfo=dt_timezone.utc).timestamp()) // 60
+    previous = _utc_offset(zone, start)
+    instants, offsets = [start * NS_PER_MINUTE], [previous * NS_PER_MINUTE]
+    
+    # Daily samples find the days with a change, a binary search the minute
+    for day in range(start + MINUTES_PER_DAY, end + MINUTES_PER_DAY, MINUTES_PER_DAY):
+        offset = _utc_offset(zone, day)
+        if offset == previous:
+            continue
+        lo, hi = day - MINUTES_PER_DAY, day
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if _utc_offset(zone, mid) == previous:
+                lo = mid
+            else:
+                hi = mid
+        instants.append(hi * NS_PER_MINUTE)
+        offsets.append(offset * NS_PER_MINUTE)
+        previous = offset
+    return instants, offsets
+
+def _year(ns: int) -> int:
+    return datetime.fromtimestamp(ns // 1_000_000_000, tz=dt_timezone.utc).year
+
+class SessionLabels(NamedTuple):
+    """Calendar labels of a timestamp array, aligned by position"""
+    day: np.ndarray       # Trading day number (days since the epoch of the day's 17:00 close)
+    week: np.ndarray      # Trading week number, weeks start with Monday's trading day
+    session: np.ndarray   # Session instance number (day * sessions + code), NO_SESSION outside
+
+class SessionCalendar:
+    """Trading day, week and session labels in one timezone"""
+    
+    def __init__(self, timezone: str = DEFAULT_TIMEZONE,
+                 sessions: Optional[Dict[str, Tuple[str, str]]] = None):
+        """
+        Args:
+            timezone: IANA timezone the session hours are in
+            sessions: Session name -> (start, end) as "HH:MM", in trading day
+                order; defaults to DEFAULT_SESSIONS
+        """
+        self.timezone = timezone
+        self.zone = ZoneInfo(timezone)
+        sessions = sessions or DEFAULT_SESSIONS
+        self.names = list(sessions)
+        
+        # Minute of the local day -> session code
+        table = np.full(MINUTES_PER_DAY, NO_SESSION, dtype=np.int16)
+        for code in reversed(range(len(self.names))):
+            start, end = (_minutes(value) for value in sessions[self.names[code]])
+            if start <= end:
+                table[start:end] = code
+            else:
+                table[start:] = code
+                table[:end] = code
+        self.minute_sessions = table
+        self._minute_codes = table.tolist()
+        
+        # DST transition table, extended to whatever years get labeled
+        self._first_year = self._last_year = None
+        self._start_ns = self._end_ns = 0
+        self._instants: List[int] = []
+        self._offsets: List[int] = []
+        self._instant_array = np.empty(0, dtype=np.int64)
+        self._offset_array = np.empty(0, dtype=np.int64)
+        
+    def _cover(self, lo_ns: int, hi_ns: int) -> None:
+        """Make sure the transition table spans [lo_ns, hi_ns]"""
+        if self._start_ns <= lo_ns and hi_ns < self._end_ns:
+            return
+        first, last = _year(lo_ns) - 1, _year(hi_ns) + 1
+        if self._first_year is not None:
+            first, last = min(first, self._first_year), max(last, self._last_year)
+        self._instants, self._offsets = _transitions(self.zone, first, last)
+        self._first_year, self._last_year = first, last
+        self._start_ns = self._instants[0]
+        self._end_ns = int(datetime(last + 1, 1, 1, tzinfo=dt_timezone.utc).timestamp()) * 1_000_000_000
+        self._instant_array = np.array(self._instants, dtype=np.int64)
+        self._offset_array = np.array(self._offsets, dtype=np.int64)
+        
+    def utc_offsets(self, ts: np.ndarray) -> np.ndarray:
+        """UTC offsets in ns of sorted UTC nanosecond timestamps"""
+        if len(ts) == 0:
+            return np.empty(0, dtype=np.int64)
+        self._cover(int(ts[0]), int(ts[-1]))
+        return self._offset_array[np.searchsorted(self._instant_array, ts, side="right") - 1]
+        
+    def utc_offset(self, ts_ns: int) -> int:
+        """UTC offset in ns of one UTC nanosecond timestamp"""
+        self._cover(ts_ns, ts_ns)
+        return self._offsets[bisect.bisect_right(self._instants, ts_ns) - 1]
+        
+    def day_ids(self, ts: np.ndarray) -> np.ndarray:
+        """Trading day number of every timestamp"""
+        return (ts + self.utc_offsets(ts) + SESSION_ROLL_NS) // NS_PER_DAY
+        
+    def week_ids(self, ts: np.ndarray) -> np.ndarray:
+        """Trading week number of every timestamp"""
+        # Epoch day 0 is a Thursday, shift so weeks start on Monday's trading day
+        return (self.day_ids(ts) + 3) // 7
+        
+    def label(self, ts: np.ndarray) -> SessionLabels:
+        """Day, week and session labels of every timestamp in one pass"""
+        local = ts + self.utc_offsets(ts)
+        day = (local + SESSION_ROLL_NS) // NS_PER_DAY
+        codes = self.minute_sessions[(local // NS_PER_MINUTE) % MINUTES_PER_DAY]
+        session = np.where(codes >= 0, day * len(self.names) + codes, NO_SESSION)
+        return SessionLabels(day, (day + 3) // 7, session)
+        
+    def label_one(self, ts_ns: int) -> Tuple[int, int, int]:
+        """(day, week, session) of one timestamp, without building arrays"""
+        local = ts_ns + self.utc_offset(ts_ns)
+        day = (local + SESSION_ROLL_NS) // NS_PER_DAY
+        code = self._minute_codes[local // NS_PER_MINUTE % MINUTES_PER_DAY]
+        return day, (day + 3) // 7, day * len(self.names) + code if code >= 0 else NO_SESSION
+        
+    def session_name(self, session_id: int) -> Optional[str]:
+        """Name of a session instance number"""
+        return self.names[session_id % len(self.names)] if session_id >= 0 else None
+        
+    def minute_of_week(self, ts_ns: int) -> int:
+        """Local minute of the week (Monday 00:00 = 0) of a UTC nanosecond timestamp"""
+        # The epoch (1970-01-01) was a Thursday, three days after a Monday
+        minutes = (ts_ns + self.utc_offset(ts_ns)) // NS_PER_MINUTE + 3 * MINUTES_PER_DAY
+        return int(minutes % (7 * MINUTES_PER_DAY))
+
+@lru_cache(maxsize=16)
+def session_calendar(timezone: str = DEFAULT_TIMEZONE) -> SessionCalendar:
+    """Shared calendar with the default sessions of a timezone"""
+    return SessionCalendar(timezone)
+
+class Levels(NamedTuple):
+    """Open, high, low and close of a completed or running period"""
+    open: float
+    high: float
+    low: float
+    close: float
+
+class _Period:
+    """Running OHLC of the current period of one kind, and the period before it"""
+    
+    __slots__ = ("id", "ohlc", "prior")
+    
+    def __init__(self):
+        self.id: Optional[int] = None
+        self.ohlc: Optional[List[float]] = None
+        self.prior: Optional[Levels] = None
+        
+    def levels(self) -> Optional[Levels]:
+        """Levels of the running period (None outside any period)"""
+        if self.ohlc is None or self.id == NO_SESSION:
+            return None
+        return Levels(*self.ohlc)
+        
+    def feed(self, ids: List[int], opens: List[float], highs: List[float],
+             lows: List[float], closes: List[float]) -> List[Tuple[int, Levels]]:
+        """
+        Apply runs of consecutive bars sharing a period id
+        
+        Args:
+            ids: Period id of every run
+            opens, highs, lows, closes: OHLC of every run
+            
+        Returns:
+            (period id, levels) of the periods completed by these bars, oldest first
+        """
+        completed = []
+        first = 0
+        if ids[0] == self.id:
+            # The first run continues the running period
+            ohlc = self.ohlc
+            ohlc[1] = max(ohlc[1], highs[0])
+            ohlc[2] = min(ohlc[2], lows[0])
+            ohlc[3] = closes[0]
+            first = 1
+            
+        if first < len(ids):
+            if self.levels() is not None:
+                completed.append((self.id, self.levels()))
+            for run in range(first, len(ids) - 1):
+                if ids[run] != NO_SESSION:
+                    completed.append((ids[run], Levels(opens[run], highs[run], lows[run], closes[run])))
+            self.id = ids[-1]
+            self.ohlc = [opens[-1], highs[-1], lows[-1], closes[-1]]
+        if completed:
+            self.prior = completed[-1][1]
+        return completed
+
+def _runs(ids: np.ndarray, o, h, l, c) -> Tuple[List, ...]:
+    """Split bars into runs of equal ids; returns (ids, opens, highs, lows, closes) per run"""
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)] - 1
+    return (ids[starts].tolist(), o[starts].tolist(), np.maximum.reduceat(h, starts).tolist(),
+            np.minimum.reduceat(l, starts).tolist(), c[ends].tolist())
+
+class SessionTracker:
+    """Session, day and week levels of one series, updated bar by bar"""
+    
+    def __init__(self, calendar: Optional[SessionCalendar] = None):
+        self.calendar = calendar or session_calendar()
+        self.periods = {"session": _Period(), "day": _Period(), "week": _Period()}
+        # Session name -> levels of its last completed instance
+        self.last_sessions: Dict[str, Levels] = {}
+        self.last: Optional[int] = None   # Timestamp of the newest bar folded in
+        
+    def update(self, arrays: Dict[str, np.ndarray], start: int = 0) -> None:
+        """Fold bars[start:] (oldest first, not seen before) into the levels"""
+        ts = arrays["timestamp"][start:]
+        if ts.size == 0:
+            return
+        self.last = int(ts[-1])
+        o, h, l, c = (arrays[name][start:] for name in ("open", "high", "low", "close"))
+        if ts.size == 1:
+            # Live path: one new bar, no arrays to build
+            bar = ([float(o[0])], [float(h[0])], [float(l[0])], [float(c[0])])
+            runs = [([period_id], *bar) for period_id in self.calendar.label_one(int(ts[0]))]
+        else:
+            runs = [_runs(ids, o, h, l, c) for ids in self.calendar.label(ts)]
+            
+        for kind, kind_runs in zip(("day", "week", "session"), runs):
+            completed = self.periods[kind].feed(*kind_runs)
+            if kind == "session":
+                for session_id, levels in completed:
+                    self.last_sessions[self.calendar.session_name(session_id)] = levels
+                    
+    @property
+    def session(self) -> Optional[Levels]:
+        """Running levels of the current session"""
+        return self.periods["session"].levels()
+        
+    @property
+    def day(self) -> Optional[Levels]:
+        """Running levels of the current trading day"""
+        return self.periods["day"].levels()
+        
+    @property
+    def week(self) -> Optional[Levels]:
+        """Running levels of the current trading week"""
+        return self.periods["week"].levels()
+        
+    @property
+    def prior_day(self) -> Optional[Levels]:
+        """Levels of the previous trading day"""
+        return self.periods["day"].prior
+        
+    @property
+    def prior_week(self) -> Optional[Levels]:
+        """Levels of the previous trading week"""
+        return self.periods["week"].prior
+        
+    @property
+    def session_name(self) -> Optional[str]:
+        """Name of the current session"""
+        period_id = self.periods["session"].id
+        return self.calendar.session_name(period_id) if period_id is not None else None
+        
+    def levels(self) -> Dict[str, Any]:
+        """All levels as plain dicts (None where not known yet)"""
+        def as_dict(levels: Optional[Levels]) -> Optional[Dict[str, float]]:
+            return levels._asdict() if levels is not None else None
+            
+        return {
+            "session_name": self.session_name,
+            "session": as_dict(self.session),
+            "day": as_dict(self.day),
+            "week": as_dict(self.week),
+            "prior_day": as_dict(self.prior_day),
+            "prior_week": as_dict(self.prior_week),
+            "sessions": {name: as_dict(levels) for name, levels in self.last_sessions.items()},
+        }
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain values to resume from (see set_state)"""
+        return {
+            "periods": {
+                kind: [period.id, period.ohlc, list(period.prior) if period.prior else None]
+                for kind, period in self.periods.items()
+            },
+            "sessions": {name: list(levels) for name, levels in self.last_sessions.items()},
+            "last": self.last,
+        }
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Resume from a `get_state` result"""
+        for kind, (period_id, ohlc, prior) in state["periods"].items():
+            period = self.periods[kind]
+            period.id = int(period_id) if period_id is not None else None
+            period.ohlc = [float(value) for value in ohlc] if ohlc is not None else None
+            period.prior = Levels(*prior) if prior is not None else None
+        self.last_sessions = {name: Levels(*levels) for name, levels in state["sessions"].items()}
+        self.last = int(state["last"]) if state.get("last") is not None else None
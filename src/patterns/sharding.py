@@ -0,0 +1,277 @@
+"""
+Multi-process sharding of pattern detection
+
+Each (symbol, timeframe) series is owned by one worker process running its own
+PatternManager. The data source stays in the main process; for every closed bar
+the main process sends only the bars the worker has not seen yet, packed as one
+structured numpy array over a pipe, and gets back the new patterns, status
+events and retired (expired or evicted) patterns. Workers keep their own bar buffers, so steady-state traffic is one
+48-byte bar each way plus the (usually empty) results. Workers also hand over
+and take back their pattern state for snapshots (see `get_state`).
+
+Series are spread over the workers round-robin, so detection for different
+instruments and timeframes runs on separate cores and a heavy series only
+delays the other series that share its worker.
+"""
+
+import asyncio
+import multiprocessing
+import sys
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+from ..data_sources.bar_store import BarStore, COLUMNS
+from ..data_sources.cache import BAR_DTYPE
+
+def pack_bars(bars: Dict[str, np.ndarray], start: int = 0) -> bytes:
+    """Pack bars[start:] into the bytes of one structured array"""
+    n = len(bars["timestamp"]) - start
+    packed = np.empty(max(n, 0), dtype=BAR_DTYPE)
+    for name in COLUMNS:
+        packed[name] = bars[name][start:]
+    return packed.tobytes()
+
+def unpack_bars(payload: bytes) -> Dict[str, np.ndarray]:
+    """Column views over bytes produced by pack_bars"""
+    packed = np.frombuffer(payload, dtype=BAR_DTYPE)
+    return {name: packed[name] for name in COLUMNS}
+
+async def _serve(conn, config: Dict[str, Any], patterns: Optional[List[str]],
+                 buffer_size: int, performance: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Worker loop: apply bars, run detection, reply in request order
+    
+    Messages are ("bars", symbol, timeframe, payload), ("get_state",) and
+    ("set_state", series entries); None stops the worker.
+    """
+    from . import PatternManager
+    
+    manager = PatternManager(config, performance)
+    await manager.start(instruments=[], patterns=patterns)
+    store = BarStore(buffer_size)
+    
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+            
+        kind, *args = message
+        try:
+            if kind == "bars":
+                symbol, timeframe, payload = args
+                buffer = store.buffer(symbol, timeframe)
+                buffer.extend(unpack_bars(payload))
+                bars = buffer.view()
+                events = await manager.update_patterns(symbol, bars, timeframe)
+                new_patterns = await manager.detect_patterns(bars, symbol, timeframe)
+                conn.send(("ok", new_patterns, events, manager.pop_retired()))
+            elif kind == "get_state":
+                conn.send(("ok", manager.get_state()["series"]))
+            elif kind == "set_state":
+                manager.set_state({"series": args[0]})
+                conn.send(("ok",))
+            else:
+                raise ValueError(f"Unknown message: {kind}")
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+def _worker_main(conn, config: Dict[str, Any], patterns: Optional[List[str]],
+                 buffer_size: int, log_level: str,
+                 performance: Optional[Dict[str, Any]] = None) -> None:
+    """Process entry point"""
+    # The main process owns the log file; workers only write to stderr
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    try:
+        asyncio.run(_serve(conn, config, patterns, buffer_size, performance))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+class _Worker:
+    """Main-process handle of one worker: its pipe and the requests in flight"""
+    
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.pending: deque = deque()   # Futures, in the order requests were sent
+        self.reader: Optional[threading.Thread] = None
+
+class ShardPool:
+    """Runs pattern detection for each series in a pool of worker processes"""
+    
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        workers: int,
+        patterns: Optional[List[str]] = None,
+        buffer_size: int = 5000,
+        log_level: str = "INFO",
+        performance: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            config: Patterns config, passed to every worker's PatternManager
+            workers: Number of worker processes
+            patterns: Optional pattern type filter
+            buffer_size: Bars kept per series in the workers
+            log_level: Log level of the workers
+            performance: Performance config, for the workers' active set caps
+        """
+        if workers < 1:
+            raise ValueError(f"Invalid number of detection workers: {workers}")
+            
+        self.config = config
+        self.num_workers = workers
+        self.patterns = patterns
+        self.buffer_size = buffer_size
+        self.log_level = log_level
+        self.performance = performance
+        
+        self.workers: List[_Worker] = []
+        self.shards: Dict[Tuple[str, str], _Worker] = {}
+        
+        # (symbol, timeframe) -> timestamp (ns) of the newest bar sent to the worker
+        self._sent: Dict[Tuple[str, str], int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+    async def start(self, streams: List[Tuple[str, str]]) -> None:
+        """Start the workers and assign every series to one of them"""
+        self._loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context("spawn")
+        
+        for index in range(min(self.num_workers, max(len(streams), 1))):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker_main,
+                args=(child, self.config, self.patterns, self.buffer_size, self.log_level,
+                      self.performance),
+                name=f"detector-{index}",
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            
+            worker = _Worker(index, process, parent)
+            worker.reader = threading.Thread(
+                target=self._read_replies, args=(worker,),
+                name=f"detector-{index}-reader", daemon=True
+            )
+            worker.reader.start()
+            self.workers.append(worker)
+            
+        for i, key in enumerate(streams):
+            self.shards[key] = self.workers[i % len(self.workers)]
+            
+        logger.info(
+            f"Started {len(self.workers)} detection workers for {len(streams)} series"
+        )
+        
+    def _read_replies(self, worker: _Worker) -> None:
+        """Reader thread: hand each reply to the future of the oldest request"""
+        while True:
+            try:
+                reply = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = worker.pending.popleft()
+            self._loop.call_soon_threadsafe(self._resolve, future, reply)
+            
+        # Worker gone: fail whatever is still waiting
+        while worker.pending:
+            future = worker.pending.popleft()
+            self._loop.call_soon_threadsafe(
+                self._resolve, future, ("error", f"Detection worker {worker.index} exited")
+            )
+            
+    @staticmethod
+    def _resolve(future: asyncio.Future, reply: Tuple) -> None:
+        if future.done():
+            return
+        status, *result = reply
+        if status == "ok":
+            future.set_result(tuple(result))
+        else:
+            future.set_exception(RuntimeError(result[0]))
+            
+    async def process_bar(
+        self,
+        symbol: str,
+        timeframe: str,
+        bars: Dict[str, np.ndarray]
+    ) -> Tuple[List, List, List]:
+        """
+        Send a series' unseen bars to its worker and wait for the results
+        
+        Args:
+            symbol: Instrument symbol
+            timeframe: Timeframe of the series
+            bars: Recent bars of the series, newest last
+            
+        Returns:
+            (new pattern dicts, status event dicts, retired pattern dicts), as
+            PatternManager's detect_patterns, update_patterns and pop_retired
+            return them
+        """
+        key = (symbol, timeframe)
+        worker = self.shards[key]
+        
+        ts = bars["timestamp"]
+        start = 0
+        if key in self._sent:
+            start = int(np.searchsorted(ts, self._sent[key], side="right"))
+        if start >= len(ts):
+            return [], [], []
+        self._sent[key] = int(ts[-1])
+        return await self._request(worker, ("bars", symbol, timeframe, pack_bars(bars, start)))
+        
+    async def _request(self, worker: _Worker, message: Tuple) -> Tuple:
+        """Send a message to a worker and wait for its reply"""
+        future = self._loop.create_future()
+        worker.pending.append(future)
+        worker.conn.send(message)
+        return await future
+        
+    async def get_state(self) -> List[Dict[str, Any]]:
+        """Series entries of every worker's PatternManager state (see PatternManager.get_state)"""
+        replies = await asyncio.gather(*[
+            self._request(worker, ("get_state",)) for worker in self.workers
+        ])
+        return [entry for (series,) in replies for entry in series]
+        
+    async def set_state(self, series: List[Dict[str, Any]]) -> None:
+        """Hand each series entry to the worker that owns the series; others are dropped"""
+        owned: Dict[int, List[Dict[str, Any]]] = {}
+        for entry in series:
+            worker = self.shards.get((entry["symbol"], entry["timeframe"]))
+            if worker is not None:
+                owned.setdefault(worker.index, []).append(entry)
+        await asyncio.gather(*[
+            self._request(self.workers[index], ("set_state", entries)) for index, entries in owned.items()
+        ])
+        
+    async def close(self) -> None:
+        """Stop the workers"""
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+                
+        for worker in self.workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            
+        self.workers.clear()
+        self.shards.clear()
+        logger.info("Detection workers stopped")
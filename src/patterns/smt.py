@@ -0,0 +1,275 @@
+"""
+SMT divergence between correlated index futures
+
+Bars of two (symbol, timeframe) streams are joined on their timestamp; each
+joined pair updates a rolling correlation of bar returns and rolling swing
+highs/lows per leg. While the pair is correlated (r of bar returns at or above
+`divergence_threshold`), one leg running its swing high while the other
+holds below its own is a bearish SMT, and the mirror image at the lows is a
+bullish SMT. The pattern is raised on the leg that swept, with the swept
+range (old swing level to new extreme) as its zone.
+
+Every step is O(1) per bar, so widening the window or adding pairs such as
+MYM/M2K does not make a bar more expensive.
+"""
+
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from .rolling import RollingCorrelation, RollingExtreme
+
+# (timestamp_ns, high, low, close)
+JoinBar = Tuple[int, float, float, float]
+
+class StreamJoin:
+    """Aligns the bars of two streams by timestamp"""
+    
+    def __init__(self, max_pending: int = 8):
+        """
+        Args:
+            max_pending: Bars held per leg while the other leg lags; older
+                ones are given up as missing
+        """
+        self.max_pending = max_pending
+        self._pending = (deque(), deque())
+        self.last_joined: Optional[int] = None
+        self.stats = Counter()  # joined / late / missing
+        
+    def add(self, leg: int, bar: JoinBar) -> List[Tuple[JoinBar, JoinBar]]:
+        """
+        Take a bar for leg 0 or 1
+        
+        Each leg's bars arrive in time order. A bar at or before the last joined
+        timestamp is late and dropped; a bar the other leg has moved past
+        without matching is missing and dropped. A repeated timestamp replaces
+        the pending bar (a revised bar).
+        
+        Returns:
+            (leg 0 bar, leg 1 bar) pairs completed by this bar, oldest first
+        """
+        ts = bar[0]
+        if self.last_joined is not None and ts <= self.last_joined:
+            self.stats["late"] += 1
+            return []
+            
+        pending = self._pending[leg]
+        if pending and pending[-1][0] >= ts:
+            if pending[-1][0] > ts:
+                self.stats["late"] += 1
+                return []
+            pending[-1] = bar
+        else:
+            pending.append(bar)
+            if len(pending) > self.max_pending:
+                pending.popleft()
+                self.stats["missing"] += 1
+                
+        first, second = self._pending
+        pairs = []
+        while first and second:
+            a, b = first[0][0], second[0][0]
+            if a == b:
+                pairs.append((first.popleft(), second.popleft()))
+                self.last_joined = a
+            elif a < b:
+                first.popleft()
+                self.stats["missing"] += 1
+            else:
+                second.popleft()
+                self.stats["missing"] += 1
+        self.stats["joined"] += len(pairs)
+        return pairs
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain-value state for snapshots"""
+        return {
+            "pending": [[list(bar) for bar in pending] for pending in self._pending],
+            "last_joined": self.last_joined,
+        }
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a `get_state` result"""
+        self._pending = tuple(deque(tuple(bar) for bar in pending) for pending in state["pending"])
+        self.last_joined = state["last_joined"]
+
+class _Leg:
+    """Rolling state of one side of a pair"""
+    
+    def __init__(self, symbol: str, swing_window: int):
+        self.symbol = symbol
+        self.highs = RollingExtreme(swing_window, maximum=True)
+        self.lows = RollingExtreme(swing_window, maximum=False)
+        self.close: Optional[float] = None
+
+class SmtDivergence:
+    """Streaming SMT detector for one pair of symbols on one timeframe"""
+    
+    pattern_type = "SMT"
+    
+    def __init__(self, symbols: Tuple[str, str], timeframe: str, config: Dict[str, Any]):
+        """
+        Args:
+            symbols: The two correlated symbols, e.g. ("MES", "MNQ")
+            timeframe: Timeframe of both streams
+            config: `smt_divergence` config section
+        """
+        window = int(config.get("correlation_window", 20))
+        self.symbols = tuple(symbols)
+        self.timeframe = timeframe
+        self.threshold = float(config.get("divergence_threshold", 0.7))
+        
+        self.join = StreamJoin(int(config.get("max_pending_bars", 8)))
+        self.correlation = RollingCorrelation(window)
+        self.legs = [_Leg(symbol, int(config.get("swing_window", window))) for symbol in self.symbols]
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain-value state for snapshots"""
+        return {
+            "join": self.join.get_state(),
+            "correlation": self.correlation.get_state(),
+            "legs": [
+                {"highs": leg.highs.get_state(), "lows": leg.lows.get_state(), "close": leg.close}
+                for leg in self.legs
+            ],
+        }
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a `get_state` result"""
+        self.join.set_state(state["join"])
+        self.correlation.set_state(state["correlation"])
+        for leg, leg_state in zip(self.legs, state["legs"]):
+            leg.highs.set_state(leg_state["highs"])
+            leg.lows.set_state(leg_state["lows"])
+            leg.close = leg_state["close"]
+            
+    def add(self, symbol: str, bar: JoinBar) -> List[Dict[str, Any]]:
+        """Feed a closed bar of either symbol; returns new SMT patterns"""
+        patterns = []
+        for pair in self.join.add(self.symbols.index(symbol), bar):
+            pattern = self._on_pair(pair)
+            if pattern is not None:
+                patterns.append(pattern)
+        return patterns
+        
+    def _on_pair(self, pair: Tuple[JoinBar, JoinBar]) -> Optional[Dict[str, Any]]:
+        """Check a joined pair against the prior window, then roll it in"""
+        first, second = self.legs
+        ts, close_a, close_b = pair[0][0], pair[0][3], pair[1][3]
+        
+        if first.close and second.close:
+            self.correlation.push(close_a / first.close - 1.0, close_b / second.close - 1.0)
+            
+        pattern = None
+        r = self.correlation.value
+        if self.correlation.full and first.highs.full and r is not None and r >= self.threshold:
+            pattern = self._divergence(ts, r, pair)
+            
+        for leg, (_, high, low, close) in zip(self.legs, pair):
+            leg.highs.push(high)
+            leg.lows.push(low)
+            leg.close = close
+        return pattern
+        
+    def _divergence(self, ts: int, r: float, pair: Tuple[JoinBar, JoinBar]) -> Optional[Dict[str, Any]]:
+        """Pattern for the leg that swept its swing level while the other held, if any"""
+        swept = [bar[1] > leg.highs.value for leg, bar in zip(self.legs, pair)]
+        if swept[0] != swept[1]:
+            leader = 0 if swept[0] else 1
+            extreme = self.legs[leader].highs
+            # A level set by the previous candle is a running move, not a swing being swept
+            if extreme.age >= 1:
+                return self._pattern(ts, leader, "bearish", extreme.value, pair[leader][1], r)
+            return None
+            
+        swept = [bar[2] < leg.lows.value for leg, bar in zip(self.legs, pair)]
+        if swept[0] != swept[1]:
+            leader = 0 if swept[0] else 1
+            extreme = self.legs[leader].lows
+            if extreme.age >= 1:
+                return self._pattern(ts, leader, "bullish", pair[leader][2], extreme.value, r)
+        return None
+        
+    def _pattern(self, ts: int, leader: int, direction: str, lower: float, upper: float,
+                 r: float) -> Dict[str, Any]:
+        symbol, other = self.symbols[leader], self.symbols[1 - leader]
+        held = self.legs[1 - leader]
+        stamp = str(np.datetime64(ts, "ns").astype("datetime64[s]"))
+        suffix = stamp.replace("-", "").replace(":", "").replace("T", "_")
+        return {
+            "pattern_id": f"{symbol}_{self.timeframe}_{self.pattern_type}_{other}_{suffix}",
+            "symbol": symbol,
+            "timeframe": self.timeframe,
+            "pattern_type": self.pattern_type,
+            "direction": direction,
+            "mean_threshold": float(lower + upper) / 2,
+            "upper_bound": float(upper),
+            "lower_bound": float(lower),
+            "status": "active",
+            "confidence": abs(float(r)),
+            "metadata": {
+                "pair": other,
+                "correlation": round(float(r), 4),
+                # The level the other leg failed to take
+                "pair_level": float(held.highs.value if direction == "bearish" else held.lows.value),
+            },
+            "created_at": f"{stamp}Z",
+            "last_updated": f"{stamp}Z",
+        }
+
+class SmtScanner:
+    """Routes closed bars to the SMT detectors of every configured pair"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: `smt_divergence` config section
+        """
+        self.config = config
+        self.detectors: Dict[Tuple[str, str], List[SmtDivergence]] = {}
+        
+    def configure(self, instruments: List[Dict[str, Any]]) -> None:
+        """Create a detector per configured pair and shared timeframe"""
+        timeframes = {instr["symbol"]: instr.get("timeframes", []) for instr in instruments}
+        self.detectors = {}
+        for first, second in self.config.get("pairs") or [["MES", "MNQ"]]:
+            if first not in timeframes or second not in timeframes:
+                continue
+            for tf in timeframes[first]:
+                if tf not in timeframes[second]:
+                    continue
+                detector = SmtDivergence((first, second), tf, self.config)
+                self.detectors.setdefault((first, tf), []).append(detector)
+                self.detectors.setdefault((second, tf), []).append(detector)
+                
+    def __bool__(self) -> bool:
+        return bool(self.detectors)
+        
+    def _unique(self) -> Dict[Tuple[str, str, str], SmtDivergence]:
+        """Each detector once, keyed by (first symbol, second symbol, timeframe)"""
+        return {
+            (*detector.symbols, detector.timeframe): detector
+            for detectors in self.detectors.values() for detector in detectors
+        }
+        
+    def get_state(self) -> List[Dict[str, Any]]:
+        """Plain-value state of every pair detector"""
+        return [
+            {"symbols": list(symbols), "timeframe": timeframe, "state": detector.get_state()}
+            for (*symbols, timeframe), detector in self._unique().items()
+        ]
+        
+    def set_state(self, state: List[Dict[str, Any]]) -> None:
+        """Restore detectors that are still configured; others are ignored"""
+        detectors = self._unique()
+        for entry in state:
+            detector = detectors.get((*entry["symbols"], entry["timeframe"]))
+            if detector is not None:
+                detector.set_state(entry["state"])
+        
+    def add(self, symbol: str, timeframe: str, bar: JoinBar) -> List[Dict[str, Any]]:
+        """Feed a closed bar; returns new SMT patterns on any leg"""
+        patterns = []
+        for detector in self.detectors.get((symbol, timeframe), ()):
+            patterns.extend(detector.add(symbol, bar))
+        return patterns
@@ -0,0 +1,383 @@
+"""
+Columnar store of active patterns
+
+Active zones live in one structured NumPy table per (symbol, timeframe)
+instead of one dict each: pattern type, direction and status are small
+integer codes, levels and confidence are float64 and timestamps are int64
+nanoseconds, about 60 bytes per zone. Levels are stored sign-adjusted (a
+bearish zone as the bullish zone of the negated price), so checking a candle
+against every zone of a series is a handful of vectorized comparisons shared
+by both directions (`thresholds.classify_zones`). Pattern dicts are only
+built for what leaves the store: status events, retired patterns and
+`PatternManager.get_active_patterns`.
+
+Rows are kept dense: removing a zone moves the last row into its place, so
+a table never needs compacting and stays as long as its live zone count.
+
+A candle can only change a zone it reaches: low <= upper for a bullish zone,
+high >= lower for a bearish one, i.e. probe <= near with the sign-adjusted
+probe low (bullish) or -high (bearish). Each table keeps the near edges of
+either direction sorted with their row positions (`EdgeIndex`), so the
+touched rows are a binary search and a slice, and a bar costs
+O(log n + touched) rather than a pass over every zone.
+"""
+
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+
+from .thresholds import STATUSES, STATUS_CODES
+
+PATTERN_DTYPE = np.dtype([
+    ("type", np.uint8),          # index into PatternStore.types
+    ("direction", np.int8),      # 1 bullish, -1 bearish
+    ("status", np.uint8),        # index into thresholds.STATUSES
+    ("near", np.float64),        # edge price reaches first: upper (bullish) / -lower (bearish)
+    ("mean", np.float64),        # mean threshold, negated for bearish zones
+    ("far", np.float64),         # edge a fill closes beyond: lower (bullish) / -upper (bearish)
+    ("confidence", np.float64),
+    ("created", np.int64),       # ns since epoch
+    ("updated", np.int64),
+])
+
+def parse_stamp(stamp: str) -> int:
+    """ISO timestamp ("...Z") -> ns since epoch"""
+    return int(np.datetime64(stamp.rstrip("Z"), "ns").astype(np.int64))
+
+@lru_cache(maxsize=4096)
+def format_stamp(ns: int) -> str:
+    """ns since epoch -> ISO timestamp to the second, as used in pattern dicts"""
+    return f"{np.datetime64(ns, 'ns').astype('datetime64[s]')}Z"
+
+def split_export(state: Optional[Dict[str, Any]], pattern_types) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Split a `PatternStore.export_table` result into (zones of `pattern_types`, the rest)"""
+    if not state:
+        return None, None
+    rows, types = state["zones"], state["types"]
+    wanted = np.array([name in pattern_types for name in types] + [False], dtype=bool)
+    mask = wanted[rows["type"]]
+    
+    def part(keep: np.ndarray) -> Optional[Dict[str, Any]]:
+        if not keep.any():
+            return None
+        ids = [pattern_id for pattern_id, kept in zip(state["ids"], keep.tolist()) if kept]
+        metadata = state.get("metadata") or {}
+        return {
+            "zones": np.array(rows[keep]),
+            "ids": ids,
+            "types": types,
+            "metadata": {pattern_id: metadata[pattern_id] for pattern_id in ids if pattern_id in metadata},
+        }
+    return part(mask), part(~mask)
+
+class EdgeIndex:
+    """Sorted near edges of one direction's zones, with their row positions"""
+    
+    def __init__(self, capacity: int = 16):
+        self.keys = np.empty(capacity, dtype=np.float64)
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        
+    def __len__(self) -> int:
+        return self.size
+        
+    def add(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        """Index rows by their near edges"""
+        n, count = self.size, len(keys)
+        if n + count > len(self.keys):
+            capacity = max(2 * len(self.keys), n + count)
+            self.keys = np.resize(self.keys, capacity)
+            self.rows = np.resize(self.rows, capacity)
+        if count == 1:
+            # Shift the tail up one slot (numpy copes with the overlap)
+            i = int(self.keys[:n].searchsorted(keys[0], side="right"))
+            self.keys[i + 1:n + 1] = self.keys[i:n]
+            self.rows[i + 1:n + 1] = self.rows[i:n]
+            self.keys[i], self.rows[i] = keys[0], rows[0]
+        elif count:
+            merged = np.concatenate((self.keys[:n], keys))
+            order = np.argsort(merged, kind="stable")
+            self.keys[:n + count] = merged[order]
+            self.rows[:n + count] = np.concatenate((self.rows[:n], rows))[order]
+        self.size = n + count
+        
+    def _find(self, key: float, row: int) -> int:
+        lo = int(self.keys[:self.size].searchsorted(key, side="left"))
+        # Equal keys are rare: step over them
+        rows = self.rows
+        while rows[lo] != row:
+            lo += 1
+        return lo
+        
+    def remove(self, key: float, row: int) -> None:
+        i, n = self._find(key, row), self.size
+        self.keys[i:n - 1] = self.keys[i + 1:n]
+        self.rows[i:n - 1] = self.rows[i + 1:n]
+        self.size = n - 1
+        
+    def move(self, key: float, old: int, new: int) -> None:
+        """Follow a row to its new position"""
+        self.rows[self._find(key, old)] = new
+        
+    def reached(self, probe: float) -> np.ndarray:
+        """Rows whose near edge is at or beyond the sign-adjusted probe"""
+        n = self.size
+        return self.rows[int(self.keys[:n].searchsorted(probe, side="left")):n]
+
+class ZoneTable:
+    """Dense table of the active zones of one symbol and timeframe"""
+    
+    def __init__(self, symbol: str, timeframe: str, capacity: int = 16):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.rows = np.zeros(capacity, dtype=PATTERN_DTYPE)
+        self.ids: List[str] = []    # pattern_id of each live row
+        self.bullish, self.bearish = EdgeIndex(), EdgeIndex()
+        
+    def __len__(self) -> int:
+        return len(self.ids)
+        
+    @property
+    def live(self) -> np.ndarray:
+        """View of the live rows"""
+        return self.rows[:len(self.ids)]
+        
+    def _edges(self, row: int) -> Tuple[EdgeIndex, float]:
+        """Index and key of a row"""
+        rows = self.rows
+        return (self.bullish if rows["direction"][row] > 0 else self.bearish), float(rows["near"][row])
+        
+    def touched(self, high: float, low: float) -> np.ndarray:
+        """Positions of the rows a candle with this range reached, ascending"""
+        bull, bear = self.bullish.reached(low), self.bearish.reached(-high)
+        if not len(bear):
+            return np.sort(bull)
+        if not len(bull):
+            return np.sort(bear)
+        rows = np.concatenate((bull, bear))
+        rows.sort()
+        return rows
+        
+    def append(self, pattern_id: str, record: tuple) -> int:
+        """Add a row; returns its position"""
+        row = len(self.ids)
+        if row == len(self.rows):
+            self._resize(2 * len(self.rows))
+        self.rows[row] = record
+        self.ids.append(pattern_id)
+        edges, key = self._edges(row)
+        edges.add(np.array([key]), np.array([row]))
+        return row
+        
+    def extend(self, ids: List[str], rows: np.ndarray) -> int:
+        """Add many rows at once; returns the position of the first"""
+        start = len(self.ids)
+        if start + len(ids) > len(self.rows):
+            self._resize(max(2 * len(self.rows), start + len(ids)))
+        self.rows[start:start + len(ids)] = rows
+        self.ids.extend(ids)
+        
+        positions = np.arange(start, start + len(ids))
+        bull = rows["direction"] > 0
+        self.bullish.add(rows["near"][bull], positions[bull])
+        self.bearish.add(rows["near"][~bull], positions[~bull])
+        return start
+        
+    def pop(self, row: int) -> Optional[str]:
+        """
+        Remove a row by moving the last row into its place
+        
+        Returns:
+            pattern_id of the moved row, or None if nothing moved
+        """
+        last = len(self.ids) - 1
+        edges, key = self._edges(row)
+        edges.remove(key, row)
+        moved = None
+        if row != last:
+            edges, key = self._edges(last)
+            edges.move(key, last, row)
+            self.rows[row] = self.rows[last]
+            moved = self.ids[row] = self.ids[last]
+        self.ids.pop()
+        
+        if len(self.rows) > 64 and len(self.ids) < len(self.rows) // 4:
+            self._resize(len(self.rows) // 2)
+        return moved
+        
+    def _resize(self, capacity: int) -> None:
+        rows = np.zeros(capacity, dtype=PATTERN_DTYPE)
+        rows[:len(self.ids)] = self.rows[:len(self.ids)]
+        self.rows = rows
+
+class PatternStore:
+    """Active patterns of every series, keyed by pattern_id"""
+    
+    def __init__(self):
+        self.tables: Dict[Tuple[str, str], ZoneTable] = {}
+        self._rows: Dict[str, Tuple[ZoneTable, int]] = {}   # pattern_id -> location
+        
+        # Pattern type names are interned to uint8 codes
+        self.types: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        
+        # Metadata of the few patterns that carry any (e.g. SMT pair levels)
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        
+    def __len__(self) -> int:
+        return len(self._rows)
+        
+    def __contains__(self, pattern_id: str) -> bool:
+        return pattern_id in self._rows
+        
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the zone tables"""
+        return sum(table.rows.nbytes for table in self.tables.values())
+        
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """(symbol, timeframe) -> active patterns"""
+        return {key: len(table) for key, table in self.tables.items()}
+        
+    def _type_code(self, pattern_type: str) -> int:
+        code = self._type_codes.get(pattern_type)
+        if code is None:
+            code = self._type_codes[pattern_type] = len(self.types)
+            self.types.append(pattern_type)
+        return code
+        
+    def add(self, pattern: Dict[str, Any]) -> None:
+        """Store a pattern dict, replacing any pattern with the same id"""
+        pattern_id = pattern["pattern_id"]
+        self.remove(pattern_id)
+        
+        key = (pattern["symbol"], pattern["timeframe"])
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = ZoneTable(*key)
+            
+        metadata = pattern.get("metadata")
+        if metadata:
+            self._metadata[pattern_id] = metadata
+            
+        lower, upper, mean = pattern["lower_bound"], pattern["upper_bound"], pattern["mean_threshold"]
+        if pattern["direction"] == "bullish":
+            direction, levels = 1, (upper, mean, lower)
+        else:
+            direction, levels = -1, (-lower, -mean, -upper)
+            
+        row = table.append(pattern_id, (
+            self._type_code(pattern["pattern_type"]),
+            direction,
+            STATUS_CODES[pattern["status"]],
+            *levels,
+            pattern["confidence"],
+            parse_stamp(pattern["created_at"]),
+            parse_stamp(pattern["last_updated"]),
+        ))
+        self._rows[pattern_id] = (table, row)
+        
+    def remove(self, pattern_id: str) -> None:
+        """Drop a pattern if present"""
+        location = self._rows.pop(pattern_id, None)
+        if location is None:
+            return
+        table, row = location
+        moved = table.pop(row)
+        if moved is not None:
+            self._rows[moved] = (table, row)
+        self._metadata.pop(pattern_id, None)
+        
+    def export_table(self, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        """
+        Snapshot of one series' zones
+        
+        Returns:
+            Dict with a copy of the rows ("zones"), their "ids", the "types"
+            the type codes refer to and the sidecar "metadata", or None if the
+            series has no zones
+        """
+        table = self.tables.get((symbol, timeframe))
+        if not table:
+            return None
+        return {
+            "zones": table.live.copy(),
+            "ids": list(table.ids),
+            "types": list(self.types),
+            "metadata": {pid: self._metadata[pid] for pid in table.ids if pid in self._metadata},
+        }
+        
+    def import_table(self, symbol: str, timeframe: str, state: Dict[str, Any]) -> List[str]:
+        """
+        Add the zones of an `export_table` result (possibly from another process)
+        
+        Returns:
+            The ids of the added zones
+        """
+        ids = list(state["ids"])
+        if not ids:
+            return []
+        for pattern_id in ids:
+            self.remove(pattern_id)
+            
+        # Type codes are per store; map them onto this store's codes
+        rows = np.array(state["zones"], dtype=PATTERN_DTYPE)
+        codes = np.array([self._type_code(name) for name in state["types"]], dtype=np.uint8)
+        rows["type"] = codes[rows["type"]]
+        
+        key = (symbol, timeframe)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = ZoneTable(*key)
+        start = table.extend(ids, rows)
+        for row, pattern_id in enumerate(ids, start):
+            self._rows[pattern_id] = (table, row)
+        self._metadata.update(state.get("metadata") or {})
+        return ids
+        
+    def set_status(self, pattern_id: str, status: int, ns: int) -> Dict[str, Any]:
+        """Change a pattern's status code; returns the updated pattern dict"""
+        table, row = self._rows[pattern_id]
+        table.rows["status"][row] = status
+        table.rows["updated"][row] = ns
+        return self._to_dict(table, row)
+        
+    def get(self, pattern_id: str) -> Optional[Dict[str, Any]]:
+        """Pattern dict of an active pattern"""
+        location = self._rows.get(pattern_id)
+        return self._to_dict(*location) if location is not None else None
+        
+    def patterns(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Pattern dicts of every active pattern (optionally of one symbol)"""
+        return [
+            self._to_dict(table, row)
+            for (table_symbol, _), table in self.tables.items()
+            if symbol is None or table_symbol == symbol
+            for row in range(len(table))
+        ]
+        
+    def _to_dict(self, table: ZoneTable, row: int) -> Dict[str, Any]:
+        (type_code, direction, status, near, mean, far, confidence,
+         created, updated) = table.rows[row].item()
+        pattern_id = table.ids[row]
+        if direction > 0:
+            lower, upper = far, near
+        else:
+            lower, upper, mean = -near, -far, -mean
+        
+        metadata = self._metadata.get(pattern_id, {})
+        return {
+            "pattern_id": pattern_id,
+            "symbol": table.symbol,
+            "timeframe": table.timeframe,
+            "pattern_type": self.types[type_code],
+            "direction": "bullish" if direction > 0 else "bearish",
+            "mean_threshold": mean,
+            "upper_bound": upper,
+            "lower_bound": lower,
+            "status": STATUSES[status],
+            "confidence": confidence,
+            "metadata": dict(metadata),
+            "created_at": format_stamp(created),
+            "last_updated": format_stamp(updated),
+        }
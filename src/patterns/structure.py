@@ -0,0 +1,247 @@
+"""
+Swing points and market structure (MSS / BOS)
+
+A candle is a swing high when its high is the highest of the `lookback`
+candles on either side (ties go to the later candle), which is known
+`lookback` candles after it closes; swing lows mirror this. A close above the
+latest confirmed swing high breaks structure to the upside: a Market
+Structure Shift when the previous break was to the downside, a Break of
+Structure otherwise. Each swing level can be broken once.
+
+`StructureTracker` does this bar by bar with monotonic deques over the last
+2 * lookback + 1 candles, amortized O(1) per bar whatever the lookback. On a
+break it can also report the last opposing candle before the breaking candle
+as an order block. `detect_structure` is the batch reference over whole
+arrays; both give identical results on the same bars.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .detectors import Detections, BULLISH, BEARISH
+from .rolling import RollingExtreme
+
+MSS = "MSS"
+BOS = "BOS"
+ORDER_BLOCK = "OrderBlock"
+
+# (pattern type, candle index, direction, lower, upper, confidence)
+Event = Tuple[str, int, int, float, float, float]
+
+def _body_ratio(o: float, h: float, l: float, c: float) -> float:
+    """Share of the candle's range that is body (1.0 for a zero-range candle)"""
+    return abs(c - o) / (h - l) if h > l else 1.0
+
+def _break_events(index: int, direction: int, previous: int, level: float,
+                  o: float, h: float, l: float, c: float,
+                  block: Optional[Tuple[float, float]], min_block_size: float) -> List[Event]:
+    """Events for one structure break, shared by the streaming and batch paths"""
+    kind = MSS if previous == -direction else BOS
+    confidence = _body_ratio(o, h, l, c)
+    if direction == BULLISH:
+        events = [(kind, index, direction, level, c, confidence)]
+    else:
+        events = [(kind, index, direction, c, level, confidence)]
+    if block is not None and block[1] - block[0] >= min_block_size:
+        events.append((ORDER_BLOCK, index, direction, block[0], block[1], confidence))
+    return events
+
+class StructureTracker:
+    """Incremental swing and market structure state for one series"""
+    
+    def __init__(self, lookback: int, order_blocks: bool = False, min_block_size: float = 0.0):
+        """
+        Args:
+            lookback: Candles on each side of a swing point (`swing_lookback`)
+            order_blocks: Also report the order block behind every break
+            min_block_size: Minimum order block candle range in points
+        """
+        if lookback < 1:
+            raise ValueError(f"Invalid swing lookback: {lookback}")
+        self.lookback = lookback
+        self.order_blocks = order_blocks
+        self.min_block_size = min_block_size
+        
+        self._highs = RollingExtreme(2 * lookback + 1, maximum=True)
+        self._lows = RollingExtreme(2 * lookback + 1, maximum=False)
+        
+        self.swing_high: Optional[float] = None   # Latest confirmed, unbroken levels
+        self.swing_low: Optional[float] = None
+        self.trend = 0                             # Direction of the last break
+        
+        # (low, high) of the latest down-close and up-close candles
+        self._last_down: Optional[Tuple[float, float]] = None
+        self._last_up: Optional[Tuple[float, float]] = None
+        
+    def update(self, index: int, o: float, h: float, l: float, c: float) -> List[Event]:
+        """
+        Take the next closed candle
+        
+        Args:
+            index: Position of the candle in the caller's arrays (echoed in events)
+            
+        Returns:
+            Structure breaks (and order blocks) completed by this candle
+        """
+        self._highs.push(h)
+        self._lows.push(l)
+        
+        # The candle `lookback` bars back is a swing if it is still the window extreme
+        if self._highs.full and self._highs.age == self.lookback:
+            self.swing_high = self._highs.value
+        if self._lows.full and self._lows.age == self.lookback:
+            self.swing_low = self._lows.value
+            
+        events = []
+        if self.swing_high is not None and c > self.swing_high:
+            block = self._last_down if self.order_blocks else None
+            events = _break_events(index, BULLISH, self.trend, self.swing_high,
+                                   o, h, l, c, block, self.min_block_size)
+            self.swing_high, self.trend = None, BULLISH
+        # Not elif: with the swing high below the swing low one close can break both
+        if self.swing_low is not None and c < self.swing_low:
+            block = self._last_up if self.order_blocks else None
+            events = events + _break_events(index, BEARISH, self.trend, self.swing_low,
+                                            o, h, l, c, block, self.min_block_size)
+            self.swing_low, self.trend = None, BEARISH
+            
+        if c < o:
+            self._last_down = (l, h)
+        elif c > o:
+            self._last_up = (l, h)
+        return events
+        
+    def get_state(self) -> Dict[str, Any]:
+        """Plain-value state for snapshots"""
+        return {
+            "highs": self._highs.get_state(),
+            "lows": self._lows.get_state(),
+            "swing_high": self.swing_high,
+            "swing_low": self.swing_low,
+            "trend": self.trend,
+            "last_down": self._last_down,
+            "last_up": self._last_up,
+        }
+        
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a `get_state` result"""
+        self._highs.set_state(state["highs"])
+        self._lows.set_state(state["lows"])
+        self.swing_high, self.swing_low = state["swing_high"], state["swing_low"]
+        self.trend = state["trend"]
+        self._last_down = tuple(state["last_down"]) if state["last_down"] else None
+        self._last_up = tuple(state["last_up"]) if state["last_up"] else None
+        
+    def scan(self, arrays: Dict[str, np.ndarray], start: int = 0) -> Dict[str, Detections]:
+        """
+        Feed candles `start` onwards and collect the events as Detections
+        
+        Args:
+            arrays: Output of `to_arrays`
+            start: First candle not yet fed to this tracker
+            
+        Returns:
+            Dict of pattern type -> Detections, like `DetectionEngine.run`
+        """
+        columns = [arrays[col][start:].tolist() for col in ("open", "high", "low", "close")]
+        events = []
+        for offset, (o, h, l, c) in enumerate(zip(*columns)):
+            found = self.update(start + offset, o, h, l, c)
+            if found:
+                events.extend(found)
+        return to_detections(events)
+
+def to_detections(events: List[Event]) -> Dict[str, Detections]:
+    """Group events by pattern type"""
+    grouped: Dict[str, List[Event]] = {}
+    for event in events:
+        grouped.setdefault(event[0], []).append(event)
+        
+    results = {}
+    for pattern_type, rows in grouped.items():
+        _, index, direction, lower, upper, confidence = zip(*rows)
+        lower, upper = np.array(lower), np.array(upper)
+        results[pattern_type] = Detections(
+            np.array(index, dtype=np.int64), np.array(direction, dtype=np.int8),
+            lower, upper, (lower + upper) / 2.0, np.array(confidence)
+        )
+    return results
+
+def swing_points(h: np.ndarray, l: np.ndarray, lookback: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices of swing highs and swing lows (vectorized)
+    
+    A swing at candle i is confirmed at candle i + lookback.
+    """
+    width = 2 * lookback + 1
+    if len(h) < width:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+        
+    # Position of the last maximum / minimum inside each window
+    highs = sliding_window_view(h, width)
+    lows = sliding_window_view(l, width)
+    last_max = width - 1 - np.argmax(highs[:, ::-1], axis=1)
+    last_min = width - 1 - np.argmin(lows[:, ::-1], axis=1)
+    
+    centers = np.arange(len(highs)) + lookback
+    return centers[last_max == lookback], centers[last_min == lookback]
+
+def _first_breaks(levels: np.ndarray, confirmed: np.ndarray, crossed, n: int) -> List[Tuple[int, float]]:
+    """
+    First candle that breaks each swing level before the next swing replaces it
+    
+    Returns:
+        (candle index, level) per broken swing
+    """
+    breaks = []
+    ends = np.append(confirmed[1:], n)
+    for level, begin, end in zip(levels.tolist(), confirmed.tolist(), ends.tolist()):
+        hit = np.flatnonzero(crossed(begin, end, level))
+        if hit.size:
+            breaks.append((begin + int(hit[0]), level))
+    return breaks
+
+def detect_structure(
+    o: np.ndarray,
+    h: np.ndarray,
+    l: np.ndarray,
+    c: np.ndarray,
+    lookback: int,
+    order_blocks: bool = False,
+    min_block_size: float = 0.0
+) -> List[Event]:
+    """
+    Batch reference for `StructureTracker`: all events over whole arrays
+    
+    Swings are found with sliding windows, each swing level is searched for
+    its first breaking close, and the breaks are then labelled in time order.
+    """
+    n = len(c)
+    swing_highs, swing_lows = swing_points(h, l, lookback)
+    up = _first_breaks(h[swing_highs], swing_highs + lookback,
+                       lambda b, e, level: c[b:e] > level, n)
+    down = _first_breaks(l[swing_lows], swing_lows + lookback,
+                         lambda b, e, level: c[b:e] < level, n)
+                         
+    # Latest down-close / up-close candle strictly before each index
+    positions = np.arange(n)
+    last_down = np.maximum.accumulate(np.where(c < o, positions, -1))
+    last_up = np.maximum.accumulate(np.where(c > o, positions, -1))
+    
+    # Time order; a candle breaking both ways is handled upside first, as in the tracker
+    merged = sorted([(i, BULLISH, level) for i, level in up] + [(i, BEARISH, level) for i, level in down],
+                    key=lambda event: (event[0], -event[1]))
+                    
+    events, trend = [], 0
+    for index, direction, level in merged:
+        block = None
+        if order_blocks and index > 0:
+            prior = (last_down if direction == BULLISH else last_up)[index - 1]
+            if prior >= 0:
+                block = (float(l[prior]), float(h[prior]))
+        events.extend(_break_events(index, direction, trend, level, float(o[index]), float(h[index]),
+                                    float(l[index]), float(c[index]), block, min_block_size))
+        trend = direction
+    return events
@@ -0,0 +1,122 @@
+"""
+Mean threshold and mitigation rules for active PD array zones
+"""
+
+from typing import Optional
+import numpy as np
+
+# Pattern status values
+ACTIVE = "active"
+RESPECTED = "respected"
+BREACHED = "breached"
+FILLED = "filled"
+
+# Retired without being filled (see lifecycle.py)
+EXPIRED = "expired"
+EVICTED = "evicted"
+
+# Integer codes for the columnar store (see store.py)
+STATUSES = (ACTIVE, RESPECTED, BREACHED, FILLED, EXPIRED, EVICTED)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Up to this many zones classify_zones compares scalars instead of arrays
+SCALAR_ZONES = 16
+
+# Alert types raised on a status change
+ALERT_TYPES = {
+    RESPECTED: "threshold_respected",
+    BREACHED: "threshold_breached",
+    FILLED: "pattern_filled",
+}
+
+def classify_bar(
+    direction: str,
+    lower: float,
+    upper: float,
+    mean: float,
+    high: float,
+    low: float,
+    close: float
+) -> Optional[str]:
+    """
+    Decide what a closed candle did to a zone
+    
+    A bullish zone is expected to hold as support, a bearish zone as
+    resistance. A candle that trades into the zone and closes on the expected
+    side of the mean threshold respects it, a close on the wrong side of the
+    mean breaches it, and a close beyond the far edge fills it.
+    
+    Args:
+        direction: "bullish" or "bearish"
+        lower, upper, mean: Zone levels
+        high, low, close: Candle values
+        
+    Returns:
+        New status, or None if the candle did not reach the zone
+    """
+    if direction == "bullish":
+        if low > upper:
+            return None
+        if close < lower:
+            return FILLED
+        if close < mean:
+            return BREACHED
+        return RESPECTED
+    else:
+        if high < lower:
+            return None
+        if close > upper:
+            return FILLED
+        if close > mean:
+            return BREACHED
+        return RESPECTED
+
+def classify_zones(
+    direction: np.ndarray,
+    near: np.ndarray,
+    mean: np.ndarray,
+    far: np.ndarray,
+    high: float,
+    low: float,
+    close: float
+) -> np.ndarray:
+    """
+    `classify_bar` for many zones at once
+    
+    Levels are sign-adjusted: a bearish zone is passed as the bullish zone of
+    the negated price (near = -lower, mean = -mean, far = -upper), so both
+    directions share the same comparisons.
+    
+    Args:
+        direction: 1 for bullish zones, -1 for bearish
+        near, mean, far: Sign-adjusted zone levels
+        high, low, close: Candle values
+        
+    Returns:
+        Status code per zone (see STATUS_CODES), -1 where the candle did not
+        reach the zone
+    """
+    if len(direction) <= SCALAR_ZONES:
+        # A handful of zones (the usual price-index hit): plain floats beat
+        # the fixed cost of the array operations
+        respected = STATUS_CODES[RESPECTED]
+        codes = []
+        for sign, zone_near, zone_mean, zone_far in zip(
+            direction.tolist(), near.tolist(), mean.tolist(), far.tolist()
+        ):
+            probe, signed_close = (low, close) if sign > 0 else (-high, -close)
+            if probe > zone_near:
+                codes.append(-1)
+            else:
+                codes.append(respected + (signed_close < zone_mean) + (signed_close < zone_far))
+        return np.array(codes, dtype=np.int64)
+        
+    reached = np.where(direction > 0, low, -high) <= near
+    if not np.count_nonzero(reached):
+        return np.full(len(direction), -1)
+        
+    # RESPECTED, BREACHED and FILLED are consecutive codes, and a close beyond
+    # the far edge is also beyond the mean
+    signed_close = close * direction
+    codes = STATUS_CODES[RESPECTED] + (signed_close < mean) + (signed_close < far)
+    return np.where(reached, codes, -1)
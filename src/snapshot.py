@@ -0,0 +1,156 @@
+"""
+State snapshots for fast warm starts
+
+A snapshot is a single file: a JSON header describing the saved state,
+followed by the raw bytes of every numpy array in it (bar columns, pattern
+zone tables), each aligned to 64 bytes. Arrays come back as read-only memory
+maps, so loading costs little more than parsing the header and restoring
+copies only what it uses. A snapshot is written to a temporary file and then
+renamed over the previous one, so a crash mid-write never leaves a torn file.
+"""
+
+import json
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Union
+import numpy as np
+
+from .data_sources.bar_store import BarStore, COLUMNS
+
+MAGIC = b"ICTSNAP1"
+VERSION = 2
+ALIGN = 64
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+def _extract(value: Any, arrays: List[np.ndarray]) -> Any:
+    """Copy of `value` with every array replaced by a reference into `arrays`"""
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value))
+        return {"__array__": len(arrays) - 1}
+    if isinstance(value, dict):
+        return {key: _extract(item, arrays) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract(item, arrays) for item in value]
+    return value
+
+def _insert(value: Any, arrays: List[np.ndarray]) -> Any:
+    """Inverse of `_extract`"""
+    if isinstance(value, dict):
+        if set(value) == {"__array__"}:
+            return arrays[value["__array__"]]
+        return {key: _insert(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_insert(item, arrays) for item in value]
+    return value
+
+def _descr(dtype: np.dtype) -> Any:
+    return np.lib.format.dtype_to_descr(dtype)
+
+def _dtype(descr: Any) -> np.dtype:
+    # JSON turns the (name, type) field tuples of a structured descr into lists
+    if isinstance(descr, list):
+        descr = [tuple(field) for field in descr]
+    return np.lib.format.descr_to_dtype(descr)
+
+def write_snapshot(path: Union[str, Path], state: Dict[str, Any]) -> int:
+    """
+    Write `state` (nested dicts/lists of JSON values and numpy arrays)
+    
+    Returns:
+        Size of the snapshot in bytes
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    
+    arrays: List[np.ndarray] = []
+    tree = _extract(state, arrays)
+    layout, offset = [], 0
+    for array in arrays:
+        layout.append({"descr": _descr(array.dtype), "shape": list(array.shape), "offset": offset})
+        offset = _aligned(offset + array.nbytes)
+        
+    header = json.dumps({
+        "version": VERSION,
+        "saved_at": time.time_ns(),
+        "state": tree,
+        "arrays": layout,
+    }).encode()
+    base = _aligned(len(MAGIC) + 8 + len(header))
+    
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for array, entry in zip(arrays, layout):
+            f.seek(base + entry["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+def read_snapshot(path: Union[str, Path]) -> Tuple[Dict[str, Any], int]:
+    """
+    Load a snapshot written by `write_snapshot`
+    
+    Returns:
+        (state, saved_at): arrays in the state are read-only memory maps;
+        saved_at is the wall clock time of the write in ns
+        
+    Raises:
+        ValueError: If the file is not a snapshot of this version
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a scanner snapshot: {path}")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported snapshot version {header.get('version')} in {path}")
+        
+    base = _aligned(len(MAGIC) + 8 + length)
+    arrays = []
+    for entry in header["arrays"]:
+        dtype, shape = _dtype(entry["descr"]), tuple(entry["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays.append(np.empty(shape, dtype=dtype))
+        else:
+            arrays.append(np.memmap(path, dtype=dtype, mode="r", offset=base + entry["offset"], shape=shape))
+    return _insert(header["state"], arrays), header["saved_at"]
+
+def bar_store_state(store: BarStore, until: Dict[Tuple[str, str], int]) -> List[Dict[str, Any]]:
+    """
+    Buffered bars of every series, up to the newest bar already processed
+    
+    Args:
+        store: Bar store of the data source
+        until: (symbol, timeframe) -> timestamp (ns) of the newest processed
+            bar; series missing here are skipped
+    """
+    series = []
+    for key, buffer in store.buffers.items():
+        if key not in until:
+            continue
+        bars = buffer.view()
+        n = int(np.searchsorted(bars["timestamp"], until[key], side="right"))
+        series.append({
+            "symbol": key[0],
+            "timeframe": key[1],
+            "total": buffer.total - (len(bars["timestamp"]) - n),
+            "bars": {name: bars[name][:n].copy() for name in COLUMNS},
+        })
+    return series
+
+def restore_bar_store(store: BarStore, series: List[Dict[str, Any]]) -> None:
+    """Refill buffers from `bar_store_state` output (replaces their contents)"""
+    for entry in series:
+        store.drop(entry["symbol"], entry["timeframe"])
+        buffer = store.buffer(entry["symbol"], entry["timeframe"])
+        buffer.extend(entry["bars"])
+        buffer.total = entry["total"]
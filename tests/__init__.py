@@ -0,0 +1,3 @@
+"""
+Tests for the ICT PD Array Scanner
+"""
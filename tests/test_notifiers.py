@@ -0,0 +1,316 @@
+"""
+Alert delivery: retries, backoff, circuit breaker and channel isolation
+
+HTTP channels talk to a local aiohttp server and email to a local SMTP
+socket server; nothing leaves the machine.
+"""
+
+import asyncio
+import socket
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from src.alerts import AlertManager
+from src.alerts import notifiers
+from src.alerts.notifiers import (
+    CircuitBreaker, DiscordNotifier, EmailNotifier, SmsNotifier, TelegramNotifier
+)
+
+ALERT = {"pattern_id": "MES_5m_FVG_1", "priority": "high", "message": "MES 5m FVG Alert\nbody"}
+
+@asynccontextmanager
+async def _server(handler):
+    """Serve `handler` for every POST; yields the base URL"""
+    app = web.Application()
+    app.router.add_post("/{tail:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield str(server.make_url("")).rstrip("/")
+    finally:
+        await server.close()
+
+def _scripted(responses):
+    """Handler answering with the scripted responses in turn (the last one repeats)"""
+    calls = []
+    
+    async def handler(request):
+        calls.append(await request.post() if request.content_type != "application/json"
+                     else await request.json())
+        return responses[min(len(calls), len(responses)) - 1]()
+    return handler, calls
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of waiting them out"""
+    delays = []
+    sleep = asyncio.sleep
+    
+    async def fake_sleep(delay, *args, **kwargs):
+        if delay:
+            delays.append(delay)
+        await sleep(0)
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(notifiers.random, "uniform", lambda lo, hi: hi)
+    return delays
+
+async def _deliver(notifier, alert=ALERT):
+    async with ClientSession() as session:
+        notifier.session = session
+        return await notifier.deliver(dict(alert))
+
+def test_retries_with_capped_exponential_backoff(sleeps):
+    handler, calls = _scripted([lambda: web.Response(status=500)] * 3 + [lambda: web.Response(status=204)])
+    
+    async def run():
+        async with _server(handler) as url:
+            notifier = DiscordNotifier({"webhook_url": f"{url}/hook", "max_retries": 3,
+                                        "backoff_s": 1, "max_backoff_s": 3})
+            return await _deliver(notifier), notifier
+            
+    delivered, notifier = asyncio.run(run())
+    assert delivered
+    assert len(calls) == 4
+    assert sleeps == [1, 2, 3]
+    assert notifier.breaker.state == CircuitBreaker.CLOSED
+
+def test_client_errors_are_not_retried(sleeps):
+    handler, calls = _scripted([lambda: web.Response(status=400, text="bad payload")])
+    
+    async def run():
+        async with _server(handler) as url:
+            return await _deliver(DiscordNotifier({"webhook_url": f"{url}/hook", "max_retries": 3}))
+            
+    assert not asyncio.run(run())
+    assert len(calls) == 1
+    assert sleeps == []
+
+def test_gives_up_after_max_retries(sleeps):
+    handler, calls = _scripted([lambda: web.Response(status=503)])
+    
+    async def run():
+        async with _server(handler) as url:
+            return await _deliver(DiscordNotifier({"webhook_url": f"{url}/hook", "max_retries": 2,
+                                                   "backoff_s": 0.5}))
+                                                   
+    assert not asyncio.run(run())
+    assert len(calls) == 3
+    assert sleeps == [0.5, 1.0]
+
+def test_429_waits_for_retry_after(sleeps):
+    handler, calls = _scripted([lambda: web.Response(status=429, headers={"Retry-After": "7"}),
+                                lambda: web.Response(status=204)])
+                                
+    async def run():
+        async with _server(handler) as url:
+            return await _deliver(DiscordNotifier({"webhook_url": f"{url}/hook", "backoff_s": 1}))
+            
+    assert asyncio.run(run())
+    assert len(calls) == 2
+    assert sleeps == [7.0]
+
+def test_telegram_429_reads_retry_after_from_body(sleeps):
+    handler, calls = _scripted([
+        lambda: web.json_response({"ok": False, "parameters": {"retry_after": 4}}, status=429),
+        lambda: web.json_response({"ok": True}),
+    ])
+    
+    async def run():
+        async with _server(handler) as url:
+            notifier = TelegramNotifier({"bot_token": "123:abc", "chat_id": "42", "api_url": url,
+                                         "max_backoff_s": 30})
+            return await _deliver(notifier)
+            
+    assert asyncio.run(run())
+    assert [call["chat_id"] for call in calls] == ["42", "42"]
+    assert sleeps == [4.0]
+
+def test_slow_attempt_times_out_and_is_retried(sleeps):
+    calls = []
+    
+    async def handler(request):
+        calls.append(request.path)
+        if len(calls) == 1:
+            await asyncio.Event().wait()
+        return web.Response(status=204)
+        
+    async def run():
+        async with _server(handler) as url:
+            return await _deliver(DiscordNotifier({"webhook_url": f"{url}/hook", "timeout_s": 0.2,
+                                                   "backoff_s": 0.1}))
+                                                   
+    assert asyncio.run(run())
+    assert len(calls) == 2
+
+def test_circuit_breaker_opens_then_probes(sleeps):
+    responses = {"status": 500}
+    calls = []
+    
+    async def handler(request):
+        calls.append(request.path)
+        return web.Response(status=responses["status"])
+        
+    async def run():
+        async with _server(handler) as url:
+            notifier = DiscordNotifier({"webhook_url": f"{url}/hook", "max_retries": 0,
+                                        "breaker_threshold": 2, "breaker_reset_s": 60})
+            results = [await _deliver(notifier) for _ in range(3)]
+            assert notifier.breaker.state == CircuitBreaker.OPEN
+            assert len(calls) == 2    # The third alert never reached the server
+            
+            # After the reset timeout one trial goes through; a failure reopens at once
+            notifier.breaker.opened_at -= 60
+            results.append(await _deliver(notifier))
+            assert notifier.breaker.state == CircuitBreaker.OPEN
+            
+            notifier.breaker.opened_at -= 60
+            responses["status"] = 204
+            results.append(await _deliver(notifier))
+            return results, notifier
+            
+    results, notifier = asyncio.run(run())
+    assert results == [False, False, False, False, True]
+    assert len(calls) == 4
+    assert notifier.breaker.state == CircuitBreaker.CLOSED
+    assert notifier.breaker.failures == 0
+
+def test_sms_retry_only_texts_numbers_not_reached(sleeps):
+    sent = Counter()
+    
+    async def handler(request):
+        number = (await request.post())["To"]
+        sent[number] += 1
+        if number == "+15550002" and sent[number] < 3:
+            return web.Response(status=500)
+        return web.json_response({"sid": "SM1"}, status=201)
+        
+    async def run():
+        async with _server(handler) as url:
+            notifier = SmsNotifier({"twilio_sid": "AC1", "twilio_token": "t", "from_number": "+15550000",
+                                    "to_numbers": ["+15550001", "+15550002", "+15550003"],
+                                    "api_url": url, "backoff_s": 0.1})
+            return await _deliver(notifier), notifier
+            
+    delivered, notifier = asyncio.run(run())
+    assert delivered
+    assert sent == {"+15550001": 1, "+15550002": 3, "+15550003": 1}
+    assert notifier._reached == {}
+
+def _smtp_server(stall_after_data: bool):
+    """
+    SMTP server on a thread per connection; with `stall_after_data` it reads
+    the message but never confirms it. Returns (listener, received messages)
+    """
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(4)
+    received = []
+    
+    def session(conn):
+        stream = conn.makefile("rwb")
+        
+        def reply(line):
+            stream.write(line.encode() + b"\r\n")
+            stream.flush()
+            
+        reply("220 localhost ESMTP")
+        data = None
+        for raw in stream:
+            line = raw.decode().rstrip("\r\n")
+            if data is not None:
+                if line != ".":
+                    data.append(line)
+                    continue
+                received.append("\n".join(data))
+                data = None
+                if stall_after_data:
+                    threading.Event().wait(2)
+                    break
+                reply("250 queued")
+            elif line.upper().startswith(("EHLO", "HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                reply("250 ok")
+            elif line.upper() == "DATA":
+                data = []
+                reply("354 go ahead")
+            elif line.upper() == "QUIT":
+                reply("221 bye")
+                break
+        conn.close()
+        
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=session, args=(conn,), daemon=True).start()
+            
+    threading.Thread(target=serve, daemon=True).start()
+    return listener, received
+
+@pytest.mark.parametrize("stall", [False, True])
+def test_email_is_sent_once(sleeps, stall):
+    listener, received = _smtp_server(stall_after_data=stall)
+    notifier = EmailNotifier({"smtp_server": "127.0.0.1", "smtp_port": listener.getsockname()[1],
+                              "use_tls": False, "recipients": ["trader@example.com"],
+                              "timeout_s": 0.5, "max_retries": 2, "backoff_s": 0.1})
+    try:
+        delivered = asyncio.run(notifier.deliver(dict(ALERT)))
+    finally:
+        listener.close()
+        
+    # A session that timed out after DATA may have been delivered: no retry
+    assert delivered is not stall
+    assert len(received) == 1
+    assert "Subject: MES 5m FVG Alert" in received[0]
+
+def test_slow_channel_does_not_hold_up_the_others():
+    release = asyncio.Event()
+    slow, fast = [], []
+    
+    async def slow_handler(request):
+        slow.append(await request.json())
+        await release.wait()
+        return web.Response(status=204)
+        
+    async def fast_handler(request):
+        fast.append(await request.json())
+        return web.json_response({"ok": True})
+        
+    def pattern(i):
+        return {"pattern_id": f"MES_5m_FVG_{i}", "symbol": "MES", "timeframe": "5m",
+                "pattern_type": "FVG", "direction": "bullish", "mean_threshold": 100.0 + i,
+                "upper_bound": 101.0 + i, "lower_bound": 99.0 + i,
+                "last_updated": "2024-01-02T15:00:00Z"}
+                
+    async def run():
+        async with _server(slow_handler) as slow_url, _server(fast_handler) as fast_url:
+            manager = AlertManager({
+                "discord": {"enabled": True, "webhook_url": f"{slow_url}/hook", "timeout_s": 30},
+                "telegram": {"enabled": True, "bot_token": "123:abc", "chat_id": "42", "api_url": fast_url},
+                "dispatch": {"coalesce_window_s": 0},
+            })
+            await manager.start()
+            try:
+                for i in range(3):
+                    await manager.send_alert(pattern(i), "pattern_formed", "high")
+                for _ in range(200):
+                    if len(fast) == 3:
+                        break
+                    await asyncio.sleep(0.01)
+                    
+                # Telegram delivered everything while Discord still sits on the first alert
+                assert len(fast) == 3
+                assert len(slow) == 1
+                assert manager.channel_queues["discord"].qsize() == 2
+            finally:
+                release.set()
+                await manager.close()
+                
+    asyncio.run(run())
+    assert len(slow) == 3
@@ -0,0 +1,136 @@
+"""
+Pacing of IB historical data requests, checked against a fake IB client
+
+The fake records every `reqHistoricalDataAsync` call; the pacing windows are
+scaled down from IB's 60 per 600 s and 5 per 2 s so a backfill that has to
+wait on both finishes in a couple of seconds.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Tuple
+import pandas as pd
+from ib_insync import BarData
+
+from src.data_sources.interactive_brokers import IBDataSource
+from src.data_sources.pacing import RequestScheduler, plan_chunks, max_chunk_seconds
+
+PACING = {
+    "max_concurrent": 4,
+    "max_requests": 12,
+    "window_seconds": 1.0,
+    "max_per_contract": 3,
+    "contract_window_seconds": 0.2,
+    "identical_window_seconds": 0.5,
+}
+
+# Call times are taken a moment after the scheduler stamps a slot
+TOLERANCE = 0.01
+
+class FakeIB:
+    """Records historical requests and answers them with one bar per period"""
+    
+    def __init__(self):
+        self.calls: List[Tuple[float, str, str, str]] = []   # (time, symbol, end, duration)
+        
+    async def qualifyContractsAsync(self, contract):
+        contract.conId = int(contract.lastTradeDateOrContractMonth) * 10 + (contract.symbol == "MNQ")
+        return [contract]
+        
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting,
+                                     whatToShow, useRTH, formatDate):
+        request = (contract.symbol, endDateTime, durationStr)
+        assert request not in [call[1:] for call in self.calls], f"duplicate request {request}"
+        self.calls.append((time.monotonic(),) + request)
+        await asyncio.sleep(0.02)
+        
+        end = pd.Timestamp(datetime.strptime(endDateTime, "%Y%m%d-%H:%M:%S").replace(tzinfo=timezone.utc))
+        count, unit = durationStr.split()
+        duration = pd.Timedelta(seconds=int(count)) if unit == "S" else pd.Timedelta(days=int(count))
+        step = pd.Timedelta(minutes=int(barSizeSetting.split()[0]))
+        return [
+            BarData(date=stamp.to_pydatetime(), open=1.0, high=2.0, low=0.5, close=1.5, volume=1.0)
+            for stamp in pd.date_range((end - duration).ceil(step), end, freq=step, inclusive="left")
+        ]
+
+def _max_in_window(times: List[float], window: float) -> int:
+    """Most calls that started within any `window` seconds"""
+    return max((sum(1 for u in times if t <= u < t + window - TOLERANCE) for t in times), default=0)
+
+def _source() -> IBDataSource:
+    source = IBDataSource({"credentials": {}, "pacing": PACING})
+    source.ib = source.contracts.ib = FakeIB()
+    source.connected = True
+    return source
+
+def test_default_limits_match_ib():
+    scheduler = RequestScheduler()
+    assert (scheduler.max_requests, scheduler.window) == (60, 600)
+    assert (scheduler.max_per_contract, scheduler.contract_window) == (5, 2)
+
+def test_plan_chunks_cover_range_on_aligned_boundaries():
+    start = pd.Timestamp("2024-01-03 13:35", tz="UTC").value
+    end = pd.Timestamp("2024-02-20 09:10", tz="UTC").value
+    step = max_chunk_seconds(300) * 1_000_000_000
+    chunks = plan_chunks(start, end, 300)
+    
+    assert chunks[0][0] == start and chunks[-1][1] == end
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert all(0 < chunk_end - chunk_start <= step for chunk_start, chunk_end in chunks)
+    assert all(chunk_start % step == 0 for chunk_start, _ in chunks[1:])
+    # An overlapping range asks for the same interior chunks
+    assert set(chunks[1:-1]) <= set(plan_chunks(start - step, end, 300))
+    
+def test_backfill_is_chunked_shared_and_paced():
+    # Within one MES/MNQ contract month, so each symbol is one series of chunks
+    start, end = pd.Timestamp("2024-01-01", tz="UTC"), pd.Timestamp("2024-02-26 13:35", tz="UTC")
+    chunks = plan_chunks(start.value, end.value, 300)
+    
+    async def backfill():
+        source = _source()
+        try:
+            frames = await asyncio.gather(
+                source.get_historical_data("MES", "5m", start, end),
+                source.get_historical_data("MES", "5m", start, end),
+                source.get_historical_data("MNQ", "5m", start, end),
+            )
+            return source.ib.calls, source.requests.stats, frames
+        finally:
+            source.requests.close()
+            
+    calls, stats, frames = asyncio.run(backfill())
+    
+    # One call per chunk per symbol; the duplicate MES backfill shared them
+    for symbol in ("MES", "MNQ"):
+        assert sum(1 for call in calls if call[1] == symbol) == len(chunks)
+    assert stats["requests"] == 2 * len(chunks)
+    assert stats["shared"] + stats["reused"] == len(chunks)
+    
+    expected = list(pd.date_range(start, end, freq="5min", inclusive="left"))
+    for frame in frames:
+        assert list(frame["timestamp"]) == expected
+        
+    # Neither pacing window is ever exceeded
+    assert len(calls) > PACING["max_requests"]
+    assert _max_in_window([call[0] for call in calls], PACING["window_seconds"]) <= PACING["max_requests"]
+    for symbol in ("MES", "MNQ"):
+        times = [call[0] for call in calls if call[1] == symbol]
+        assert _max_in_window(times, PACING["contract_window_seconds"]) <= PACING["max_per_contract"]
+
+def test_identical_request_reuses_recent_result():
+    start, end = pd.Timestamp("2024-02-01", tz="UTC"), pd.Timestamp("2024-02-05", tz="UTC")
+    
+    async def fetch_twice():
+        source = _source()
+        try:
+            await source.get_historical_data("MES", "5m", start, end)
+            first = len(source.ib.calls)
+            await source.get_historical_data("MES", "5m", start, end)
+            return first, len(source.ib.calls), source.requests.stats
+        finally:
+            source.requests.close()
+            
+    first, second, stats = asyncio.run(fetch_twice())
+    assert first == second == len(plan_chunks(start.value, end.value, 300))
+    assert stats["reused"] == first
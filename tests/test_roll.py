@@ -0,0 +1,70 @@
+"""
+Contract rolls of the IB real-time feed, checked against a fake IB client
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from ib_insync import RealTimeBar, RealTimeBarList
+
+from tests.test_pacing import FakeIB, _source
+
+class FakeRealTimeIB(FakeIB):
+    """Adds real-time bar subscriptions; bars are pushed by the test"""
+    
+    def __init__(self):
+        super().__init__()
+        self.feeds = []
+        
+    def reqRealTimeBars(self, contract, barSize, whatToShow, useRTH):
+        bars = RealTimeBarList()
+        bars.contract = contract
+        self.feeds.append(bars)
+        return bars
+        
+    def cancelRealTimeBars(self, bars):
+        self.feeds.remove(bars)
+        
+    def disconnect(self):
+        pass
+
+def _push(bars, start: datetime, count: int, price: float) -> None:
+    """`count` 5s bars from `start`, all at one price"""
+    for i in range(count):
+        bars.append(RealTimeBar(time=start + timedelta(seconds=5 * i), open_=price, high=price + 1,
+                                low=price - 1, close=price, volume=1.0))
+        bars.updateEvent.emit(bars, True)
+
+def test_roll_drops_the_old_contracts_partial_bars():
+    async def run():
+        source = _source()
+        source.ib = source.contracts.ib = FakeRealTimeIB()
+        await source.subscribe("MES", ["1m", "5m"])
+        old = source.subscriptions["MES"]
+        
+        # Half a minute of the old contract, then the roll
+        start = datetime(2024, 3, 14, 14, 30, tzinfo=timezone.utc)
+        _push(source.ib.feeds[0], start, 6, 100.0)
+        
+        # Resolve contracts as of just after the next roll
+        calendar = source.contracts.calendar("MES")
+        next_roll = calendar.next_roll(time.time_ns())
+        new = await source.contracts.resolve("MES", calendar.front(next_roll))
+        assert new.conId != old.conId
+        front = source.contracts.front
+        source.contracts.front = lambda symbol, ts_ns: front(symbol, next_roll)
+        await source._roll("MES")
+        assert [feed.contract for feed in source.ib.feeds] == [new]
+        
+        _push(source.ib.feeds[0], start + timedelta(seconds=30), 66, 200.0)
+        bars = {tf: source.bar_store.view("MES", tf) for tf in ("1m", "5m")}
+        await source.disconnect()
+        return start, bars
+        
+    start, bars = asyncio.run(run())
+    # The minute the roll fell in only holds new-contract prices
+    stamp = int(start.timestamp() * 1e9)
+    assert bars["1m"]["timestamp"].tolist() == [stamp + i * 60 * 10**9 for i in range(6)]
+    assert bars["1m"]["low"].min() == 199.0
+    assert bars["1m"]["open"][0] == 200.0
+    assert bars["5m"]["low"].tolist() == [199.0]
@@ -0,0 +1,63 @@
+"""
+Session levels of a series: prior day and prior week lookups
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.patterns import PatternManager
+
+def _bars(start: str, periods: int) -> dict:
+    """Hourly bars with distinct, known prices"""
+    stamps = pd.date_range(start, periods=periods, freq="1h", tz="UTC")
+    close = 4000.0 + np.arange(periods) + 10 * np.sin(np.arange(periods))
+    return {
+        "timestamp": stamps.as_unit("ns").asi8,
+        "open": close - 0.5,
+        "high": close + 1.0 + np.arange(periods) % 3,
+        "low": close - 1.0 - np.arange(periods) % 5,
+        "close": close,
+    }
+
+def _expected(bars: dict, key: str) -> pd.DataFrame:
+    """OHLC per trading day (rolls at 18:00 New York) or trading week, with pandas"""
+    local = pd.to_datetime(bars["timestamp"], utc=True).tz_convert("America/New_York")
+    day = (local.tz_localize(None) + pd.Timedelta(hours=6)).normalize()
+    group = day if key == "day" else day - pd.to_timedelta(day.dayofweek, unit="D")
+    frame = pd.DataFrame({name: bars[name] for name in ("open", "high", "low", "close")})
+    return frame.groupby(np.asarray(group)).agg({"open": "first", "high": "max", "low": "min", "close": "last"})
+
+def _levels(levels) -> tuple:
+    return tuple(levels[name] for name in ("open", "high", "low", "close"))
+
+def test_prior_day_and_week_levels():
+    # Two trading weeks across the March DST change, fed one bar at a time as
+    # the scanner does; no detection runs, as when it is sharded out
+    bars = _bars("2024-03-03 23:00", 24 * 12)
+    manager = PatternManager({})
+    for end in range(1, len(bars["timestamp"]) + 1):
+        manager.update_sessions({name: values[:end] for name, values in bars.items()}, "MES", "1h")
+    levels = manager.session_levels("MES", "1h")
+    
+    days, weeks = _expected(bars, "day"), _expected(bars, "week")
+    assert _levels(levels["prior_day"]) == tuple(days.iloc[-2])
+    assert _levels(levels["day"]) == tuple(days.iloc[-1])
+    assert _levels(levels["prior_week"]) == tuple(weeks.iloc[-2])
+    assert _levels(levels["week"]) == tuple(weeks.iloc[-1])
+    assert manager.session_levels("MNQ", "1h") is None
+    
+def test_levels_match_batch_and_survive_restore():
+    bars = _bars("2024-10-27 22:00", 24 * 10)
+    batch = PatternManager({})
+    batch.update_sessions(bars, "MES", "1h")
+    
+    # Half the bars, a snapshot, then the rest; repeated bars are skipped
+    half = len(bars["timestamp"]) // 2
+    first = PatternManager({})
+    first.update_sessions({name: values[:half] for name, values in bars.items()}, "MES", "1h")
+    resumed = PatternManager({})
+    resumed.set_state(first.get_state())
+    resumed.update_sessions(bars, "MES", "1h")
+    resumed.update_sessions(bars, "MES", "1h")
+    
+    assert resumed.session_levels("MES", "1h") == batch.session_levels("MES", "1h")
@@ -0,0 +1,42 @@
+"""
+Market structure: the streaming tracker against the batch reference
+"""
+
+import numpy as np
+import pytest
+
+from src.patterns.structure import StructureTracker, detect_structure
+
+def _bars(seed: int, n: int = 3000) -> tuple:
+    """Random walk OHLC on a 0.25 tick grid, so equal highs and lows (ties) occur"""
+    rng = np.random.default_rng(seed)
+    close = 4000 + np.cumsum(rng.normal(0, 2, n))
+    open_ = np.append(close[0], close[:-1]) + rng.normal(0, 0.5, n)
+    high = np.maximum(open_, close) + rng.exponential(1.0, n)
+    low = np.minimum(open_, close) - rng.exponential(1.0, n)
+    return tuple(np.round(x * 4) / 4 for x in (open_, high, low, close))
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("lookback", [1, 2, 5, 13])
+@pytest.mark.parametrize("order_blocks", [False, True])
+def test_tracker_matches_batch_reference(seed, lookback, order_blocks):
+    o, h, l, c = _bars(seed)
+    tracker = StructureTracker(lookback, order_blocks=order_blocks, min_block_size=1.0)
+    streamed = []
+    for i, bar in enumerate(zip(o.tolist(), h.tolist(), l.tolist(), c.tolist())):
+        streamed.extend(tracker.update(i, *bar))
+        
+    expected = detect_structure(o, h, l, c, lookback, order_blocks, min_block_size=1.0)
+    assert expected
+    assert streamed == expected
+
+def test_restored_tracker_continues_the_same_events():
+    o, h, l, c = _bars(3)
+    columns = list(zip(o.tolist(), h.tolist(), l.tolist(), c.tolist()))
+    first = StructureTracker(5, order_blocks=True)
+    events = [e for i, bar in enumerate(columns[:1500]) for e in first.update(i, *bar)]
+    
+    second = StructureTracker(5, order_blocks=True)
+    second.set_state(first.get_state())
+    events += [e for i, bar in enumerate(columns[1500:], 1500) for e in second.update(i, *bar)]
+    assert events == detect_structure(o, h, l, c, 5, order_blocks=True)
@@ -0,0 +1,88 @@
+"""
+Price index over the active zones: only reached zones are evaluated
+"""
+
+import asyncio
+import numpy as np
+
+import src.patterns as patterns_module
+from src.patterns import PatternManager
+from src.patterns.store import PatternStore, format_stamp
+from src.patterns.thresholds import STATUS_CODES, classify_bar
+
+def _zone(i: int, rng: np.random.Generator) -> dict:
+    lower = float(rng.uniform(3900, 4100))
+    upper = lower + float(rng.uniform(0.25, 8))
+    return {
+        "pattern_id": f"z{i}",
+        "symbol": "MES",
+        "timeframe": "5m",
+        "pattern_type": "FVG",
+        "direction": "bullish" if rng.random() < 0.5 else "bearish",
+        "mean_threshold": (lower + upper) / 2,
+        "upper_bound": upper,
+        "lower_bound": lower,
+        "status": "active",
+        "confidence": 0.5,
+        "metadata": {},
+        "created_at": format_stamp(i * 60_000_000_000),
+        "last_updated": format_stamp(i * 60_000_000_000),
+    }
+
+def _reached(pattern: dict, high: float, low: float) -> bool:
+    if pattern["direction"] == "bullish":
+        return low <= pattern["upper_bound"]
+    return high >= pattern["lower_bound"]
+
+def test_touched_rows_are_the_reached_zones():
+    rng = np.random.default_rng(6)
+    store = PatternStore()
+    for i in range(400):
+        store.add(_zone(i, rng))
+    # Removals move rows around; the index has to follow them
+    for i in rng.choice(400, 150, replace=False).tolist():
+        store.remove(f"z{i}")
+        
+    table = store.tables[("MES", "5m")]
+    for _ in range(200):
+        low = float(rng.uniform(3880, 4120))
+        high = low + float(rng.uniform(0, 15))
+        touched = {table.ids[row] for row in table.touched(high, low).tolist()}
+        expected = {p["pattern_id"] for p in store.patterns() if _reached(p, high, low)}
+        assert touched == expected
+        
+def test_update_matches_brute_force_scan(monkeypatch):
+    rng = np.random.default_rng(19)
+    manager = PatternManager({})
+    for i in range(300):
+        manager._track(_zone(i, rng))
+        
+    evaluated = []
+    classify_zones = patterns_module.classify_zones
+    
+    def counting(direction, *args):
+        evaluated.append(len(direction))
+        return classify_zones(direction, *args)
+    monkeypatch.setattr(patterns_module, "classify_zones", counting)
+    
+    close = 4000.0
+    for step in range(400):
+        close += float(rng.normal(0, 4))
+        high, low = close + float(rng.uniform(0, 3)), close - float(rng.uniform(0, 3))
+        bar = {"timestamp": 10**18 + step * 300_000_000_000, "high": high, "low": low, "close": close}
+        
+        # Brute force: every active zone through the scalar rules
+        active = manager.store.patterns("MES")
+        expected = {}
+        for pattern in active:
+            status = classify_bar(pattern["direction"], pattern["lower_bound"], pattern["upper_bound"],
+                                  pattern["mean_threshold"], high, low, close)
+            if status is not None and status != pattern["status"]:
+                expected[pattern["pattern_id"]] = status
+                
+        evaluated.clear()
+        events = asyncio.run(manager.update_patterns("MES", bar, "5m"))
+        assert {e["pattern"]["pattern_id"]: e["pattern"]["status"] for e in events} == expected
+        assert sum(evaluated) == sum(_reached(p, high, low) for p in active)
+        
+    assert any(STATUS_CODES[p["status"]] for p in manager.store.patterns())